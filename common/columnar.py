@@ -0,0 +1,134 @@
+import os
+import json
+import zlib
+import struct
+import numpy as np
+
+# Block based columnar log. The schema of every table is an influx line protocol format string
+# ("measurement,tag=x field=%0.4f,other=%d %d\n"), rows are the tuples that would have been
+# formatted with it. Rows are buffered and written as blocks of zlib compressed typed columns,
+# line protocol text is only generated again when a file is converted for upload.
+#
+# file:  MAGIC, HEADER (version, header size), json header {'tables': [{'format', 'dtypes'}]}
+# block: BLOCK (table, rows), per column COLUMN (size) + compressed column data
+# table RAW blocks hold one compressed chunk of line protocol text with a schema of its own
+
+MAGIC = b'RPCOL'
+VERSION = 1
+HEADER = struct.Struct('<HI')
+BLOCK = struct.Struct('<HI')
+COLUMN = struct.Struct('<I')
+RAW = 0xffff
+
+def parse_format(fmt):
+  """Returns the column dtypes of a line protocol format string, the last column is the timestamp."""
+  series, fields, timestamp = fmt.strip().split(' ')
+  specs = [field.split('=', 1)[1] for field in fields.split(',')] + [timestamp]
+  dtypes = []
+  for spec in specs:
+    if spec.endswith('d') or spec.endswith('i'):
+      dtypes.append('<i8')
+    elif spec == '%f':
+      # full precision, gps coordinates need more digits than float32 has
+      dtypes.append('<f8')
+    elif spec.endswith('f'):
+      dtypes.append('<f4')
+    else:
+      raise ValueError("unsupported format %s in %s" % (spec, series))
+  return dtypes
+
+
+class ColumnarWriter(object):
+  def __init__(self, path, formats, block_rows=256, level=1):
+    self.tables = [{'format': fmt, 'dtypes': parse_format(fmt)} for fmt in formats]
+    self.block_rows = block_rows
+    self.level = level
+    self.rows = [[] for _ in formats]
+
+    exists = os.path.exists(path) and os.path.getsize(path) > 0
+    if exists:
+      with open(path, 'rb') as f:
+        if read_header(f) != self.tables:
+          raise ValueError("%s was written with a different schema" % path)
+    self.f = open(path, 'ab')
+    if not exists:
+      header = json.dumps({'tables': self.tables}).encode()
+      self.f.write(MAGIC + HEADER.pack(VERSION, len(header)) + header)
+
+  def append(self, table, row):
+    rows = self.rows[table]
+    rows.append(row)
+    if len(rows) >= self.block_rows:
+      self.flush_table(table)
+
+  def write(self, text):
+    """Writes raw line protocol, for rare lines without a fixed schema."""
+    data = zlib.compress(text.encode(), self.level)
+    self.f.write(BLOCK.pack(RAW, 1) + COLUMN.pack(len(data)) + data)
+
+  def flush_table(self, table):
+    rows = self.rows[table]
+    if len(rows) == 0:
+      return
+    block = [BLOCK.pack(table, len(rows))]
+    for column, dtype in zip(zip(*rows), self.tables[table]['dtypes']):
+      data = zlib.compress(np.array(column, dtype=dtype).tobytes(), self.level)
+      block.append(COLUMN.pack(len(data)))
+      block.append(data)
+    # one write per block, a crash can only truncate the last block
+    self.f.write(b''.join(block))
+    rows.clear()
+
+  def flush(self):
+    for table in range(len(self.tables)):
+      self.flush_table(table)
+    self.f.flush()
+
+  def close(self):
+    self.flush()
+    self.f.close()
+
+
+def read_header(f):
+  if f.read(len(MAGIC)) != MAGIC:
+    raise ValueError("not a columnar log")
+  version, size = HEADER.unpack(f.read(HEADER.size))
+  if version != VERSION:
+    raise ValueError("columnar log version %d, expected %d" % (version, VERSION))
+  return json.loads(f.read(size).decode())['tables']
+
+def read_blocks(path):
+  """Yields (table, columns) per block, or (None, text) for raw blocks. A truncated last block is skipped."""
+  with open(path, 'rb') as f:
+    tables = read_header(f)
+    while True:
+      head = f.read(BLOCK.size)
+      if len(head) < BLOCK.size:
+        return
+      table, rows = BLOCK.unpack(head)
+      chunks = []
+      for _ in range(1 if table == RAW else len(tables[table]['dtypes'])):
+        size = f.read(COLUMN.size)
+        if len(size) < COLUMN.size:
+          return
+        size, = COLUMN.unpack(size)
+        data = f.read(size)
+        if len(data) < size:
+          return
+        chunks.append(zlib.decompress(data))
+      if table == RAW:
+        yield None, chunks[0].decode()
+      else:
+        yield tables[table], [np.frombuffer(chunk, dtype=dtype) for chunk, dtype in zip(chunks, tables[table]['dtypes'])]
+
+def iter_line_protocol(path):
+  """Yields the line protocol text of one block at a time."""
+  for table, columns in read_blocks(path):
+    if table is None:
+      yield columns
+    else:
+      fmt = table['format']
+      yield "".join(fmt % row for row in zip(*[column.tolist() for column in columns]))
+
+def to_line_protocol(path):
+  return "".join(iter_line_protocol(path))
@@ -26,6 +26,29 @@ _FINGERPRINTS = get_fingerprint_list()
 
 _DEBUG_ADDRESS = {1880: 8}   # reserved for debug purposes
 
+def build_index(fingerprints):
+  """Returns the car names and a dict (address, length) -> bitmask of the cars having that message
+  in any of their fingerprints, bit i standing for cars[i]."""
+  cars = sorted(fingerprints.keys())
+  index = {}
+  for i, car_name in enumerate(cars):
+    for fingerprint in fingerprints[car_name]:
+      for adr, length in list(fingerprint.items()) + list(_DEBUG_ADDRESS.items()):  # add alien debug address
+        index[(adr, length)] = index.get((adr, length), 0) | (1 << i)
+  return cars, index
+
+_CARS, _INDEX = build_index(_FINGERPRINTS)
+_CAR_BITS = {car_name: 1 << i for i, car_name in enumerate(_CARS)}
+
+def cars_to_mask(cars):
+  mask = 0
+  for car_name in cars:
+    mask |= _CAR_BITS[car_name]
+  return mask
+
+def mask_to_cars(mask):
+  return [car_name for i, car_name in enumerate(_CARS) if mask >> i & 1]
+
 def is_valid_for_fingerprint(msg, car_fingerprint):
   adr = msg.address
   # ignore addresses that are more than 11 bits
@@ -42,19 +65,69 @@ def eliminate_incompatible_cars(msg, candidate_cars):
      Returns:
       A list containing the subset of candidate_cars that could have sent msg.
   """
-  compatible_cars = []
+  mask = _INDEX.get((msg.address, len(msg.dat)), 0)
+  return [car_name for car_name in candidate_cars if _CAR_BITS[car_name] & mask]
+
+
+class FingerprintMatcher(object):
+  """Candidate cars of one bus as a bitmask, every message ANDs in the cars that have it. Messages
+  already applied are skipped, and nothing is looked up anymore once no candidate is left."""
+  def __init__(self, candidate_cars=None):
+    self.candidates = cars_to_mask(_CARS if candidate_cars is None else candidate_cars)
+    self.seen = {}
+
+  def update(self, address, length):
+    if self.candidates == 0 or self.seen.get(address) == length:
+      return self.candidates
+    self.seen[address] = length
+    self.candidates &= _INDEX.get((address, length), 0)
+    return self.candidates
+
+  def cars(self):
+    return mask_to_cars(self.candidates)
+
+  def count(self):
+    return bin(self.candidates).count('1')
 
-  for car_name in candidate_cars:
-    car_fingerprints = _FINGERPRINTS[car_name]
+  def only(self, mask):
+    """True if candidates are left and all of them are in mask."""
+    return self.candidates != 0 and self.candidates & ~mask == 0
 
-    for fingerprint in car_fingerprints:
-      fingerprint.update(_DEBUG_ADDRESS)  # add alien debug address
+  def report(self):
+    """Remaining cars with the fraction of their closest fingerprint that was seen, best first."""
+    ranked = []
+    for car_name in self.cars():
+      coverage = max(sum(self.seen.get(adr) == length for adr, length in fingerprint.items()) / float(max(len(fingerprint), 1))
+                     for fingerprint in _FINGERPRINTS[car_name])
+      ranked.append((car_name, coverage))
+    return sorted(ranked, key=lambda r: -r[1])
 
-      if is_valid_for_fingerprint(msg, fingerprint):
-        compatible_cars.append(car_name)
-        break
 
-  return compatible_cars
+def distinguishing_addresses(car_name, fingerprint, count=8):
+  """Picks up to count messages of a seen fingerprint that together rule out the most other cars,
+  the first ones the most, and fills up with other known messages of the car. Seeing all of them
+  again is a quick check for the same car."""
+  if car_name not in _CAR_BITS:
+    return {}
+  candidates = cars_to_mask(_CARS)
+  signature = {}
+  while len(signature) < count and candidates != _CAR_BITS[car_name]:
+    options = [(bin(candidates & _INDEX[(adr, length)]).count('1'), adr, length) for adr, length in fingerprint.items()
+               if adr not in signature and (adr, length) in _INDEX and _INDEX[(adr, length)] & _CAR_BITS[car_name]]
+    if len(options) == 0:
+      break
+    left, adr, length = min(options)
+    if candidates & _INDEX[(adr, length)] == candidates:
+      break
+    signature[adr] = length
+    candidates &= _INDEX[(adr, length)]
+  # a car without rivals still needs some of its messages to be seen
+  for adr, length in sorted(fingerprint.items()):
+    if len(signature) >= count:
+      break
+    if (adr, length) in _INDEX and _INDEX[(adr, length)] & _CAR_BITS[car_name] and adr not in _DEBUG_ADDRESS:
+      signature[adr] = length
+  return signature
 
 
 def all_known_cars():
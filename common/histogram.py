@@ -0,0 +1,84 @@
+# HDR style histogram of non negative integers, usually durations in ns. Values below SUB_BUCKETS
+# have a bucket each, above that every power of two is split into SUB_BUCKETS linear buckets, so
+# a value is kept to within 1/SUB_BUCKETS of itself from ns to minutes in a few hundred buckets.
+#
+# record() is an increment of a list slot without locks, a histogram has one writing thread and
+# readers use a snapshot() copy.
+
+SUB_BITS = 4
+SUB_BUCKETS = 1 << SUB_BITS
+MAX_BITS = 40  # 2**40 ns is about 18 minutes, larger values go in the last bucket
+BUCKETS = (MAX_BITS - SUB_BITS + 1) << SUB_BITS
+
+def bucket_index(value):
+  if value < SUB_BUCKETS:
+    return max(0, value)
+  shift = value.bit_length() - SUB_BITS - 1
+  return min(BUCKETS - 1, ((shift + 1) << SUB_BITS) + (value >> shift) - SUB_BUCKETS)
+
+def bucket_range(index):
+  """Lowest value of the bucket and its width."""
+  if index < SUB_BUCKETS:
+    return index, 1
+  shift = (index >> SUB_BITS) - 1
+  return ((index & (SUB_BUCKETS - 1)) + SUB_BUCKETS) << shift, 1 << shift
+
+
+class Histogram(object):
+  __slots__ = ('counts', 'count', 'total', 'max')
+
+  def __init__(self):
+    self.reset()
+
+  def reset(self):
+    self.counts = [0] * BUCKETS
+    self.count = 0
+    self.total = 0
+    self.max = 0
+
+  def record(self, value):
+    value = int(value)
+    self.counts[bucket_index(value)] += 1
+    self.count += 1
+    self.total += value
+    if value > self.max:
+      self.max = value
+
+  def merge(self, other):
+    for i, c in enumerate(other.counts):
+      if c:
+        self.counts[i] += c
+    self.count += other.count
+    self.total += other.total
+    self.max = max(self.max, other.max)
+
+  def snapshot(self):
+    copy = Histogram()
+    copy.counts = list(self.counts)
+    copy.count = self.count
+    copy.total = self.total
+    copy.max = self.max
+    return copy
+
+  def mean(self):
+    return self.total / self.count if self.count > 0 else 0.
+
+  def percentile(self, p):
+    """Middle of the bucket holding the p-th percentile, never more than max."""
+    if self.count == 0:
+      return 0
+    if p >= 100:
+      return self.max
+    target = max(1, p / 100. * self.count)
+    seen = 0
+    for i, c in enumerate(self.counts):
+      seen += c
+      if seen >= target:
+        low, width = bucket_range(i)
+        return min(self.max, low + (width - 1) // 2)
+    return self.max
+
+  def stats(self, scale=1.):
+    """count, mean, p50, p90, p99 and max, values divided by scale."""
+    return {'count': self.count, 'mean': self.mean() / scale, 'p50': self.percentile(50) / scale, 'p90': self.percentile(90) / scale,
+            'p99': self.percentile(99) / scale, 'max': self.max / scale}
@@ -0,0 +1,118 @@
+import gzip
+import time
+import threading
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Posts line protocol to InfluxDB from a background thread. write() never blocks, chunks go into
+# a bounded queue that drops the oldest chunk when full, and the thread sends them as gzipped
+# batches over one keep-alive connection once enough bytes are queued or the oldest is too old.
+# A failed batch is retried with backoff, stop() sends what is queued and ends the thread.
+
+GZIP = {'Content-Encoding': 'gzip'}
+
+class InfluxWriter(object):
+  def __init__(self, url, create_url=None, max_chunks=200, batch_bytes=256*1024, max_age=1.0, timeout=(1., 5.), retries=2):
+    self.url = url
+    self.create_url = create_url
+    self.batch_bytes = batch_bytes
+    self.max_age = max_age
+    self.timeout = timeout
+    self.retries = retries
+
+    self.queue = deque(maxlen=max_chunks)
+    self.queued_bytes = 0
+    self.oldest = None
+    self.stopping = threading.Event()
+    self.lock = threading.Condition()
+
+    self.sent = 0
+    self.dropped = 0
+    self.failed = 0
+    self.retried = 0
+    self.last_status = None
+
+    self.session = requests.Session()
+    self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+
+    self.thread = threading.Thread(target=self.run, daemon=True)
+    self.thread.start()
+
+  def write(self, text):
+    with self.lock:
+      if len(self.queue) == self.queue.maxlen:
+        self.queued_bytes -= len(self.queue[0])
+        self.dropped += 1
+      self.queue.append(text)
+      self.queued_bytes += len(text)
+      if self.oldest is None:
+        self.oldest = time.time()
+      if self.queued_bytes >= self.batch_bytes:
+        self.lock.notify()
+
+  def status(self):
+    return "influx sent: %d  dropped: %d  failed: %d  retried: %d  queued: %d  last status: %s" % (self.sent, self.dropped, self.failed, self.retried, len(self.queue), self.last_status)
+
+  def stop(self, timeout=5.):
+    """Sends the queued chunks without retries and ends the thread, False if it did not in time."""
+    with self.lock:
+      self.stopping.set()
+      self.lock.notify()
+    self.thread.join(timeout)
+    return not self.thread.is_alive()
+
+  def next_batch(self):
+    """Chunks of the next batch, an empty batch once stopped and everything was sent."""
+    with self.lock:
+      while not self.stopping.is_set() and (self.oldest is None or (self.queued_bytes < self.batch_bytes and time.time() - self.oldest < self.max_age)):
+        self.lock.wait(self.max_age if self.oldest is None else max(0., self.max_age - (time.time() - self.oldest)))
+      batch = []
+      size = 0
+      while len(self.queue) > 0 and (size == 0 or size + len(self.queue[0]) <= self.batch_bytes):
+        batch.append(self.queue.popleft())
+        size += len(batch[-1])
+      self.queued_bytes -= size
+      self.oldest = time.time() if len(self.queue) > 0 else None
+      return batch
+
+  def post(self, body):
+    r = self.session.post(self.url, data=body, headers=GZIP, timeout=self.timeout)
+    if r.status_code == 404 and self.create_url is not None:
+      # database not found
+      self.session.post(self.create_url, timeout=self.timeout)
+      r = self.session.post(self.url, data=body, headers=GZIP, timeout=self.timeout)
+    self.last_status = r.status_code
+    return r.status_code < 300
+
+  def send(self, body):
+    try:
+      return self.post(body)
+    except requests.exceptions.RequestException as e:
+      self.last_status = type(e).__name__
+      return False
+
+  def run(self):
+    backoff = 0.
+    while True:
+      batch = self.next_batch()
+      if len(batch) == 0:
+        return
+      body = gzip.compress("".join(batch).encode(), 1)
+      ok = self.send(body)
+      attempt = 0
+      while not ok and attempt < self.retries:
+        # new chunks keep queueing meanwhile, a slow or missing server only costs the oldest
+        backoff = min(10., max(0.5, backoff * 2))
+        if self.stopping.wait(backoff):
+          break
+        attempt += 1
+        self.retried += 1
+        ok = self.send(body)
+
+      if ok:
+        self.sent += len(batch)
+        backoff = 0.
+      else:
+        self.failed += len(batch)
@@ -18,7 +18,8 @@ directory <params_dir>/<tmp>, then atomically symlinking <params_dir>/<d> to <pa
 before deleting the old <params_dir>/<d> directory.
 
 Writers that only modify a single key can simply take the lock, then swap the corresponding value
-file in place without messing with <params_dir>/d.
+file in place without messing with <params_dir>/d. Deletes likewise take the lock and unlink only
+the value files of the keys being removed.
 """
 import time
 import os
@@ -53,6 +54,7 @@ keys = {
   "AccessToken": [TxType.PERSISTENT],
   "AthenadPid": [TxType.PERSISTENT],
   "CalibrationParams": [TxType.PERSISTENT],
+  "CachedFingerprint": [TxType.PERSISTENT],
   "CameraCANAddresses": [TxType.CLEAR_ON_MANAGER_START, TxType.CLEAR_ON_PANDA_DISCONNECT],
   "VehicleCANAddresses": [TxType.CLEAR_ON_MANAGER_START, TxType.CLEAR_ON_PANDA_DISCONNECT],
   "CarParams": [TxType.CLEAR_ON_MANAGER_START, TxType.CLEAR_ON_PANDA_DISCONNECT],
@@ -316,9 +318,27 @@ def write_db(params_path, key, value):
     os.umask(prev_umask)
     lock.release()
 
+def delete_db(params_path, keys):
+  prev_umask = os.umask(0)
+  lock = FileLock(params_path+"/.lock", True)
+  lock.acquire()
+
+  try:
+    for key in keys:
+      try:
+        os.remove("%s/d/%s" % (params_path, key))
+      except FileNotFoundError:
+        pass
+    fsync_dir(params_path+"/d")
+  finally:
+    os.umask(prev_umask)
+    lock.release()
+
 class Params():
-  def __init__(self, db='/data/params'):
+  def __init__(self, db='/data/params', cache=False):
     self.db = db
+    # key -> ((inode, mtime, size), value), values are reread once the file was replaced
+    self._cache = {} if cache else None
 
     # create the database if it doesn't exist...
     if not os.path.exists(self.db+"/d"):
@@ -332,10 +352,7 @@ class Params():
       return DBReader(self.db)
 
   def _clear_keys_with_type(self, tx_type):
-    with self.transaction(write=True) as txn:
-      for key in keys:
-        if tx_type in keys[key]:
-          txn.delete(key)
+    delete_db(self.db, [key for key in keys if tx_type in keys[key]])
 
   def manager_start(self):
     self._clear_keys_with_type(TxType.CLEAR_ON_MANAGER_START)
@@ -344,15 +361,27 @@ class Params():
     self._clear_keys_with_type(TxType.CLEAR_ON_PANDA_DISCONNECT)
 
   def delete(self, key):
-    with self.transaction(write=True) as txn:
-      txn.delete(key)
+    delete_db(self.db, [key])
+
+  def _read_cached(self, key):
+    try:
+      st = os.stat("%s/d/%s" % (self.db, key))
+    except OSError:
+      self._cache.pop(key, None)
+      return None
+    stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    if key in self._cache and self._cache[key][0] == stamp:
+      return self._cache[key][1]
+    ret = read_db(self.db, key)
+    self._cache[key] = (stamp, ret)
+    return ret
 
   def get(self, key, block=False, encoding=None):
     if key not in keys:
       raise UnknownKeyName(key)
 
     while 1:
-      ret = read_db(self.db, key)
+      ret = read_db(self.db, key) if self._cache is None else self._read_cached(key)
       if not block or ret is not None:
         break
       # is polling really the best we can do?
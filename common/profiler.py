@@ -1,48 +1,80 @@
 import time
+import signal
+import weakref
+
+from common.histogram import Histogram
+
+# every profiler of the process, for switching them on and off with a signal
+_profilers = weakref.WeakSet()
+
+def _disabled_checkpoint(name, ignore=False):
+  pass
+
+def toggle_all():
+  for profiler in list(_profilers):
+    profiler.toggle()
+
+def install_toggle(signum=signal.SIGUSR1):
+  """kill -USR1 <pid> switches the profilers of the process on or off, has to be called from
+  the main thread."""
+  signal.signal(signum, lambda signum, frame: toggle_all())
+
 
 class Profiler(object):
+  """Sums the time between checkpoints and keeps a latency histogram of each. A disabled
+  profiler only costs the call of checkpoint, histograms cover the time since it was enabled."""
   def __init__(self, enabled=False, source=''):
-    self.enabled = enabled
-    self.cp = {}
     self.source = source
-    self.cp_ignored = []
-    self.iter = 0
-    self.start_time = time.time()
-    self.last_time = self.start_time
-    self.tot = 0.00001
+    self.hist = {}
+    self.reset(enabled)
+    _profilers.add(self)
 
   def reset(self, enabled=False):
     self.enabled = enabled
     self.cp = {}
     self.cp_ignored = []
     self.iter = 0
-    self.start_time = time.time()
+    self.start_time = time.perf_counter_ns()
     self.last_time = self.start_time
-    self.tot = 0.00001
+    self.tot = 1
+    self.checkpoint = self._checkpoint if enabled else _disabled_checkpoint
+
+  def toggle(self):
+    if self.enabled:
+      self.display()
+      self.reset(False)
+    else:
+      self.hist = {}
+      self.reset(True)
 
-  def checkpoint(self, name, ignore=False):
+  def _checkpoint(self, name, ignore=False):
     # ignore flag needed when benchmarking threads with ratekeeper
-    if not self.enabled:
-      return
-    tt = time.time()
-    if name not in self.cp:
-      self.cp[name] = 0.
+    tt = time.perf_counter_ns()
+    dt = tt - self.last_time
+    self.last_time = tt
+    # toggle() replaces the dicts from a signal handler, never mutates them
+    cp, hist = self.cp, self.hist
+    if name not in cp:
+      cp[name] = 0
       if ignore:
         self.cp_ignored.append(name)
-    self.cp[name] += tt - self.last_time
+      if name not in hist:
+        hist[name] = Histogram()
+    hist[name].record(dt)
+    cp[name] += dt
     if not ignore:
-      self.tot += tt - self.last_time
-    self.last_time = tt
+      self.tot += dt
+
+  def stats(self):
+    """count, mean, p50, p90, p99 and max in ms of every checkpoint."""
+    return {name: hist.snapshot().stats(1e6) for name, hist in self.hist.items()}
 
   def display(self):
     if not self.enabled:
       return
     self.iter += 1
-    #print("******* Profiling *******")
-    for n, ms in sorted(self.cp.items(), key=lambda x: -x[1]):
-      if not n in self.cp_ignored:
-      #  print("%30s: %7.2f   percent: %3.0f   IGNORED" % (n, ms*1000.0, ms/self.tot*100))
-      #else:
-        print("%s - %30s: %9.1f   percent: %3.0f" % (self.source, n, ms*1000.0, ms/self.tot*100))
-    #print("Iter clock: %2.6f   TOTAL: %2.2f" % (self.tot/self.iter, self.tot))
-
+    stats = self.stats()
+    for n, ns in sorted(self.cp.items(), key=lambda x: -x[1]):
+      st = stats[n]
+      percent = "  -" if n in self.cp_ignored else "%3.0f" % (ns / self.tot * 100)
+      print("%s - %30s: %9.1f   percent: %s   p50: %7.3f   p99: %7.3f   max: %7.3f" % (self.source, n, ns / 1e6, percent, st['p50'], st['p99'], st['max']))
@@ -6,6 +6,8 @@ import subprocess
 import multiprocessing
 from cffi import FFI
 
+from common.histogram import Histogram
+
 # Build and load cython module
 import pyximport
 installer = pyximport.install(inplace=True, build_dir='/tmp')
@@ -80,3 +82,82 @@ class Ratekeeper():
     self._frame += 1
     self._remaining = remaining
     return lagged
+
+
+# what a loop paced by its input does with the backlog of a missed deadline
+CATCH_UP_COALESCE = 'coalesce'  # process the whole backlog in one frame
+CATCH_UP_SKIP = 'skip'  # only process the newest input
+CATCH_UP_REPLAY = 'replay'  # process every input of the backlog on its own
+CATCH_UP_POLICIES = [CATCH_UP_COALESCE, CATCH_UP_SKIP, CATCH_UP_REPLAY]
+
+
+class _Task():
+  def __init__(self, last_frame):
+    self.last_frame = last_frame
+    self.cost = None
+
+
+class DeadlineScheduler():
+  def __init__(self, rate, policy=CATCH_UP_COALESCE):
+    """Deadlines of a loop paced by its input, like controlsd by can packets: a frame starts when
+    its input arrives and is due when the next one does, one interval later. Housekeeping given to
+    run() after the output of the frame only runs while the slack covers its usual duration, or
+    once it was put off max_defer frames."""
+    self._interval = 1. / rate
+    self.policy = policy if policy in CATCH_UP_POLICIES else CATCH_UP_COALESCE
+    self._start_time = 0.
+    self._deadline = 0.
+    self._frame = 0
+    self._tasks = {}
+    self.missed = False
+    self.misses = 0
+    # ns, from the start of the frame to its output and its end, and past the deadline of missed frames
+    self.output_hist = Histogram()
+    self.frame_hist = Histogram()
+    self.late_hist = Histogram()
+
+  @property
+  def frame(self):
+    return self._frame
+
+  @property
+  def slack(self):
+    return self._deadline - sec_since_boot()
+
+  def start_frame(self):
+    self._start_time = sec_since_boot()
+    self._deadline = self._start_time + self._interval
+
+  def output_sent(self):
+    self.output_hist.record((sec_since_boot() - self._start_time) * 1e9)
+
+  def run(self, name, f, *args, every=1, max_defer=10):
+    """Calls f(*args) once it is due every frames and there is time left in the frame, returns
+    whether it ran."""
+    task = self._tasks.get(name)
+    if task is None:
+      task = self._tasks[name] = _Task(self._frame - every)
+    overdue = self._frame - task.last_frame - every
+    if overdue < 0 or (overdue < max_defer and task.cost is not None and self.slack < task.cost):
+      return False
+    start_time = sec_since_boot()
+    f(*args)
+    duration = sec_since_boot() - start_time
+    # a slow first run, e.g. of imports, is forgotten after a few runs
+    task.cost = duration if task.cost is None else task.cost + 0.2 * (duration - task.cost)
+    task.last_frame = self._frame
+    return True
+
+  def end_frame(self):
+    end_time = sec_since_boot()
+    self.frame_hist.record((end_time - self._start_time) * 1e9)
+    self.missed = end_time > self._deadline
+    if self.missed:
+      self.misses += 1
+      self.late_hist.record((end_time - self._deadline) * 1e9)
+    self._frame += 1
+    return self.missed
+
+  def histograms(self):
+    """(name, histogram) of the output time, frame time and lateness, which counts the misses."""
+    return [('output', self.output_hist), ('frame', self.frame_hist), ('missed', self.late_hist)]
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import tempfile
+import unittest
+
+from common.columnar import ColumnarWriter, parse_format, read_blocks, to_line_protocol
+
+FORMAT1 = "carState,user=abc v_ego=%0.4f,enabled=%d,glat=%f %d\n"
+FORMAT2 = "pathPlan,user=abc angle=%0.2f %d\n"
+
+
+class TestColumnar(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.path = os.path.join(self.dir, 'log.col')
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+
+  def test_parse_format(self):
+    self.assertEqual(parse_format(FORMAT1), ['<f4', '<i8', '<f8', '<i8'])
+
+  def test_round_trip(self):
+    rows1 = [(12.5 + i, i % 2 == 0, 48.1234567 + i, 1560000000000 + 10 * i) for i in range(10)]
+    rows2 = [(-3.25, 1560000000005)]
+    writer = ColumnarWriter(self.path, [FORMAT1, FORMAT2], block_rows=4)
+    for row in rows1:
+      writer.append(0, row)
+    writer.write("tuneData,user=abc Kp=0.5 1560000000001\n")
+    writer.append(1, rows2[0])
+    writer.close()
+
+    # reopening appends to the same file
+    writer = ColumnarWriter(self.path, [FORMAT1, FORMAT2])
+    writer.append(1, rows2[0])
+    writer.close()
+
+    expected = "".join([FORMAT1 % row for row in rows1[:8]] + ["tuneData,user=abc Kp=0.5 1560000000001\n"] +
+                       [FORMAT1 % row for row in rows1[8:]] + [FORMAT2 % rows2[0]] * 2)
+    self.assertEqual(to_line_protocol(self.path), expected)
+
+  def test_truncated_block(self):
+    writer = ColumnarWriter(self.path, [FORMAT2], block_rows=1)
+    writer.append(0, (1., 1))
+    writer.append(0, (2., 2))
+    writer.close()
+    with open(self.path, 'r+b') as f:
+      f.truncate(os.path.getsize(self.path) - 3)
+    self.assertEqual(len(list(read_blocks(self.path))), 1)
+
+  def test_schema_mismatch(self):
+    ColumnarWriter(self.path, [FORMAT1]).close()
+    with self.assertRaises(ValueError):
+      ColumnarWriter(self.path, [FORMAT2])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import unittest
+from unittest import mock
+
+import common.realtime as realtime
+from common.realtime import DeadlineScheduler, CATCH_UP_COALESCE, CATCH_UP_SKIP, CATCH_UP_REPLAY
+
+
+class FakeClock():
+  def __init__(self):
+    self.t = 100.
+
+  def __call__(self):
+    return self.t
+
+
+class TestDeadlineScheduler(unittest.TestCase):
+  def setUp(self):
+    self.clock = FakeClock()
+    patcher = mock.patch.object(realtime, 'sec_since_boot', self.clock)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def work(self, duration):
+    self.clock.t += duration
+
+  def test_misses(self):
+    scheduler = DeadlineScheduler(100)
+    scheduler.start_frame()
+    self.work(0.004)
+    scheduler.output_sent()
+    self.assertFalse(scheduler.end_frame())
+    self.assertAlmostEqual(scheduler.slack, 0.006)
+
+    scheduler.start_frame()
+    self.work(0.013)
+    self.assertTrue(scheduler.end_frame())
+    self.assertTrue(scheduler.missed)
+    self.assertEqual(scheduler.misses, 1)
+    self.assertAlmostEqual(scheduler.late_hist.max / 1e6, 3., delta=0.01)
+    self.assertEqual(scheduler.frame_hist.count, 2)
+    self.assertEqual(scheduler.output_hist.count, 1)
+
+  def test_housekeeping_waits_for_slack(self):
+    scheduler = DeadlineScheduler(100)
+    ran = []
+    slow = lambda: (ran.append(scheduler.frame), self.work(0.005))
+
+    # the first run learns the duration
+    scheduler.start_frame()
+    self.assertTrue(scheduler.run('slow', slow, max_defer=3))
+    scheduler.end_frame()
+    for _ in range(10):
+      scheduler.start_frame()
+      self.work(0.008)
+      scheduler.run('slow', slow, max_defer=3)
+      scheduler.end_frame()
+    # put off while the 2ms of slack are not enough, forced every fourth frame
+    self.assertEqual(ran, [0, 4, 8])
+
+    scheduler.start_frame()
+    self.assertTrue(scheduler.run('slow', slow, max_defer=3))
+
+  def test_every(self):
+    scheduler = DeadlineScheduler(100)
+    ran = []
+    for _ in range(10):
+      scheduler.start_frame()
+      scheduler.run('stats', lambda: ran.append(scheduler.frame), every=4)
+      scheduler.end_frame()
+    self.assertEqual(ran, [0, 4, 8])
+
+  def test_policy(self):
+    self.assertEqual(DeadlineScheduler(100).policy, CATCH_UP_COALESCE)
+    self.assertEqual(DeadlineScheduler(100, CATCH_UP_SKIP).policy, CATCH_UP_SKIP)
+    self.assertEqual(DeadlineScheduler(100, CATCH_UP_COALESCE).policy, CATCH_UP_COALESCE)
+    self.assertEqual(DeadlineScheduler(100, CATCH_UP_REPLAY).policy, CATCH_UP_REPLAY)
+    self.assertEqual(DeadlineScheduler(100, 'unknown').policy, CATCH_UP_COALESCE)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+import unittest
+from collections import namedtuple
+from unittest import mock
+
+import common.fingerprints as fingerprints
+
+CanData = namedtuple('CanData', ['address', 'dat'])
+
+FINGERPRINTS = {
+  "CAR A": [{0x100: 8, 0x200: 4}, {0x100: 8, 0x300: 8}],
+  "CAR B": [{0x100: 8, 0x200: 8}],
+  "CAR C": [{0x400: 2}],
+}
+
+
+class TestFingerprints(unittest.TestCase):
+  def setUp(self):
+    cars, index = fingerprints.build_index(FINGERPRINTS)
+    patches = {'_FINGERPRINTS': FINGERPRINTS, '_CARS': cars, '_INDEX': index,
+               '_CAR_BITS': {car_name: 1 << i for i, car_name in enumerate(cars)}}
+    for name, value in patches.items():
+      patcher = mock.patch.object(fingerprints, name, value)
+      patcher.start()
+      self.addCleanup(patcher.stop)
+
+  def test_eliminate_matches_fingerprints(self):
+    for address, length in [(0x100, 8), (0x200, 4), (0x200, 8), (0x300, 8), (0x400, 2), (0x400, 8), (1880, 8), (0x500, 1)]:
+      msg = CanData(address, b'\0' * length)
+      expected = [car_name for car_name in sorted(FINGERPRINTS)
+                  if any(fingerprints.is_valid_for_fingerprint(msg, dict(list(f.items()) + list(fingerprints._DEBUG_ADDRESS.items()))) for f in FINGERPRINTS[car_name])]
+      self.assertEqual(fingerprints.eliminate_incompatible_cars(msg, sorted(FINGERPRINTS)), expected)
+
+  def test_matcher(self):
+    matcher = fingerprints.FingerprintMatcher()
+    self.assertEqual(matcher.count(), 3)
+    matcher.update(0x100, 8)
+    self.assertEqual(matcher.cars(), ["CAR A", "CAR B"])
+    matcher.update(0x100, 8)
+    matcher.update(0x200, 4)
+    self.assertEqual(matcher.cars(), ["CAR A"])
+    self.assertTrue(matcher.only(fingerprints.cars_to_mask(["CAR A", "CAR C"])))
+    self.assertEqual(matcher.report(), [("CAR A", 1.0)])
+
+    matcher.update(0x400, 2)
+    self.assertEqual(matcher.cars(), [])
+    self.assertFalse(matcher.only(fingerprints.cars_to_mask(["CAR A"])))
+
+  def test_report_ranks_by_coverage(self):
+    matcher = fingerprints.FingerprintMatcher(["CAR A", "CAR B"])
+    matcher.update(0x300, 8)
+    matcher.update(1880, 8)
+    self.assertEqual(matcher.report(), [("CAR A", 0.5)])
+    matcher = fingerprints.FingerprintMatcher(["CAR A", "CAR B"])
+    matcher.update(0x100, 8)
+    self.assertEqual(matcher.report(), [("CAR A", 0.5), ("CAR B", 0.5)])
+
+  def test_distinguishing_addresses(self):
+    seen = {0x100: 8, 0x200: 4, 0x300: 8, 0x500: 1, 1880: 8}
+    signature = fingerprints.distinguishing_addresses("CAR A", seen, count=2)
+    self.assertEqual(len(signature), 2)
+    matcher = fingerprints.FingerprintMatcher()
+    for address, length in signature.items():
+      matcher.update(address, length)
+    self.assertEqual(matcher.cars(), ["CAR A"])
+
+    # unknown and debug messages are never part of it
+    signature = fingerprints.distinguishing_addresses("CAR A", seen, count=8)
+    self.assertEqual(signature, {0x100: 8, 0x200: 4, 0x300: 8})
+    self.assertEqual(fingerprints.distinguishing_addresses("CAR C", {0x400: 2}), {0x400: 2})
+    self.assertEqual(fingerprints.distinguishing_addresses("CAR D", seen), {})
+
+
+if __name__ == "__main__":
+  unittest.main()
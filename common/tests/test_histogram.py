@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+import random
+import unittest
+import numpy as np
+
+from common.histogram import Histogram, bucket_index, bucket_range, BUCKETS, SUB_BUCKETS
+
+
+class TestHistogram(unittest.TestCase):
+  def test_buckets(self):
+    rand = random.Random(0)
+    prev = 0
+    for value in list(range(200)) + [rand.randrange(1 << 38) for _ in range(2000)]:
+      index = bucket_index(value)
+      low, width = bucket_range(index)
+      self.assertTrue(low <= value < low + width)
+      self.assertLessEqual(width * SUB_BUCKETS, max(SUB_BUCKETS, value))
+    for value in sorted(rand.randrange(1 << 30) for _ in range(1000)):
+      self.assertGreaterEqual(bucket_index(value), prev)
+      prev = bucket_index(value)
+    self.assertEqual(bucket_index(1 << 50), BUCKETS - 1)
+
+  def test_percentiles(self):
+    values = np.random.RandomState(0).lognormal(13, 1, 5000).astype(np.int64)
+    hist = Histogram()
+    for value in values:
+      hist.record(value)
+    self.assertEqual(hist.count, len(values))
+    self.assertEqual(hist.max, values.max())
+    self.assertAlmostEqual(hist.mean(), values.mean(), delta=1)
+    for p in [50, 90, 99]:
+      self.assertAlmostEqual(hist.percentile(p), np.percentile(values, p), delta=np.percentile(values, p) * 2. / SUB_BUCKETS)
+    self.assertEqual(hist.percentile(100), values.max())
+
+  def test_merge_and_snapshot(self):
+    a, b = Histogram(), Histogram()
+    for value in range(100):
+      (a if value % 2 else b).record(value * 1000)
+    snapshot = a.snapshot()
+    a.merge(b)
+    self.assertEqual(a.count, 100)
+    self.assertEqual(snapshot.count, 50)
+    self.assertEqual(a.stats(1000.)['max'], 99.)
+    a.reset()
+    self.assertEqual(a.percentile(50), 0)
+
+
+if __name__ == "__main__":
+  unittest.main()
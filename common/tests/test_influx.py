@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import gzip
+import threading
+import unittest
+from unittest import mock
+
+import requests
+
+from common.influx import InfluxWriter
+
+URL = 'http://localhost:8086/write?db=carDB'
+CREATE_URL = 'http://localhost:8086/query?q=CREATE DATABASE carDB'
+
+
+class FakeSession(object):
+  """Answers posts with the given status codes, or raises exceptions given instead, then 204."""
+  def __init__(self, responses=()):
+    self.responses = list(responses)
+    self.posts = []
+    self.lock = threading.Lock()
+
+  def post(self, url, data=None, headers=None, timeout=None):
+    with self.lock:
+      self.posts.append((url, gzip.decompress(data).decode() if data is not None else None))
+      response = self.responses.pop(0) if len(self.responses) > 0 else 204
+    if isinstance(response, Exception):
+      raise response
+    return mock.Mock(status_code=response)
+
+  def written(self):
+    return "".join(body for url, body in self.posts if url == URL)
+
+
+def make_writer(session, **kwargs):
+  writer = InfluxWriter(URL, CREATE_URL, **kwargs)
+  writer.session = session
+  return writer
+
+
+class TestInfluxWriter(unittest.TestCase):
+  def test_overflow_drops_oldest(self):
+    writer = make_writer(FakeSession(), max_chunks=3, max_age=60.)
+    for i in range(5):
+      writer.write("line%d\n" % i)
+    self.assertEqual(writer.dropped, 2)
+    self.assertEqual(list(writer.queue), ["line2\n", "line3\n", "line4\n"])
+    self.assertEqual(writer.queued_bytes, 3 * len("line0\n"))
+    self.assertTrue(writer.stop())
+
+  def test_stop_flushes(self):
+    session = FakeSession()
+    # neither the batch size nor the age would send these
+    writer = make_writer(session, batch_bytes=1 << 20, max_age=60.)
+    lines = ["carState v=%d %d\n" % (i, i) for i in range(100)]
+    for line in lines:
+      writer.write(line)
+    self.assertTrue(writer.stop())
+    self.assertEqual(session.written(), "".join(lines))
+    self.assertEqual(writer.sent, len(lines))
+    self.assertEqual(len(writer.queue), 0)
+
+  def test_batches_by_size(self):
+    session = FakeSession()
+    writer = make_writer(session, batch_bytes=20, max_age=60.)
+    for i in range(6):
+      writer.write("0123456789\n")
+    self.assertTrue(writer.stop())
+    self.assertEqual([len(body) for _, body in session.posts], [11] * 6)
+
+  def test_retry(self):
+    session = FakeSession([500, requests.exceptions.ConnectionError()])
+    writer = make_writer(session, max_age=0.)
+    with mock.patch.object(writer.stopping, 'wait', return_value=False):
+      writer.write("carState v=1 1\n")
+      self.assertTrue(writer.stop())
+    self.assertEqual(writer.retried, 2)
+    self.assertEqual(writer.sent, 1)
+    self.assertEqual(writer.failed, 0)
+    self.assertEqual(session.written(), "carState v=1 1\n" * 3)
+
+  def test_retries_exhausted(self):
+    session = FakeSession([500, 500, 500])
+    writer = make_writer(session, max_age=0., retries=2)
+    with mock.patch.object(writer.stopping, 'wait', return_value=False):
+      writer.write("carState v=1 1\n")
+      self.assertTrue(writer.stop())
+    self.assertEqual(writer.failed, 1)
+    self.assertEqual(writer.sent, 0)
+    self.assertEqual(writer.last_status, 500)
+
+  def test_create_database(self):
+    session = FakeSession([404])
+    writer = make_writer(session, max_age=0.)
+    writer.write("carState v=1 1\n")
+    self.assertTrue(writer.stop())
+    self.assertEqual([url for url, _ in session.posts], [URL, CREATE_URL, URL])
+    self.assertEqual(writer.sent, 1)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import tempfile
+import unittest
+
+from common.params import Params, UnknownKeyName
+
+
+class TestParams(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.params = Params(self.tmpdir)
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def test_put_get(self):
+    self.params.put("DongleId", "cb38263377b873ee")
+    self.assertEqual(self.params.get("DongleId"), b"cb38263377b873ee")
+    self.assertEqual(self.params.get("DongleId", encoding='utf8'), "cb38263377b873ee")
+
+  def test_delete_single_key(self):
+    self.params.put("CarVin", "1")
+    self.params.put("DongleId", "2")
+    data_path = os.path.realpath(os.path.join(self.tmpdir, "d"))
+    self.params.delete("CarVin")
+    self.params.delete("CarVin")
+    self.assertIsNone(self.params.get("CarVin"))
+    self.assertEqual(self.params.get("DongleId"), b"2")
+    # the data directory is not rewritten
+    self.assertEqual(os.path.realpath(os.path.join(self.tmpdir, "d")), data_path)
+
+  def test_clear_on_manager_start(self):
+    self.params.put("CarVin", "1")
+    self.params.put("DongleId", "2")
+    self.params.manager_start()
+    self.assertIsNone(self.params.get("CarVin"))
+    self.assertEqual(self.params.get("DongleId"), b"2")
+
+  def test_cached_get(self):
+    cached = Params(self.tmpdir, cache=True)
+    self.assertIsNone(cached.get("LateralGain"))
+    self.params.put("LateralGain", "a")
+    self.assertEqual(cached.get("LateralGain"), b"a")
+    self.params.put("LateralGain", "b")
+    self.assertEqual(cached.get("LateralGain"), b"b")
+    self.params.delete("LateralGain")
+    self.assertIsNone(cached.get("LateralGain"))
+
+  def test_unknown_key(self):
+    with self.assertRaises(UnknownKeyName):
+      self.params.get("swag")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+import os
+import signal
+import unittest
+
+from common.profiler import Profiler, install_toggle
+
+
+class TestProfiler(unittest.TestCase):
+  def test_disabled(self):
+    profiler = Profiler(False, 'test')
+    profiler.checkpoint('a')
+    self.assertEqual(profiler.cp, {})
+    self.assertEqual(profiler.stats(), {})
+
+  def test_histograms(self):
+    profiler = Profiler(True, 'test')
+    for _ in range(10):
+      profiler.checkpoint('wait', True)
+      profiler.checkpoint('work')
+    stats = profiler.stats()
+    self.assertEqual(stats['work']['count'], 10)
+    self.assertLessEqual(stats['work']['p50'], stats['work']['max'])
+    self.assertEqual(profiler.cp_ignored, ['wait'])
+    self.assertEqual(profiler.tot, 1 + profiler.cp['work'])
+
+    # periodic resets keep the histograms
+    profiler.reset(True)
+    profiler.checkpoint('work')
+    self.assertEqual(profiler.stats()['work']['count'], 11)
+
+  def test_toggle(self):
+    profiler = Profiler(False, 'test')
+    install_toggle()
+    self.addCleanup(signal.signal, signal.SIGUSR1, signal.SIG_DFL)
+    os.kill(os.getpid(), signal.SIGUSR1)
+    self.assertTrue(profiler.enabled)
+    profiler.checkpoint('a')
+    self.assertEqual(profiler.stats()['a']['count'], 1)
+    os.kill(os.getpid(), signal.SIGUSR1)
+    self.assertFalse(profiler.enabled)
+    os.kill(os.getpid(), signal.SIGUSR1)
+    self.assertEqual(profiler.stats(), {})
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+import os
+import gzip
+import json
+import base64
+import shutil
+import tempfile
+import unittest
+
+from common.columnar import ColumnarWriter, to_line_protocol
+from common.upload import load_manifest, save_manifest, resume, finished, read_chunks, replace_chunks, gzip_chunks, json_message
+
+FORMAT = "carState,user=abc v_ego=%0.4f %d\n"
+
+
+class TestManifest(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.manifest_path = os.path.join(self.dir, 'upload_manifest.json')
+    self.files = ['a.dat', 'b.dat', 'c.dat']
+    for filename in self.files:
+      with open(os.path.join(self.dir, filename), 'w') as f:
+        f.write("carState v=1 %s\n" % filename)
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+
+  def test_finished(self):
+    self.assertFalse(finished({'acked': False, 'imported': True}, True))
+    self.assertFalse(finished({'acked': True, 'imported': False}, True))
+    self.assertTrue(finished({'acked': True, 'imported': True}, True))
+    self.assertTrue(finished({'acked': True, 'imported': False}, False))
+
+  def test_save_load(self):
+    self.assertEqual(load_manifest(self.manifest_path), {})
+    manifest, _ = resume({}, self.dir, self.files, True)
+    save_manifest(self.manifest_path, manifest)
+    self.assertEqual(load_manifest(self.manifest_path), manifest)
+    with open(self.manifest_path, 'w') as f:
+      f.write('{"a.dat": ')
+    self.assertEqual(load_manifest(self.manifest_path), {})
+
+  def test_resume(self):
+    recorded, done = resume({}, self.dir, self.files, True)
+    self.assertEqual(done, [])
+    self.assertEqual(sorted(recorded), self.files)
+    self.assertFalse(any(e['acked'] or e['imported'] for e in recorded.values()))
+
+    recorded['a.dat'].update({'acked': True, 'imported': True})
+    recorded['b.dat'].update({'acked': True, 'imported': False})
+    recorded['c.dat'].update({'acked': False, 'imported': True})
+    recorded['gone.dat'] = dict(recorded['c.dat'])
+    save_manifest(self.manifest_path, recorded)
+
+    manifest, done = resume(load_manifest(self.manifest_path), self.dir, self.files, True)
+    self.assertEqual(done, ['a.dat'])
+    # acked but not imported is only imported again, imported but not acked only uploaded again
+    self.assertEqual(sorted(manifest), ['b.dat', 'c.dat'])
+    self.assertTrue(manifest['b.dat']['acked'])
+    self.assertTrue(manifest['c.dat']['imported'])
+
+    # without local import being acked is enough
+    manifest, done = resume(load_manifest(self.manifest_path), self.dir, self.files, False)
+    self.assertEqual(done, ['a.dat', 'b.dat'])
+
+  def test_changed_file_starts_over(self):
+    recorded, _ = resume({}, self.dir, self.files, True)
+    for entry in recorded.values():
+      entry.update({'acked': True, 'imported': True})
+    with open(os.path.join(self.dir, 'b.dat'), 'a') as f:
+      f.write("carState v=2 0\n")
+    manifest, done = resume(recorded, self.dir, self.files, True)
+    self.assertEqual(done, ['a.dat', 'c.dat'])
+    self.assertEqual(manifest['b.dat']['stat']['size'], os.path.getsize(os.path.join(self.dir, 'b.dat')))
+    self.assertFalse(manifest['b.dat']['acked'])
+    self.assertFalse(manifest['b.dat']['imported'])
+
+
+class TestStreaming(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+
+  def test_replace_across_chunks(self):
+    data = b"carState,a=1 carState x\xc3\xa9 carStatecarState end carStat"
+    for size in range(1, len(data) + 2):
+      chunks = [data[i:i + size] for i in range(0, len(data), size)]
+      self.assertEqual(b''.join(replace_chunks(chunks, b'carState', b'user1')), data.replace(b'carState', b'user1'), size)
+
+  def test_read_chunks(self):
+    path = os.path.join(self.dir, 'log.dat')
+    data = os.urandom(10000)
+    with open(path, 'wb') as f:
+      f.write(data)
+    chunks = list(read_chunks(path, 4096))
+    self.assertEqual([len(c) for c in chunks], [4096, 4096, 1808])
+    self.assertEqual(b''.join(chunks), data)
+
+    path = os.path.join(self.dir, 'log.col')
+    writer = ColumnarWriter(path, [FORMAT], block_rows=4)
+    for i in range(10):
+      writer.append(0, (i * 0.5, 1560000000000 + i))
+    writer.close()
+    self.assertEqual(b''.join(read_chunks(path)), to_line_protocol(path).encode())
+
+  def test_json_message(self):
+    # a multi byte character split between chunks
+    data = 'carState,user=abc v="é\\"quoted\\"" 1\n'.encode() * 100
+    chunks = [data[i:i + 7] for i in range(0, len(data), 7)]
+    header = {"user_id": "abc", "file_name": "log.dat", "identifier": 42}
+
+    message = json_message(header, chunks)
+    self.assertEqual(bytes(message), json.dumps(dict(header, file_content=data.decode())).encode())
+
+    message = json.loads(bytes(json_message(header, chunks, compress=True)).decode())
+    self.assertEqual(message['encoding'], 'gzip')
+    self.assertEqual(gzip.decompress(base64.b64decode(message['file_content'])), data)
+    self.assertEqual(message['file_name'], 'log.dat')
+
+  def test_gzip_chunks(self):
+    data = b"carState v=1 0\n" * 1000
+    self.assertEqual(gzip.decompress(b''.join(gzip_chunks([data[:100], data[100:]]))), data)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,108 @@
+import os
+import json
+import zlib
+import base64
+import codecs
+
+from common.columnar import iter_line_protocol
+
+# Upload state of drive logs and the streaming of a log into the json message of the upload
+# server. The manifest keeps whether every file was acked by the server and taken by the local
+# influx, a file is only finished, and deleted, once both are done or local import is off.
+
+CHUNK_SIZE = 1 << 20
+
+def load_manifest(path):
+  try:
+    with open(path) as f:
+      return json.load(f)
+  except (IOError, ValueError):
+    return {}
+
+def save_manifest(path, manifest):
+  with open(path + '.tmp', 'w') as f:
+    json.dump(manifest, f)
+  os.rename(path + '.tmp', path)
+
+def file_stat(path):
+  stat = os.stat(path)
+  return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+def finished(entry, import_local):
+  return entry['acked'] and (entry['imported'] or not import_local)
+
+def resume(recorded, upload_dir, files, import_local):
+  """Manifest of files with the recorded entries of those unchanged since, entries of changed files
+  start over. Returns it without the files that were finished before, and those files."""
+  manifest = {}
+  for filename, entry in recorded.items():
+    if filename in files and entry['stat'] == file_stat(os.path.join(upload_dir, filename)):
+      manifest[filename] = entry
+  done = []
+  for filename in files:
+    if filename not in manifest:
+      manifest[filename] = {'stat': file_stat(os.path.join(upload_dir, filename)), 'acked': False, 'imported': False}
+    elif finished(manifest[filename], import_local):
+      done.append(filename)
+      del manifest[filename]
+  return manifest, done
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+  """Content of a drive log in chunks, columnar logs as line protocol one block at a time."""
+  if path.endswith(".col"):
+    for text in iter_line_protocol(path):
+      yield text.encode()
+    return
+  with open(path, 'rb') as f:
+    while True:
+      chunk = f.read(chunk_size)
+      if len(chunk) == 0:
+        return
+      yield chunk
+
+def replace_chunks(chunks, old, new):
+  """bytes.replace over a stream of chunks, including matches across chunk borders."""
+  tail = b''
+  for chunk in chunks:
+    buf = tail + chunk
+    # matches starting at end or later may continue in the next chunk
+    end = len(buf) - len(old) + 1
+    split = buf.find(old, max(0, end - len(old) + 1))
+    if 0 <= split < end:
+      end = split + len(old)
+    end = max(0, end)
+    yield buf[:end].replace(old, new)
+    tail = buf[end:]
+  yield tail
+
+def gzip_chunks(chunks, level=1):
+  gz = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+  for chunk in chunks:
+    data = gz.compress(chunk)
+    if len(data) > 0:
+      yield data
+  yield gz.flush()
+
+def json_message(header, chunks, compress=False):
+  """json of header with the chunks as its file_content, gzipped and base64 encoded with compress.
+  Built in one buffer, the content is never held as a whole besides it."""
+  out = bytearray(json.dumps(header)[:-1].encode())
+  out += b', "file_content": "'
+  if compress:
+    pending = b''
+    for data in gzip_chunks(chunks, 6):
+      # base64 of whole 3 byte groups only, the rest waits for the next chunk
+      pending += data
+      cut = len(pending) - len(pending) % 3
+      out += base64.b64encode(pending[:cut])
+      pending = pending[cut:]
+    out += base64.b64encode(pending)
+    out += b'", "encoding": "gzip"}'
+  else:
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in chunks:
+      out += json.dumps(decoder.decode(chunk))[1:-1].encode()
+    out += json.dumps(decoder.decode(b'', final=True))[1:-1].encode()
+    out += b'"}'
+  return out
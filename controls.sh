@@ -1,6 +1,8 @@
 #!/bin/bash
 cd ~/raspilot
 export PYTHONPATH="$PWD"
+pkill -f tuned
+python ~/raspilot/selfdrive/tuned.py &
 pkill -f controlsd
 pkill -f pandad
 pkill -f boardd
@@ -9,11 +9,13 @@ from cereal import log, car
 import selfdrive.messaging as messaging
 from selfdrive.services import service_list
 from common.params import Params
-from common.profiler import Profiler
+from common.profiler import Profiler, install_toggle
+from common.columnar import ColumnarWriter
+from common.influx import InfluxWriter
+from selfdrive.controls.lib.live_tune import LiveTune
 import numpy as np
 from setproctitle import setproctitle
 from selfdrive.kegman_conf import kegman_conf
-import requests
 
 SERVER_ADDRESS = "gernstation.synology.me"
 #SERVER_ADDRESS = '192.168.1.3'   
@@ -23,6 +25,7 @@ setproctitle('dashboard')
 frame_count = 0
 params = Params()
 profiler = Profiler(False, 'dashboard')
+install_toggle()
 user_id = str(params.get("PandaDongleId", True))
 user_id = user_id.replace("'","")
 
@@ -31,10 +34,12 @@ try:
   kegman = kegman_conf(car_params)  
   do_influx = True if kegman.conf['useInfluxDB'] == '1' else False
   kegman_valid = ('tuneRev' in kegman.conf)
+  use_shm = kegman.conf['carStateShm'] == '1'
 except:
   print("kegman error")
   kegman_valid = False
   do_influx = False
+  use_shm = False
 
 do_send_live = False
 target_address = '127.0.0.1'
@@ -42,12 +47,18 @@ cred = ''  #'u=liveOP&p=liveOP&'
 target_URL = 'http://%s:8086/write?db=carDB&%sprecision=ms' % (target_address, cred)
 #target_URL = 'http://192.168.137.1:8086/write?db=carDB&precision=ms' 
 print(target_URL)
+influx = InfluxWriter(target_URL, 'http://%s:8086/query?q=CREATE DATABASE carDB' % target_address) if do_influx else None
 
 context = zmq.Context()
 poller = zmq.Poller()
 vEgo = 0.0
 
-carState = messaging.sub_sock(service_list['carState'].port, conflate=False)
+if use_shm:
+  carState = messaging.ShmSubSock('carState')
+  carStatePoll = carState.doorbell
+else:
+  carState = messaging.sub_sock(service_list['carState'].port, conflate=False)
+  carStatePoll = carState
 pathPlan = messaging.sub_sock(service_list['pathPlan'].port, conflate=True)
 heartBeatSub = messaging.sub_sock(8597, addr=SERVER_ADDRESS, conflate=True)
 
@@ -56,7 +67,7 @@ serverPush = None
 tuneSub = None
      
 if pathPlan != None: poller.register(pathPlan, zmq.POLLIN)
-if carState != None: poller.register(carState, zmq.POLLIN)
+if carState != None: poller.register(carStatePoll, zmq.POLLIN)
 if heartBeatSub != None: poller.register(heartBeatSub, zmq.POLLIN)
 
 kegmanInsertString = ""
@@ -89,7 +100,6 @@ kegmanDataString = []
 localCarStateDataString1 = []
 localCarStateDataString2 = []
 insertString = []
-fileStrings = []
 canInsertString = []
 next_beat_check = time.time() + 20
 live_stream_lag = 10
@@ -102,11 +112,11 @@ stock_cam_frame_prev = 0
 cs = None
 lastHeartBeat = 0
 gpsCount = 0
-kegtime_prev = 0
+live_tune = LiveTune()
 
-messaging.drain_sock(carState, True)
+messaging.drain_sock_raw(carState, True)
 messaging.drain_sock(pathPlan, False)
-messaging.drain_sock(carState, False)
+messaging.drain_sock_raw(carState, False)
 
 prev_angle = 0
 prev_time = 0
@@ -131,11 +141,11 @@ while 1:
   for socket, event in poller.poll(3000):
     profiler.checkpoint('poller', False)
 
-    if socket is carState:
+    if socket is carStatePoll:
       # Wait 4 control cycles to let Transcoderd do its good stuff
       time.sleep(0.04)
       for _cs in carState.recv_multipart():
-        cs = log.Event.from_bytes(_cs).carState
+        cs = messaging.event_from_bytes(_cs, getattr(carState, 'packed', False)).carState
         vEgo = cs.vEgo
         if vEgo > 0 and cs.canTime//60000 > previous_minute:
           profiler.checkpoint('carstate')
@@ -143,7 +153,7 @@ while 1:
           if not logfile is None: logfile.close()
           previous_minute = cs.canTime//60000
           time.sleep(0.00001)
-          logfile = open('/data/upload/%s_%0.0f.dat' % (user_id, time.time()//60), "a")
+          logfile = ColumnarWriter('/data/upload/%s_%0.0f.col' % (user_id, time.time()//60), [localCarStateFormatString2, localCarStateFormatString1])
           profiler.checkpoint('create_file')
 
         fast_calculated_rate = 1000 * (cs.steeringAngle - fast_prev_angle) / max(0.00001, cs.sysTime - fast_prev_time)
@@ -176,9 +186,7 @@ while 1:
             localCarStateDataString2.append(localCarStateFormatString2 % send_data)
           profiler.checkpoint('carstate')
           if vEgo > 0:
-            fileStrings.append(localCarStateFormatString2 % send_data)
-            #time.sleep(0.00001)
-            #logfile.write(localCarStateFormatString2 % send_data)
+            logfile.append(0, send_data)
             profiler.checkpoint('write_file')
           if do_send_live and (frame % 2 == 0 or live_stream_lag < 3) and (vEgo > 0 or frame % 45 == 0):
             serverCarStateDataString2.append(serverCarStateDataFormatString2 % send_data)
@@ -189,10 +197,7 @@ while 1:
                             cs.lateralControlState.pidState.steerAngle, cs.lateralControlState.pidState.steerAngleDes, 1.0 - cs.lateralControlState.pidState.angleFFRatio, cs.lateralControlState.pidState.angleFFRatio, fast_calculated_rate, cs.camLeft.frame, cs.camFarRight.frame, cs.canTime - cs.sysTime, cs.canTime)
         
           profiler.checkpoint('carstate')
-          fileStrings.append(localCarStateFormatString1 % send_data)
-          #time.sleep(0.00001)
-          #logfile.write(localCarStateFormatString1 % send_data)
-          #profiler.checkpoint('write_file')
+          logfile.append(1, send_data)
           if do_influx:
             localCarStateDataString1.append(localCarStateFormatString1 % send_data)
           if do_send_live and live_stream_lag < 1.5: 
@@ -230,6 +235,9 @@ while 1:
       else:
         print(config)
       do_send_live = True
+      if do_influx:
+        # the live stream replaces influx, what is queued still goes out
+        influx.stop()
       do_influx = False
       itemChanged = False
       try:
@@ -270,10 +278,9 @@ while 1:
 
   if kegman_valid and not cs is None and not logfile is None:
     try:
-      (mode, ino, dev, nlink, uid, gid, size, atime, mtime, kegtime) = os.stat(os.path.expanduser('~/kegman.json'))
-      if kegtime != kegtime_prev:
-        kegtime_prev = kegtime
-        kegman = kegman_conf() 
+      tune = live_tune.update()
+      if tune is not None:
+        kegman.conf.update(tune)
         kegmanInsertString = ["tuneData,user=" + user_id + " "]
         #kegmanInsertString.append('cpu_pct=')
         #kegmanInsertString.append(psutil.cpu_percent())
@@ -306,21 +313,8 @@ while 1:
     localPathDataString = []
     kegmanInsertString = ""
     if do_influx and frame > 5:
-      try:
-        time.sleep(0.00001)
-        r = requests.post(target_URL, data=insertString)
-        time.sleep(0.00001)
-        #dashPub.send_string(insertString)
-        if r.status_code == 404:
-          #print(r)
-          r = requests.post('http://localhost:8086/query?q=CREATE DATABASE carDB')
-          #print(r)
-        if frame % 3 == 0: print(len(insertString), r)
-      except:
-        try:
-          r = requests.post('http://localhost:8086/query?q=CREATE DATABASE carDB')
-        except:
-          r = requests.post(target_URL, data='create database carDB')
+      influx.write(insertString)
+      if frame % 3 == 0: print(len(insertString), influx.status())
     profiler.checkpoint('influx')
 
   elif do_send_live and ((vEgo > 0 and len(serverCarStateDataString2) >= 45) or (vEgo == 0 and len(serverCarStateDataString2) > 0)):
@@ -363,11 +357,6 @@ while 1:
     frame += 1
     profiler.display()
     profiler.reset(True)
-  
-  if len(fileStrings) > 0:
-    logfile.writelines(fileStrings)
-    fileStrings.clear()
-    profiler.checkpoint('write_file')
 
   #  time.sleep(0.02)
   #time.sleep(3)
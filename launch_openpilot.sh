@@ -1,6 +1,8 @@
 #!/bin/bash
 cd ~/raspilot
 export PYTHONPATH="$PWD"
+pkill -f tuned
+python3 selfdrive/tuned.py &
 pkill -f transcoderd
 python3 selfdrive/controls/transcoderd.py &
 #taskset -a --cpu-list 2,3 python3 selfdrive/controls/transcoderd2.py &
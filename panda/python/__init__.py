@@ -15,6 +15,7 @@ from .flash_release import flash_release
 from .update import ensure_st_up_to_date
 from .serial import PandaSerial
 from .isotp import isotp_send, isotp_recv
+from .can_codec import CAN_DTYPE, decode as decode_can_buffer, encode as encode_can_buffer
 
 __version__ = '0.0.9'
 
@@ -464,14 +465,21 @@ class Panda(object):
       snd = snd.ljust(0x10, b'\x00')
       snds.append(snd)
 
+    self._can_bulk_write(b''.join(snds))
+
+  def can_send_array(self, frames):
+    """can_send_many for a CAN_DTYPE structured array, encoded without a Python loop."""
+    self._can_bulk_write(encode_can_buffer(frames))
+
+  def _can_bulk_write(self, dat):
     while True:
       try:
-        #print("DAT: %s"%b''.join(snds).__repr__())
+        #print("DAT: %s"%dat.__repr__())
         if self.wifi:
-          for s in snds:
-            self._handle.bulkWrite(3, s)
+          for i in range(0, len(dat), 0x10):
+            self._handle.bulkWrite(3, dat[i:i+0x10])
         else:
-          self._handle.bulkWrite(3, b''.join(snds))
+          self._handle.bulkWrite(3, dat)
         break
       except (usb1.USBErrorIO, usb1.USBErrorOverflow):
         print("CAN: BAD SEND MANY, RETRYING")
@@ -480,6 +488,13 @@ class Panda(object):
     self.can_send_many([[addr, None, dat, bus]])
 
   def can_recv(self):
+    return parse_can_buffer(self._can_bulk_read())
+
+  def can_recv_array(self):
+    """can_recv as a CAN_DTYPE structured array."""
+    return decode_can_buffer(self._can_bulk_read())
+
+  def _can_bulk_read(self):
     dat = bytearray()
     while True:
       try:
@@ -488,7 +503,7 @@ class Panda(object):
       except (usb1.USBErrorIO, usb1.USBErrorOverflow):
         print("CAN: BAD RECV, RETRYING")
         time.sleep(0.1)
-    return parse_can_buffer(dat)
+    return dat
 
   def can_clear(self, bus):
     """Clears all messages from the specified internal CAN ringbuffer as
@@ -0,0 +1,53 @@
+import numpy as np
+
+# The 16 byte USB record of a CAN frame, decoded and encoded for a whole bulk transfer at once:
+#   RIR: address << 21 (standard) or address << 3 | 4 (extended), bit 0 set for transmit
+#   data length | bus << 4 | busTime << 16
+#   8 data bytes, zero padded
+
+WIRE_DTYPE = np.dtype([('rir', '<u4'), ('f2', '<u4'), ('dat', 'u1', (8,))])
+CAN_DTYPE = np.dtype([('address', '<u4'), ('busTime', '<u2'), ('len', 'u1'), ('bus', 'u1'), ('dat', 'u1', (8,))])
+
+EXTENDED = 4
+TRANSMIT = 1
+
+def decode(buf):
+  """Frames of a bulk read as a CAN_DTYPE array, a trailing partial record is ignored."""
+  wire = np.frombuffer(buf, dtype=WIRE_DTYPE, count=len(buf) // WIRE_DTYPE.itemsize)
+  rir = wire['rir']
+  f2 = wire['f2']
+  frames = np.empty(len(wire), dtype=CAN_DTYPE)
+  frames['address'] = np.where(rir & EXTENDED, rir >> 3, rir >> 21)
+  frames['busTime'] = f2 >> 16
+  frames['len'] = f2 & 0xF
+  frames['bus'] = (f2 >> 4) & 0xFF
+  frames['dat'] = wire['dat']
+  return frames
+
+def encode(frames):
+  """Wire records to send a CAN_DTYPE array, addresses from 0x800 up are sent extended."""
+  address = frames['address'].astype(np.uint32)
+  length = frames['len'].astype(np.uint32)
+  assert np.all(length <= 8)
+  wire = np.empty(len(frames), dtype=WIRE_DTYPE)
+  wire['rir'] = np.where(address >= 0x800, (address << 3) | TRANSMIT | EXTENDED, (address << 21) | TRANSMIT)
+  wire['f2'] = length | (frames['bus'].astype(np.uint32) << 4)
+  # bytes past the length go out as zeros, like the padding of can_send_many
+  wire['dat'] = np.where(np.arange(8) < length[:, None], frames['dat'], 0)
+  return wire.tobytes()
+
+def from_list(arr):
+  """CAN_DTYPE array of can_send_many style (address, busTime, dat, bus) entries."""
+  frames = np.zeros(len(arr), dtype=CAN_DTYPE)
+  for i, (address, bus_time, dat, bus) in enumerate(arr):
+    assert len(dat) <= 8
+    frames[i]['address'] = address
+    frames[i]['busTime'] = bus_time or 0
+    frames[i]['len'] = len(dat)
+    frames[i]['bus'] = bus
+    frames[i]['dat'][:len(dat)] = np.frombuffer(bytes(dat), dtype=np.uint8)
+  return frames
+
+def to_list(frames):
+  """(address, busTime, dat, bus) tuples as returned by parse_can_buffer."""
+  return [(int(f['address']), int(f['busTime']), f['dat'][:f['len']].tobytes(), int(f['bus'])) for f in frames]
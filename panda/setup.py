@@ -50,7 +50,8 @@ setup(
     'hexdump >= 3.3',
     'pycrypto >= 2.6.1',
     'tqdm >= 4.14.0',
-    'requests'
+    'requests',
+    'numpy'
   ],
   ext_modules = [],
   description="Code powering the comma.ai panda",
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+import struct
+import unittest
+import numpy as np
+from panda.python import parse_can_buffer
+from panda.python.can_codec import CAN_DTYPE, decode, encode, from_list, to_list
+
+FRAMES = [(0x1aa, 0, b'\x01\x02\x03', 0), (0x18daf1ff, 0, b'\xff' * 8, 1), (0xe4, 0, b'', 2), (0x7ff, 0, b'\x00\x11\x22\x33\x44', 3)]
+
+def wire_record(address, bus_time, dat, bus):
+  # receive records carry the bus time, and no transmit bit
+  rir = (address << 3) | 4 if address >= 0x800 else address << 21
+  return struct.pack("II", rir, len(dat) | (bus << 4) | (bus_time << 16)) + dat.ljust(8, b'\x00')
+
+
+class TestCanCodec(unittest.TestCase):
+  def test_decode_matches_parse_can_buffer(self):
+    buf = b''.join(wire_record(address, 1000 + i, dat, bus) for i, (address, _, dat, bus) in enumerate(FRAMES))
+    frames = decode(buf)
+    self.assertEqual(frames.dtype, CAN_DTYPE)
+    self.assertEqual(to_list(frames), parse_can_buffer(buf))
+
+  def test_encode_round_trip(self):
+    frames = from_list(FRAMES)
+    buf = encode(frames)
+    self.assertEqual(len(buf), 0x10 * len(FRAMES))
+    self.assertEqual(to_list(decode(buf)), FRAMES)
+
+  def test_encode_matches_can_send_many(self):
+    frames = from_list(FRAMES)
+    # garbage past the length is not sent
+    frames['dat'][:, 7] = 0xaa
+    frames['dat'][1, 7] = 0xff
+    expected = b''
+    for address, _, dat, bus in FRAMES:
+      rir = (address << 3) | 5 if address >= 0x800 else (address << 21) | 1
+      expected += (struct.pack("II", rir, len(dat) | (bus << 4)) + dat).ljust(0x10, b'\x00')
+    self.assertEqual(encode(frames), expected)
+
+  def test_partial_record(self):
+    buf = wire_record(0x1aa, 5, b'\x01', 0)
+    self.assertEqual(len(decode(buf + buf[:7])), 1)
+    self.assertEqual(len(decode(b'')), 0)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -27,6 +27,7 @@
 #include "common/timing.h"
 
 #include <map>
+#include <unordered_set>
 #include <algorithm>
 
 // double the FIFO size
@@ -58,7 +59,9 @@ bool pigeon_needs_init;
 
 int big_recv;
 uint32_t big_data[RECV_SIZE*4];
-std::map<uint32_t, uint64_t> message_index;
+// (bus << 32) | address of the frames forwarded, and of those that trigger publishing
+std::unordered_set<uint64_t> message_index;
+std::unordered_set<uint64_t> sync_index;
 bool index_initialized = false;
 
 void pigeon_init();
@@ -113,11 +116,19 @@ void *safety_setter_thread(void *s) {
   auto canIDs = car_params.getCanIds();
   for (int i=0; i<canIDs.size(); i++) {
     for (int j=0; j<canIDs[i].size(); j++) {
-      message_index[canIDs[i][j]] = 0;
-      LOGW("message id %d added", canIDs[i][j]);
+      message_index.insert(((uint64_t)i << 32) | canIDs[i][j]);
+      LOGW("message id %d added on bus %d", canIDs[i][j], i);
     }
   }
-  index_initialized = true;
+  auto syncIDs = car_params.getCanSyncIds();
+  for (int i=0; i<syncIDs.size(); i++) {
+    for (int j=0; j<syncIDs[i].size(); j++) {
+      sync_index.insert(((uint64_t)i << 32) | syncIDs[i][j]);
+      LOGW("sync id %d added on bus %d", syncIDs[i][j], i);
+    }
+  }
+  // without canIds everything is forwarded
+  index_initialized = !message_index.empty();
 
   auto safety_model = car_params.getSafetyModel();
   auto safety_param = car_params.getSafetyParam();
@@ -263,9 +274,11 @@ bool can_recv(void *s, bool force_send) {
   force_send = false;
   int j = 0;
   for (int i = 0; i<(recv/0x10); i++) {
-    auto message = message_index.find(data[i*4] >> 21);
-    if ((message != message_index.end()) | (index_initialized == false)) {
-      if (data[i*4] >> 21 == 330) force_send = true;
+    address = (data[i*4] & 4) ? (data[i*4] >> 3) : (data[i*4] >> 21);
+    uint64_t key = ((uint64_t)((data[i*4+1] >> 4) & 0xff) << 32) | address;
+    if ((index_initialized == false) || (message_index.find(key) != message_index.end())) {
+      // before CarParams, and with CarParams without sync ids, publish on 330 of any bus
+      if ((index_initialized && !sync_index.empty()) ? (sync_index.find(key) != sync_index.end()) : (address == 330)) force_send = true;
       big_data[(big_index + j)*4] = data[i*4];
       big_data[(big_index + j)*4+1] = data[i*4+1];
       big_data[(big_index + j)*4+2] = data[i*4+2];
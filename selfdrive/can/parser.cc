@@ -164,6 +164,17 @@ struct MessageState {
     return true;
   }
 
+  bool parse_dat(uint64_t sec, uint16_t ts_, const capnp::Data::Reader& d) {
+    uint8_t dat[8] = {0};
+    memcpy(dat, d.begin(), d.size());
+
+    // Assumes all signals in the message are of the same type (little or big endian)
+    // TODO: allow signals within the same message to have different endianess
+    uint64_t p = parse_sigs[0].is_little_endian ? read_u64_le(dat) : read_u64_be(dat);
+    DEBUG("  proc %X: %llx\n", address, p);
+    return parse(sec, ts_, p);
+  }
+
 
   bool update_counter_generic(int64_t v, int cnt_size) {
     uint8_t old_counter = counter;
@@ -283,7 +294,6 @@ class CANParser {
   void UpdateCans(uint64_t sec, const capnp::List<cereal::CanData>::Reader& cans) {
       int msg_count = cans.size();
       int msg_count2 = 0;
-      uint64_t p;
 
       DEBUG("got %d messages\n", msg_count);
 
@@ -302,21 +312,7 @@ class CANParser {
         }
 
         if (cmsg.getDat().size() > 8) continue; //shouldnt ever happen
-        uint8_t dat[8] = {0};
-        memcpy(dat, cmsg.getDat().begin(), cmsg.getDat().size());
-
-        // Assumes all signals in the message are of the same type (little or big endian)
-        // TODO: allow signals within the same message to have different endianess
-        auto& sig = message_states[cmsg.getAddress()].parse_sigs[0];
-        if (sig.is_little_endian) {
-            p = read_u64_le(dat);
-        } else {
-            p = read_u64_be(dat);
-        }
-
-        DEBUG("  proc %X: %llx\n", cmsg.getAddress(), p);
-
-        state_it->second.parse(sec, cmsg.getBusTime(), p);
+        state_it->second.parse_dat(sec, cmsg.getBusTime(), cmsg.getDat());
       }
       //if (bus > -1) printf("got %d messages on bus %d\n", msg_count2, bus);
 
@@ -348,6 +344,26 @@ class CANParser {
     auto cans = event.getCan();
     UpdateCans(last_sec, cans);
 
+    first_sec = last_sec;
+    UpdateValid(last_sec);
+  }
+
+  // Parses a backlog of can events at once, only the latest values are kept.
+  void update_strings(const std::vector<std::string> &data) {
+    if (data.empty()) return;
+    first_sec = 0;
+    for (const auto &d : data) {
+      auto amsg = kj::heapArray<capnp::word>((d.length() / sizeof(capnp::word)) + 1);
+      memcpy(amsg.begin(), d.data(), d.length());
+
+      capnp::FlatArrayMessageReader cmsg(amsg);
+      cereal::Event::Reader event = cmsg.getRoot<cereal::Event>();
+      last_sec = event.getLogMonoTime();
+      if (first_sec == 0) {
+        first_sec = last_sec;
+      }
+      UpdateCans(last_sec, event.getCan());
+    }
     UpdateValid(last_sec);
   }
 
@@ -391,6 +407,7 @@ class CANParser {
 
     //printf("  updating for bus %d", bus);
     last_sec = sec;
+    first_sec = sec;
     UpdateValid(sec);
     zmq_msg_close(&msg);
     return result;
@@ -401,7 +418,8 @@ class CANParser {
 
     for (const auto& kv : message_states) {
       const auto& state = kv.second;
-      if (last_sec != 0 && state.seen != last_sec) continue;
+      // everything seen since the first event of the last update
+      if (last_sec != 0 && state.seen < first_sec) continue;
 
       for (int i=0; i<state.parse_sigs.size(); i++) {
         const Signal &sig = state.parse_sigs[i];
@@ -418,6 +436,7 @@ class CANParser {
   }
   
   bool can_valid = false;
+  uint64_t first_sec = 0;
   uint64_t last_sec = 0;
 
  private:
@@ -430,6 +449,62 @@ class CANParser {
 
   const DBC *dbc = NULL;
   std::unordered_map<uint32_t, MessageState> message_states;
+
+  friend class CANParserGroup;
+};
+
+// Parsers of different buses fed from one decode of each event. Frames are routed by
+// (src, address) straight to the message states of every parser that wants them.
+class CANParserGroup {
+ public:
+  CANParserGroup(const std::vector<CANParser*> &aparsers) : parsers(aparsers) {
+    for (auto cp : parsers) {
+      for (auto& kv : cp->message_states) {
+        routes[route_key(cp->bus, kv.first)].push_back(&kv.second);
+      }
+    }
+  }
+
+  void update_strings(const std::vector<std::string> &data) {
+    if (data.empty()) return;
+    uint64_t first_sec = 0;
+    uint64_t last_sec = 0;
+    for (const auto &d : data) {
+      auto amsg = kj::heapArray<capnp::word>((d.length() / sizeof(capnp::word)) + 1);
+      memcpy(amsg.begin(), d.data(), d.length());
+
+      capnp::FlatArrayMessageReader cmsg(amsg);
+      cereal::Event::Reader event = cmsg.getRoot<cereal::Event>();
+      last_sec = event.getLogMonoTime();
+      if (first_sec == 0) {
+        first_sec = last_sec;
+      }
+
+      for (auto frame : event.getCan()) {
+        auto route = routes.find(route_key(frame.getSrc(), frame.getAddress()));
+        if (route == routes.end()) continue;
+        if (frame.getDat().size() > 8) continue; //shouldnt ever happen
+        for (auto state : route->second) {
+          state->parse_dat(last_sec, frame.getBusTime(), frame.getDat());
+        }
+      }
+    }
+
+    for (auto cp : parsers) {
+      cp->first_sec = first_sec;
+      cp->last_sec = last_sec;
+      cp->UpdateValid(last_sec);
+    }
+  }
+
+ private:
+  static uint64_t route_key(int src, uint32_t address) {
+    return ((uint64_t)(src & 0xff) << 32) | address;
+  }
+
+  std::vector<CANParser*> parsers;
+  // message states never move after the parsers are built
+  std::unordered_map<uint64_t, std::vector<MessageState*> > routes;
 };
 
 }
@@ -469,6 +544,24 @@ void can_update_string(void *can, const char* dat, int len) {
   cp->update_string(std::string(dat, len));
 }
 
+void can_update_strings(void *can, const std::vector<std::string> &data) {
+  CANParser* cp = (CANParser*)can;
+  cp->update_strings(data);
+}
+
+void* can_group_init(const std::vector<void*> &cans) {
+  std::vector<CANParser*> parsers;
+  for (auto can : cans) {
+    parsers.push_back((CANParser*)can);
+  }
+  return (void*)new CANParserGroup(parsers);
+}
+
+void can_group_update_strings(void *group, const std::vector<std::string> &data) {
+  CANParserGroup* cg = (CANParserGroup*)group;
+  cg->update_strings(data);
+}
+
 size_t can_query_latest(void* can, bool *out_can_valid, size_t out_values_size, SignalValue* out_values) {
   CANParser* cp = (CANParser*)can;
 
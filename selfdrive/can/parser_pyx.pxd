@@ -1,11 +1,12 @@
 # distutils: language = c++
 #cython: language_level=3
 
-from libc.stdint cimport uint32_t, uint64_t, uint16_t
+from libc.stdint cimport uint32_t, uint64_t, uint16_t, uintptr_t
 from libcpp.vector cimport vector
 from libcpp.map cimport map
 from libcpp.string cimport string
 from libcpp.unordered_set cimport unordered_set
+from libcpp.utility cimport pair
 from libcpp cimport bool
 
 ctypedef enum SignalType:
@@ -70,6 +71,9 @@ ctypedef void* (*can_init_with_vectors_func)(int bus, const char* dbc_name,
                 int timeout)
 ctypedef int (*can_update_func)(void* can, uint64_t sec, bool wait);
 ctypedef void (*can_update_string_func)(void* can, const char* dat, int len);
+ctypedef void (*can_update_strings_func)(void* can, const vector[string] &data);
+ctypedef void* (*can_group_init_func)(const vector[void*] &cans);
+ctypedef void (*can_group_update_strings_func)(void* group, const vector[string] &data);
 ctypedef size_t (*can_query_latest_func)(void* can, bool *out_can_valid, size_t out_values_size, SignalValue* out_values);
 ctypedef void (*can_query_latest_vector_func)(void* can, bool *out_can_valid,  vector[SignalValue] &values)
 
@@ -81,11 +85,16 @@ cdef class CANParser:
     can_init_with_vectors_func can_init_with_vectors
     can_update_func can_update
     can_update_string_func can_update_string
+    can_update_strings_func can_update_strings
     can_query_latest_vector_func can_query_latest_vector
     map[string, uint32_t] msg_name_to_address
     map[uint32_t, string] address_to_msg_name
     vector[SignalValue] can_values
     bool test_mode_enabled
+    # (address, DBC signal name pointer) -> slot in values
+    map[pair[uint32_t, uintptr_t], int] slot_index
+    double[::1] values_view
+    bool vl_dicts
   cdef public:
     string dbc_name
     dict vl
@@ -93,5 +102,14 @@ cdef class CANParser:
     bool can_valid
     int can_invalid_cnt
     dict addr
+    object values
+    dict handles
 
   cdef unordered_set[uint32_t] update_vl(self)
+
+cdef class CANParserGroup:
+  cdef:
+    void *group
+    can_group_update_strings_func can_group_update_strings
+  cdef public:
+    list parsers
@@ -3,13 +3,15 @@
 
 from posix.dlfcn cimport dlopen, dlsym, RTLD_LAZY
 from libcpp cimport bool
+from cython.operator cimport dereference as deref
 import os
 import numbers
+import numpy as np
 
 cdef int CAN_INVALID_CNT = 5
 
 cdef class CANParser:
-  def __init__(self, dbc_name, signals, checks=None, bus=1, sendcan=False, tcp_addr=b"", timeout=-1):
+  def __init__(self, dbc_name, signals, checks=None, bus=1, sendcan=False, tcp_addr=b"", timeout=-1, vl_dicts=True):
     self.test_mode_enabled = False
     can_dir = os.path.dirname(os.path.abspath(__file__))
     libdbc_fn = os.path.join(can_dir, "libdbc.so")
@@ -19,6 +21,7 @@ cdef class CANParser:
     self.dbc_lookup = <dbc_lookup_func>dlsym(libdbc, 'dbc_lookup')
     self.can_update = <can_update_func>dlsym(libdbc, 'can_update')
     self.can_update_string = <can_update_string_func>dlsym(libdbc, 'can_update_string')
+    self.can_update_strings = <can_update_strings_func>dlsym(libdbc, 'can_update_strings')
     self.can_query_latest_vector = <can_query_latest_vector_func>dlsym(libdbc, 'can_query_latest_vector')
     if checks is None:
       checks = []
@@ -29,6 +32,8 @@ cdef class CANParser:
     self.vl = {}
     self.ts = {}
     self.addr = {}
+    # without vl_dicts signals are only available through handle() and values
+    self.vl_dicts = vl_dicts
 
     self.can_invalid_cnt = CAN_INVALID_CNT
 
@@ -61,6 +66,8 @@ cdef class CANParser:
         checks[i] = c
 
 
+    self.compile_slots(signals)
+
     cdef vector[SignalParseOptions] signal_options_v
     cdef SignalParseOptions spo
     for sig_name, sig_address, sig_default in signals:
@@ -84,6 +91,30 @@ cdef class CANParser:
     self.update_vl()
     #print(dbc_name, signals, checks, bus, tcp_addr, timeout)
 
+  def compile_slots(self, signals):
+    # every requested signal gets a fixed slot in values, the parser reports signals with the
+    # name pointers of the DBC tables, so those identify a slot without building strings
+    self.values = np.array([float(default) for _, _, default in signals], dtype=np.float64)
+    self.values_view = self.values
+    self.handles = {}
+    cdef const Msg *msg
+    for slot, (sig_name, sig_address, _) in enumerate(signals):
+      name = sig_name.encode('utf8') if isinstance(sig_name, str) else sig_name
+      for i in range(self.dbc[0].num_msgs):
+        msg = &self.dbc[0].msgs[i]
+        if msg.address != sig_address:
+          continue
+        for j in range(msg.num_sigs):
+          if <bytes>msg.sigs[j].name == name:
+            self.slot_index[pair[uint32_t, uintptr_t](sig_address, <uintptr_t>msg.sigs[j].name)] = slot
+      sig_name = name.decode('utf8')
+      self.handles[(sig_address, sig_name)] = slot
+      self.handles[(self.address_to_msg_name[sig_address].decode('utf8'), sig_name)] = slot
+
+  def handle(self, msg, sig):
+    """Slot of a signal in values, msg is a message name or address."""
+    return self.handles[(msg, sig)]
+
   cdef unordered_set[uint32_t] update_vl(self):
     cdef string sig_name
     cdef unordered_set[uint32_t] updated_val
@@ -98,7 +129,15 @@ cdef class CANParser:
     self.can_valid = self.can_invalid_cnt < CAN_INVALID_CNT
 
 
+    cdef map[pair[uint32_t, uintptr_t], int].iterator slot
     for cv in self.can_values:
+      updated_val.insert(cv.address)
+      slot = self.slot_index.find(pair[uint32_t, uintptr_t](cv.address, <uintptr_t>cv.name))
+      if slot != self.slot_index.end():
+        self.values_view[deref(slot).second] = cv.value
+      if not self.vl_dicts:
+        continue
+
       # Cast char * directly to unicde
       name = <unicode>self.address_to_msg_name[cv.address].c_str()
       cv_name = <unicode>cv.name
@@ -110,8 +149,6 @@ cdef class CANParser:
       self.ts[name][cv_name] = cv.ts
       self.addr[cv.address] = name
 
-      updated_val.insert(cv.address)
-
     return updated_val
 
   def update_string(self, dat):
@@ -119,15 +156,42 @@ cdef class CANParser:
     return self.update_vl()
 
   def update_strings(self, strings):
-    updated_vals = set()
-
-    for s in strings:
-      updated_val = self.update_string(s)
-      updated_vals.update(updated_val)
-
-    return updated_vals
+    # the whole list is parsed in one call, the values are only read back once
+    cdef vector[string] data = strings
+    self.can_update_strings(self.can, data)
+    return self.update_vl()
 
   def update(self, uint64_t sec, bool wait):
     r = (self.can_update(self.can, sec, wait) >= 0)
     updated_val = self.update_vl()
     return r, updated_val
+
+
+cdef class CANParserGroup:
+  """Updates parsers of different buses from one decode of the can events, instead of every
+  parser decoding all of them and dropping the frames of other buses."""
+  def __init__(self, parsers):
+    can_dir = os.path.dirname(os.path.abspath(__file__))
+    libdbc_fn = os.path.join(can_dir, "libdbc.so")
+    libdbc_fn = str(libdbc_fn).encode('utf8')
+    cdef void *libdbc = dlopen(libdbc_fn, RTLD_LAZY)
+    cdef can_group_init_func can_group_init = <can_group_init_func>dlsym(libdbc, 'can_group_init')
+    self.can_group_update_strings = <can_group_update_strings_func>dlsym(libdbc, 'can_group_update_strings')
+
+    self.parsers = list(parsers)
+    cdef vector[void*] cans
+    cdef CANParser cp
+    for cp in self.parsers:
+      cans.push_back(cp.can)
+    self.group = can_group_init(cans)
+
+  def update_strings(self, strings):
+    """Returns the updated addresses of every parser."""
+    cdef vector[string] data = strings
+    self.can_group_update_strings(self.group, data)
+
+    cdef CANParser cp
+    updated = []
+    for cp in self.parsers:
+      updated.append(cp.update_vl())
+    return updated
@@ -6,7 +6,7 @@ import unittest
 import requests
 
 import selfdrive.messaging as messaging
-from selfdrive.can.parser import CANParser as CANParserNew
+from selfdrive.can.parser import CANParser as CANParserNew, CANParserGroup
 from selfdrive.can.tests.parser_old import CANParser as CANParserOld
 from selfdrive.car.honda.carstate import get_can_signals
 from selfdrive.car.honda.interface import CarInterface
@@ -50,6 +50,11 @@ def run_route(route):
   parser_old = CANParserOld(DBC[CP.carFingerprint]['pt'], signals, checks, 0, timeout=-1, tcp_addr="127.0.0.1")
   parser_new = CANParserNew(DBC[CP.carFingerprint]['pt'], signals, checks, 0, timeout=-1, tcp_addr="127.0.0.1")
   parser_string = CANParserNew(DBC[CP.carFingerprint]['pt'], signals, checks, 0, timeout=-1)
+  parser_batch = CANParserNew(DBC[CP.carFingerprint]['pt'], signals, checks, 0, timeout=-1)
+  parser_grouped = CANParserNew(DBC[CP.carFingerprint]['pt'], signals, checks, 0, timeout=-1)
+  parser_other_bus = CANParserNew(DBC[CP.carFingerprint]['pt'], signals, checks, 1, timeout=-1)
+  group = CANParserGroup([parser_grouped, parser_other_bus])
+  batch = []
 
   if dict_keys_differ(parser_old.vl, parser_new.vl):
     return False
@@ -84,6 +89,21 @@ def run_route(route):
         print(t, "Diff in dict string")
         route_ok = False
 
+      # backlogs of 10 events parsed at once end up with the same values
+      batch.append(msg_bytes)
+      if len(batch) == 10:
+        parser_batch.update_strings(batch)
+        group.update_strings(batch)
+        batch = []
+
+        if dicts_vals_differ(parser_string.vl, parser_batch.vl):
+          print(t, "Diff in dict batch")
+          route_ok = False
+
+        if dicts_vals_differ(parser_string.vl, parser_grouped.vl):
+          print(t, "Diff in dict group")
+          route_ok = False
+
   return route_ok
 
 class TestCanParser(unittest.TestCase):
@@ -1,11 +1,14 @@
 import os
+import json
+import threading
 from cereal import car
 from common.params import Params
 #from common.vin import get_vin, VIN_UNKNOWN
 from common.basedir import BASEDIR
-from common.fingerprints import eliminate_incompatible_cars, all_known_cars
+from common.fingerprints import FingerprintMatcher, all_known_cars, cars_to_mask, distinguishing_addresses
 from selfdrive.swaglog import cloudlog
 import selfdrive.messaging as messaging
+from selfdrive.services import service_list
 from selfdrive.kegman_conf import kegman_conf
 
 
@@ -55,13 +58,15 @@ interfaces = load_interfaces(_get_interface_names())
 def only_toyota_left(candidate_cars):
   return all(("TOYOTA" in c or "LEXUS" in c) for c in candidate_cars) and len(candidate_cars) > 0
 
+TOYOTA_CARS = cars_to_mask([c for c in all_known_cars() if only_toyota_left([c])])
+
 # BOUNTY: every added fingerprint in selfdrive/car/*/values.py is a $100 coupon code on shop.comma.ai
 # **** for use live only ****
 def fingerprint(logcan, sendcan, is_panda_black):
   if os.getenv("SIMULATOR2") is not None:
-    return ("simulator2", None, "")
+    return ("simulator2", None, "", 0)
   elif os.getenv("SIMULATOR") is not None:
-    return ("simulator", None, "")
+    return ("simulator", None, "", 0)
   print("black_panda in fingerprint:", is_panda_black)
   params = Params()
   car_params = params.get("CarParams")
@@ -77,10 +82,12 @@ def fingerprint(logcan, sendcan, is_panda_black):
   #Params().put("CarVin", vin)
 
   finger = {i: {} for i in range(0, 4)}  # collect on all buses
-  candidate_cars = {i: all_known_cars() for i in [0, 1]}  # attempt fingerprint on both bus 0 and 1
+  matchers = {i: FingerprintMatcher() for i in [0, 1]}  # attempt fingerprint on both bus 0 and 1
+  candidate_cars = {i: matchers[i].cars() for i in matchers}
   frame = 0
   frame_fingerprint = 500  # 5.0s
   car_fingerprint = None
+  car_bus = 0
   done = False
   
   print(candidate_cars)
@@ -104,47 +111,144 @@ def fingerprint(logcan, sendcan, is_panda_black):
       # and VIN query response.
       # Include bus 2 for toyotas to disambiguate cars using camera messages
       # (ideally should be done for all cars but we can't for Honda Bosch)
-      for b in candidate_cars:
-        if (can.src == b or (only_toyota_left(candidate_cars[b]) and can.src == 2)): # and \
+      for b in matchers:
+        if (can.src == b or (matchers[b].only(TOYOTA_CARS) and can.src == 2)): # and \
            #can.address < 0x800 and can.address not in [0x7df, 0x7e0, 0x7e8]:
           finger[can.src][can.address] = len(can.dat)
-          candidate_cars[b] = eliminate_incompatible_cars(can, candidate_cars[b])
+          matchers[b].update(can.address, len(can.dat))
 
     # if we only have one car choice and the time since we got our first
     # message has elapsed, exit
-    for b in candidate_cars:
+    for b in matchers:
       # Toyota needs higher time to fingerprint, since DSU does not broadcast immediately
-      if only_toyota_left(candidate_cars[b]):
+      if matchers[b].only(TOYOTA_CARS):
         frame_fingerprint = 100  # 1s
-      if len(candidate_cars[b]) == 1:
+      if matchers[b].count() == 1:
         if frame > frame_fingerprint:
           # fingerprint done
-          car_fingerprint = candidate_cars[b][0]
+          car_fingerprint = matchers[b].cars()[0]
+          car_bus = b
 
     # bail if no cars left or we've been waiting for more than 2s
-    failed = all(len(cc) == 0 for cc in candidate_cars.values()) or frame > 1000
+    failed = all(m.candidates == 0 for m in matchers.values()) or frame > 1000
     succeeded = car_fingerprint is not None
     done = failed or succeeded
 
     frame += 1
 
-  print("\nFingerprint Candidates: ", candidate_cars)
+  for b in matchers:
+    print("\nFingerprint Candidates on bus %d: " % b, matchers[b].report())
   print("fingerprinted %s", car_fingerprint)
-  return car_fingerprint, finger, vin
+  return car_fingerprint, finger, vin, car_bus
+
+
+# Car of the last drive with the messages that tell it apart, CarParams is cleared on every start.
+# Invalid after an update, get_params may have changed.
+CACHED_FINGERPRINT = "CachedFingerprint"
+
+def save_cached_fingerprint(params, candidate, finger, vin, bus, is_panda_black):
+  if candidate is None or finger is None:
+    params.delete(CACHED_FINGERPRINT)
+    return
+  params.put(CACHED_FINGERPRINT, json.dumps({
+    'car': candidate,
+    'vin': vin,
+    'bus': bus,
+    'isPandaBlack': is_panda_black,
+    'gitCommit': params.get("GitCommit", encoding='utf8'),
+    'signature': distinguishing_addresses(candidate, finger[bus]),
+    'fingerprint': finger[0],
+  }))
+
+def load_cached_fingerprint(params, is_panda_black):
+  cached = params.get(CACHED_FINGERPRINT, encoding='utf8')
+  if cached is None:
+    return None
+  try:
+    cached = json.loads(cached)
+    if cached['car'] not in interfaces or cached['isPandaBlack'] != is_panda_black or \
+       cached['gitCommit'] != params.get("GitCommit", encoding='utf8') or len(cached['signature']) == 0:
+      return None
+    # json keys are strings
+    cached['signature'] = {int(adr): length for adr, length in cached['signature'].items()}
+    cached['fingerprint'] = {int(adr): length for adr, length in cached['fingerprint'].items()}
+  except (KeyError, ValueError, AttributeError, TypeError):
+    # written by another version, or corrupt
+    return None
+  return cached
+
+def check_cached_fingerprint(logcan, cached, frames=30):
+  """True once every signature message was seen with its length within frames can events,
+  about 0.3s, False as soon as one comes with another length."""
+  signature = cached['signature']
+  seen = set()
+  for _ in range(frames):
+    for can in messaging.recv_one(logcan).can:
+      if can.src == cached['bus'] and can.address in signature:
+        if len(can.dat) != signature[can.address]:
+          return False
+        seen.add(can.address)
+    if len(seen) == len(signature):
+      return True
+  return False
 
 
 def get_car(logcan, sendcan, is_panda_black=False):
   print("black_panda in get_car:", is_panda_black)
-  candidate, fingerprints, vin = fingerprint(logcan, sendcan, is_panda_black)
+  candidate, fingerprints, vin, bus = fingerprint(logcan, sendcan, is_panda_black)
+  if fingerprints is not None:
+    save_cached_fingerprint(Params(), candidate, fingerprints, vin, bus, is_panda_black)
+
+  return build_car(candidate, fingerprints[0] if fingerprints is not None else None, vin, is_panda_black)
 
+def build_car(candidate, fingerprint, vin, is_panda_black):
   if candidate is None:
     #cloudlog.warning("car doesn't match any fingerprints: %r", fingerprints)
     candidate = "mock"
 
   CarInterface, CarController = interfaces[candidate]
-  car_params = CarInterface.get_params(candidate, fingerprints[0], vin, is_panda_black)
+  car_params = CarInterface.get_params(candidate, fingerprint, vin, is_panda_black)
 
   return CarInterface(car_params, CarController), car_params
 
+
+class FingerprintConfirmer(threading.Thread):
+  """Runs the full fingerprint on its own can socket while controls already run with the cached
+  car. result is None until done, then True if the car matched. Otherwise CI and CP hold the
+  interface of the car that was found instead, or of mock. CarParams must not be written before,
+  boardd only forwards every message until then."""
+  def __init__(self, cached, is_panda_black):
+    super(FingerprintConfirmer, self).__init__(daemon=True)
+    self.cached = cached
+    self.is_panda_black = is_panda_black
+    self.logcan = messaging.sub_sock(service_list['can'].port)
+    self.result = None
+    self.CI = None
+    self.CP = None
+
+  def run(self):
+    candidate, finger, vin, bus = fingerprint(self.logcan, None, self.is_panda_black)
+    save_cached_fingerprint(Params(), candidate, finger, vin, bus, self.is_panda_black)
+    if candidate != self.cached['car']:
+      cloudlog.warning("cached fingerprint %s, found %s", self.cached['car'], candidate)
+      self.CI, self.CP = build_car(candidate, finger[0] if finger is not None else None, vin, self.is_panda_black)
+    self.result = candidate == self.cached['car']
+
+
+def get_car_fast(logcan, sendcan, is_panda_black=False):
+  """get_car that starts with the car of the last drive once its signature messages are seen,
+  the full fingerprint is confirmed in the background by the returned FingerprintConfirmer.
+  Without a usable cache it is get_car, and no confirmer is returned."""
+  cached = load_cached_fingerprint(Params(), is_panda_black)
+  if cached is None or not check_cached_fingerprint(logcan, cached):
+    CI, CP = get_car(logcan, sendcan, is_panda_black)
+    return CI, CP, None
+
+  print("fast boot as %s" % cached['car'])
+  confirmer = FingerprintConfirmer(cached, is_panda_black)
+  confirmer.start()
+  CI, CP = build_car(cached['car'], cached['fingerprint'], cached['vin'], is_panda_black)
+  return CI, CP, confirmer
+
 if __name__ == "__main__":
   print(get_car(None, None, False))
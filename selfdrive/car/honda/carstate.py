@@ -251,9 +251,15 @@ def get_can_signals(CP):
   return signals, checks
 
 
+def get_pt_bus(CP):
+  return 1 if CP.isPandaBlack and CP.carFingerprint in HONDA_BOSCH else 0
+
+def get_cam_bus(isPandaBlack):
+  return 1 if not isPandaBlack else 2
+
 def get_can_parser(CP):
   signals, checks = get_can_signals(CP)
-  bus_pt = 1 if CP.isPandaBlack and CP.carFingerprint in HONDA_BOSCH else 0
+  bus_pt = get_pt_bus(CP)
 
   return CANParser(DBC[CP.carFingerprint]['pt'], signals, checks, bus_pt)
 
@@ -261,9 +267,10 @@ def get_can_parser(CP):
 def get_cam_can_parser(isPandaBlack):
   signals, checks = get_cam_can_signals()
   checks = []
-  bus_cam = 1 if not isPandaBlack else 2
+  bus_cam = get_cam_bus(isPandaBlack)
 
-  return CANParser("bosch_camera", signals, checks, bus_cam)
+  # LaneCamera reads every camera signal through parser handles
+  return CANParser("bosch_camera", signals, checks, bus_cam, vl_dicts=False)
 
 class CarState():
   def __init__(self, CP):
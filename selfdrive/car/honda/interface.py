@@ -3,22 +3,55 @@ import os
 import time
 import json
 import numpy as np
+from collections import defaultdict
 from cereal import car, log
+from common.dbc import dbc
+from opendbc import DBC_PATH
 from common.numpy_fast import clip, interp
 from common.realtime import sec_since_boot, DT_CTRL
 from selfdrive.swaglog import cloudlog
 from common.params import Params
 from selfdrive.config import Conversions as CV
+from selfdrive.kegman_conf import kegman_conf
 from selfdrive.controls.lib.drive_helpers import create_event, EventTypes as ET, get_events
 #from selfdrive.controls.lib.vehicle_model import VehicleModel
-from selfdrive.car.honda.carstate import CarState, get_can_parser, get_cam_can_parser
-from selfdrive.car.honda.values import CruiseButtons, CAR, HONDA_BOSCH, AUDIO_HUD, VISUAL_HUD, CAMERA_MSGS
+from selfdrive.can.parser import CANParserGroup
+from selfdrive.car.honda.carstate import CarState, get_can_parser, get_cam_can_parser, get_can_signals, get_cam_can_signals, \
+                                         get_pt_bus, get_cam_bus
+from selfdrive.car.honda.lanecam import LaneCamera
+from selfdrive.car.honda.values import CruiseButtons, CAR, DBC, HONDA_BOSCH, AUDIO_HUD, VISUAL_HUD, CAMERA_MSGS
 from selfdrive.car import STD_CARGO_KG, CivicParams, scale_rot_inertia, scale_tire_stiffness
 from selfdrive.car.interfaces import CarInterfaceBase
 #from selfdrive.controls.lib.planner import _A_CRUISE_MAX_V_FOLLOWING
 
 A_ACC_MAX = 0 #max(_A_CRUISE_MAX_V_FOLLOWING)
 
+# signal whose message paces the control loop, boardd publishes when it arrives
+SYNC_SIGNAL = "STEER_ANGLE"
+
+
+def compile_can_filter(CP):
+  """Returns per bus lists of the addresses the car and camera parsers read, and of the sync
+  addresses: the message of SYNC_SIGNAL, or the first message checked at the highest frequency."""
+  ids = defaultdict(set)
+  sync_ids = defaultdict(set)
+  parsers = [(get_pt_bus(CP), DBC[CP.carFingerprint]['pt'], get_can_signals(CP), True),
+             (get_cam_bus(CP.isPandaBlack), 'bosch_camera', get_cam_can_signals(), False)]
+  for bus, dbc_name, (signals, checks), sync in parsers:
+    # names missing from the dbc are left to fail in the parser
+    address = dbc(os.path.join(DBC_PATH, dbc_name + '.dbc')).msg_name_to_address
+    signals = [(sig, address[msg], default) for sig, msg, default in signals if msg in address]
+    checks = [(address[msg], freq) for msg, freq in checks if msg in address]
+    ids[bus] |= set(msg for _, msg, _ in signals) | set(msg for msg, _ in checks)
+    if sync and len(checks) > 0:
+      top = max(freq for _, freq in checks)
+      fastest = [msg for msg, freq in checks if freq == top]
+      paced = [msg for sig, msg, _ in signals if sig == SYNC_SIGNAL and msg in fastest]
+      sync_ids[bus].add(paced[0] if len(paced) > 0 else fastest[0])
+
+  buses = range(max(ids.keys()) + 1)
+  return [sorted(ids[b]) for b in buses], [sorted(sync_ids[b]) for b in buses]
+
 
 def compute_gb_honda(accel, speed):
   creep_brake = 0.0
@@ -87,12 +120,15 @@ class CarInterface(CarInterfaceBase):
 
     self.cp = get_can_parser(CP)
     self.cp_cam = get_cam_can_parser(CP.isPandaBlack)
-    self.CP.canIds = [[int(x) for x in self.cp.addr], [int(x) for x in self.cp_cam.addr]]
+    self.lane_camera = LaneCamera(self.cp_cam)
+    # both buses are filled from a single decode of every can event
+    self.can_parsers = CANParserGroup([cp for cp in [self.cp, self.cp_cam] if cp is not None])
     
     # *** init the major players ***
     self.CS = CarState(CP)
     #self.VM = VehicleModel(CP)
     self.canTime = 0
+    self.use_trace = kegman_conf().conf['latencyTrace'] == '1'
     self.CC = None
     if CarController is not None:
       self.CC = CarController(self.cp.dbc_name)
@@ -415,6 +451,9 @@ class CarInterface(CarInterfaceBase):
     ret.steerActuatorDelay = 0.1
     ret.steerRateCost = 0.3
 
+    # boardd only forwards what the parsers read
+    ret.canIds, ret.canSyncIds = compile_can_filter(ret)
+
     return ret
 
   # returns a car.CarState
@@ -426,16 +465,17 @@ class CarInterface(CarInterfaceBase):
     if self.canTime == 0: 
       self.canTime = int(time.time() * 100) * 10
     elif self.canTime < ret.sysTime + 20:
-      self.canTime = self.canTime + 10
+      # one 10ms step per can packet, a caught up backlog advances by all of them
+      self.canTime = self.canTime + 10 * len(can_strings)
     ret.canTime = self.canTime
     #self.canTime = max(int(time.time() * 100) * 10, self.canTime + 10)
     #if self.frame % 100 == 0: print(self.canTime)
 
 
-    self.cp.update_strings(can_strings)
-
-    if not self.cp_cam is None: 
-      self.cp_cam.update_strings(can_strings)
+    self.can_parsers.update_strings(can_strings)
+    if self.use_trace and len(can_strings) > 0:
+      # the trace starts at the newest packet, the only one decoded again
+      ret.canMonoTimes = [log.Event.from_bytes(can_strings[-1]).logMonoTime]
 
     self.CS.update(self.cp, self.cp_cam)
     #profiler.checkpoint('cs_update')
@@ -506,84 +546,16 @@ class CarInterface(CarInterfaceBase):
 
     #cam_thread.join()
     if not self.cp_cam is None:
-      camLeft1 = self.cp_cam.vl["CUR_LANE_LEFT_1"]
-      camLeft2 = self.cp_cam.vl["CUR_LANE_LEFT_2"]
-      camFarRight1 = self.cp_cam.vl["ADJ_LANE_RIGHT_1"]
-      camFarRight2 = self.cp_cam.vl["ADJ_LANE_RIGHT_2"]
-      ret.camLeft.frame = camLeft1['FRAME_ID'] + camLeft2['FRAME_ID']
-      ret.camFarRight.frame = camFarRight1['FRAME_ID'] + camFarRight2['FRAME_ID']
+      ret.camLeft.frame = self.lane_camera.frame('camLeft')
+      ret.camFarRight.frame = self.lane_camera.frame('camFarRight')
 
       if ret.camLeft.frame != self.stock_cam_frame_prev and ret.camLeft.frame == ret.camFarRight.frame:
         self.stock_cam_frame_prev = ret.camLeft.frame
-        camRight1 = self.cp_cam.vl["CUR_LANE_RIGHT_1"]
-        camRight2 = self.cp_cam.vl["CUR_LANE_RIGHT_2"]
-        camFarLeft1 = self.cp_cam.vl["ADJ_LANE_LEFT_1"]
-        camFarLeft2 = self.cp_cam.vl["ADJ_LANE_LEFT_2"]
-
-        ret.camRight.frame = camRight1['FRAME_ID'] + camRight2['FRAME_ID']
-        ret.camFarLeft.frame = camFarLeft1['FRAME_ID'] + camFarLeft2['FRAME_ID']
-        ret.camLeft.full1 = camLeft1['FULL']
-        ret.camLeft.full2 = camLeft2['FULL']
-        ret.camRight.full1 = camRight1['FULL']
-        ret.camRight.full2 = camRight2['FULL']
-        ret.camFarLeft.full1 = camFarLeft1['FULL']
-        ret.camFarLeft.full2 = camFarLeft2['FULL']
-        ret.camFarRight.full1 = camFarRight1['FULL']
-        ret.camFarRight.full2 = camFarRight2['FULL']
-        ret.camLeft.parm1 = camLeft1['PARM_1']
-        ret.camLeft.parm2 = camLeft1['PARM_2']
-        ret.camLeft.parm3 = camLeft1['PARM_3']
-        ret.camLeft.parm4 = camLeft1['PARM_4']
-        ret.camLeft.parm5 = camLeft1['PARM_5']
-        ret.camLeft.parm6 = camLeft2['PARM_6']
-        ret.camLeft.parm7 = camLeft2['PARM_7']
-        ret.camLeft.parm8 = camLeft2['PARM_8']
-        ret.camLeft.parm9 = camLeft2['PARM_9']
-        ret.camLeft.parm10 = camLeft2['PARM_10']
-        ret.camLeft.dashed = camLeft2['DASHED_LINE']
-        ret.camLeft.solid = camLeft2['SOLID_LINE']
-        ret.camRight.parm1 = camRight1['PARM_1']
-        ret.camRight.parm2 = camRight1['PARM_2']
-        ret.camRight.parm3 = camRight1['PARM_3']
-        ret.camRight.parm4 = camRight1['PARM_4']
-        ret.camRight.parm5 = camRight1['PARM_5']
-        ret.camRight.parm6 = camRight2['PARM_6']
-        ret.camRight.parm7 = camRight2['PARM_7']
-        ret.camRight.parm8 = camRight2['PARM_8']
-        ret.camRight.parm9 = camRight2['PARM_9']
-        ret.camRight.parm10 = camRight2['PARM_10']
-        ret.camRight.dashed = camRight2['DASHED_LINE']
-        ret.camRight.solid = camRight2['SOLID_LINE']
-        ret.camFarLeft.parm1 = camFarLeft1['PARM_1']
-        ret.camFarLeft.parm2 = camFarLeft1['PARM_2']
-        ret.camFarLeft.parm3 = camFarLeft1['PARM_3']
-        ret.camFarLeft.parm4 = camFarLeft1['PARM_4']
-        ret.camFarLeft.parm5 = camFarLeft1['PARM_5']
-        ret.camFarLeft.parm6 = camFarLeft2['PARM_6']
-        ret.camFarLeft.parm7 = camFarLeft2['PARM_7']
-        ret.camFarLeft.parm8 = camFarLeft2['PARM_8']
-        ret.camFarLeft.parm9 = camFarLeft2['PARM_9']
-        ret.camFarLeft.parm10 = camFarLeft2['PARM_10']
-        ret.camFarRight.parm1 = camFarRight1['PARM_1']
-        ret.camFarRight.parm2 = camFarRight1['PARM_2']
-        ret.camFarRight.parm3 = camFarRight1['PARM_3']
-        ret.camFarRight.parm4 = camFarRight1['PARM_4']
-        ret.camFarRight.parm5 = camFarRight1['PARM_5']
-        ret.camFarRight.parm6 = camFarRight2['PARM_6']
-        ret.camFarRight.parm7 = camFarRight2['PARM_7']
-        ret.camFarRight.parm8 = camFarRight2['PARM_8']
-        ret.camFarRight.parm9 = camFarRight2['PARM_9']
-        ret.camFarRight.parm10 = camFarRight2['PARM_10']
-
-        # TODO: Fix these values in the DBC
-        ret.camLeft.parm2 = ret.camLeft.parm2 if ret.camLeft.parm2 > -150 else ret.camLeft.parm2 + 1024
-        ret.camLeft.parm10 = ret.camLeft.parm10 if ret.camLeft.parm10 > -10 else ret.camLeft.parm10 + 128
-        ret.camFarLeft.parm2 = ret.camFarLeft.parm2 if ret.camFarLeft.parm2 > -150 else ret.camFarLeft.parm2 + 1024
-        ret.camFarLeft.parm10 = ret.camFarLeft.parm10 if ret.camFarLeft.parm10 > -10 else ret.camFarLeft.parm10 + 128
-        ret.camRight.parm2 = ret.camRight.parm2 if ret.camRight.parm2 < 150 else ret.camRight.parm2 - 1024
-        ret.camRight.parm10 = ret.camRight.parm10 if ret.camRight.parm10 < 10 else ret.camRight.parm10 - 128
-        ret.camFarRight.parm2 = ret.camFarRight.parm2 if ret.camFarRight.parm2 < 150 else ret.camFarRight.parm2 - 1024
-        ret.camFarRight.parm10 = ret.camFarRight.parm10 if ret.camFarRight.parm10 < 10 else ret.camFarRight.parm10 - 128
+
+        # every parm, with the DBC wrap fixed, goes into modelData and the camera packets with
+        # the frames and FULL flags
+        self.lane_camera.update()
+        self.lane_camera.fill(ret)
       profiler.checkpoint('update_cam')
       #if self.frame % 1000 == 0: print(self.cp_cam.vl["CUR_LANE_LEFT_1"]['FULL'],self.cp_cam.vl["CUR_LANE_LEFT_2"]['FULL'],self.cp_cam.vl["CUR_LANE_RIGHT_1"]['FULL'],self.cp_cam.vl["CUR_LANE_RIGHT_2"]['FULL'])
       #print(self.cp_cam.vl["CUR_LANE_LEFT_1"]['FRAME_ID'], )
@@ -0,0 +1,84 @@
+import numpy as np
+
+# Lane lines reported by the Bosch stock camera. Every lane is sent as a _1 and a _2 message per
+# frame and fills one CameraPacket of CarState, in the order of the lane row below.
+LANES = [('camFarLeft', 'ADJ_LANE_LEFT'),
+         ('camFarRight', 'ADJ_LANE_RIGHT'),
+         ('camLeft', 'CUR_LANE_LEFT'),
+         ('camRight', 'CUR_LANE_RIGHT')]
+
+# CameraPacket field -> (message suffix, signal)
+FIELDS = [('parm1', '_1', 'PARM_1'),
+          ('parm2', '_1', 'PARM_2'),
+          ('parm3', '_1', 'PARM_3'),
+          ('parm4', '_1', 'PARM_4'),
+          ('parm5', '_1', 'PARM_5'),
+          ('parm6', '_2', 'PARM_6'),
+          ('parm7', '_2', 'PARM_7'),
+          ('parm8', '_2', 'PARM_8'),
+          ('parm9', '_2', 'PARM_9'),
+          ('parm10', '_2', 'PARM_10'),
+          ('dashed', '_2', 'DASHED_LINE'),
+          ('solid', '_2', 'SOLID_LINE')]
+
+# only the current lane lines carry a line type
+CURRENT_LANE_FIELDS = ['dashed', 'solid']
+
+ROW_SIZE = len(LANES) * len(FIELDS)
+
+def column(lane, field):
+  return [l for l, _ in LANES].index(lane) * len(FIELDS) + [f for f, _, _ in FIELDS].index(field)
+
+# (lane, field, column, message, signal) for every signal copied into the row
+SIGNALS = [(lane, field, column(lane, field), prefix + suffix, signal)
+           for lane, prefix in LANES for field, suffix, signal in FIELDS
+           if prefix.startswith('CUR_') or field not in CURRENT_LANE_FIELDS]
+
+# FRAME_ID is split over both messages of a lane, FULL is reported per message
+STATUS_SIGNALS = ['FRAME_ID', 'FULL']
+
+# TODO: Fix these values in the DBC. The offsets of left lanes wrap around to large negative
+# values, fixed by adding the offset, and those of right lanes to large positive values.
+WRAP_COLUMNS = np.array([column(lane, field) for lane, _ in LANES for field in ['parm2', 'parm10']])
+WRAP_SIGN = np.array([1. if lane.endswith('Right') else -1. for lane, _ in LANES for _ in range(2)], dtype=np.float32)
+WRAP_LIMIT = np.array([150., 10.] * len(LANES), dtype=np.float32)
+WRAP_OFFSET = np.array([1024., 128.] * len(LANES), dtype=np.float32)
+
+
+def fix_wrap(row):
+  wrapped = row[WRAP_COLUMNS]
+  row[WRAP_COLUMNS] = np.where(WRAP_SIGN * wrapped >= WRAP_LIMIT, wrapped - WRAP_SIGN * WRAP_OFFSET, wrapped)
+  return row
+
+
+class LaneCamera(object):
+  """Copies all lane camera signals from the camera parser's value array into one preallocated
+  float32 row, which is published as CarState.modelData."""
+  def __init__(self, cp_cam):
+    self.row = np.zeros(ROW_SIZE, dtype=np.float32)
+    # the parser writes into the same array on every update, so the slots are resolved once
+    self.values = cp_cam.values
+    self.slots = np.array([cp_cam.handle(msg, signal) for _, _, _, msg, signal in SIGNALS])
+    self.columns = np.array([col for _, _, col, _, _ in SIGNALS])
+    self.status = dict((lane, dict((signal, [cp_cam.handle(prefix + suffix, signal) for suffix in ['_1', '_2']])
+                                   for signal in STATUS_SIGNALS)) for lane, prefix in LANES)
+
+  def frame(self, lane):
+    slot1, slot2 = self.status[lane]['FRAME_ID']
+    return int(self.values[slot1] + self.values[slot2])
+
+  def update(self):
+    self.row[self.columns] = self.values[self.slots]
+    return fix_wrap(self.row)
+
+  def fill(self, ret):
+    """Writes the row, frames and FULL flags into the CameraPacket fields of a CarState builder."""
+    lanes = dict((lane, getattr(ret, lane)) for lane, _ in LANES)
+    for lane, field, col, _, _ in SIGNALS:
+      setattr(lanes[lane], field, int(self.row[col]))
+    for lane, packet in lanes.items():
+      full1, full2 = self.status[lane]['FULL']
+      packet.frame = self.frame(lane)
+      packet.full1 = int(self.values[full1])
+      packet.full2 = int(self.values[full2])
+    ret.modelData = self.row.tolist()
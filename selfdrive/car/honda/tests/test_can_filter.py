@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import os
+import unittest
+
+from common.dbc import dbc
+from opendbc import DBC_PATH
+from selfdrive.car.honda.carstate import get_can_signals, get_cam_can_signals, get_pt_bus, get_cam_bus
+from selfdrive.car.honda.interface import CarInterface, compile_can_filter
+from selfdrive.car.honda.values import CAR, DBC
+
+# cars with a powertrain dbc in opendbc
+CARS = [c for c in DBC if os.path.exists(os.path.join(DBC_PATH, DBC[c]['pt'] + '.dbc'))]
+# dbcs whose STEERING_SENSORS used to be missed by the hardcoded sync on 330
+STEERING_SENSORS_342 = [CAR.CRV, CAR.ODYSSEY, CAR.PILOT, CAR.RIDGELINE]
+
+
+def get_car_params(candidate, is_panda_black):
+  return CarInterface.get_params(candidate, {}, "", is_panda_black)
+
+def parser_addresses(CP):
+  """Bus and address of every message the car and camera parsers read."""
+  ret = []
+  parsers = [(get_pt_bus(CP), DBC[CP.carFingerprint]['pt'], get_can_signals(CP)),
+             (get_cam_bus(CP.isPandaBlack), 'bosch_camera', get_cam_can_signals())]
+  for bus, dbc_name, (signals, checks) in parsers:
+    address = dbc(os.path.join(DBC_PATH, dbc_name + '.dbc')).msg_name_to_address
+    for msg in set([msg for _, msg, _ in signals] + [msg for msg, _ in checks]):
+      if msg in address:
+        ret.append((bus, address[msg]))
+  return ret
+
+
+class TestCanFilter(unittest.TestCase):
+  def test_covers_parser_addresses(self):
+    for candidate in CARS:
+      for is_panda_black in [False, True]:
+        CP = get_car_params(candidate, is_panda_black)
+        ids, sync_ids = compile_can_filter(CP)
+        self.assertEqual(len(ids), len(sync_ids))
+        for bus, address in parser_addresses(CP):
+          self.assertIn(address, ids[bus], "%s misses %d on bus %d" % (candidate, address, bus))
+        # only the powertrain bus paces boardd, with one of its own messages
+        pt_bus = get_pt_bus(CP)
+        self.assertEqual(len(sync_ids[pt_bus]), 1, candidate)
+        self.assertIn(sync_ids[pt_bus][0], ids[pt_bus])
+        self.assertEqual(sum(len(s) for s in sync_ids), 1, candidate)
+
+  def test_sync_on_steering_sensors(self):
+    for candidate in STEERING_SENSORS_342:
+      address = dbc(os.path.join(DBC_PATH, DBC[candidate]['pt'] + '.dbc')).msg_name_to_address
+      self.assertEqual(address['STEERING_SENSORS'], 342)
+      for is_panda_black in [False, True]:
+        CP = get_car_params(candidate, is_panda_black)
+        _, sync_ids = compile_can_filter(CP)
+        self.assertEqual(sync_ids[get_pt_bus(CP)], [342], candidate)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+import unittest
+import numpy as np
+from types import SimpleNamespace
+
+from selfdrive.car.honda.lanecam import LANES, LaneCamera, column
+
+
+class FakeParser(object):
+  """vl is only kept here to build the expected values, LaneCamera reads values by handle."""
+  def __init__(self):
+    self.vl = {}
+    for _, prefix in LANES:
+      for suffix in ['_1', '_2']:
+        self.vl[prefix + suffix] = {'PARM_%d' % i: 0 for i in range(1, 11)}
+        self.vl[prefix + suffix].update({'FRAME_ID': 0, 'FULL': 0})
+      self.vl[prefix + '_2'].update({'DASHED_LINE': 0, 'SOLID_LINE': 0})
+    self.handles = dict(((msg, sig), slot) for slot, (msg, sig) in enumerate((msg, sig) for msg in self.vl for sig in self.vl[msg]))
+    self.values = np.zeros(len(self.handles))
+
+  def handle(self, msg, sig):
+    return self.handles[(msg, sig)]
+
+  def update(self):
+    for (msg, sig), slot in self.handles.items():
+      self.values[slot] = self.vl[msg][sig]
+
+
+class TestLaneCamera(unittest.TestCase):
+  def test_row_and_packets(self):
+    cp_cam = FakeParser()
+    lane_camera = LaneCamera(cp_cam)
+    np.random.seed(0)
+    for _ in range(50):
+      for msg in cp_cam.vl.values():
+        for sig in msg:
+          msg[sig] = int(np.random.randint(-1024, 1024))
+      cp_cam.update()
+      row = lane_camera.update()
+      ret = SimpleNamespace(**{lane: SimpleNamespace() for lane, _ in LANES})
+      lane_camera.fill(ret)
+
+      for lane, prefix in LANES:
+        msg1, msg2 = cp_cam.vl[prefix + '_1'], cp_cam.vl[prefix + '_2']
+        parm2, parm10 = msg1['PARM_2'], msg2['PARM_10']
+        if lane.endswith('Left'):
+          parm2 = parm2 if parm2 > -150 else parm2 + 1024
+          parm10 = parm10 if parm10 > -10 else parm10 + 128
+        else:
+          parm2 = parm2 if parm2 < 150 else parm2 - 1024
+          parm10 = parm10 if parm10 < 10 else parm10 - 128
+        expected = {'parm1': msg1['PARM_1'], 'parm2': parm2, 'parm3': msg1['PARM_3'], 'parm4': msg1['PARM_4'], 'parm5': msg1['PARM_5'],
+                    'parm6': msg2['PARM_6'], 'parm7': msg2['PARM_7'], 'parm8': msg2['PARM_8'], 'parm9': msg2['PARM_9'], 'parm10': parm10}
+        expected.update({'frame': msg1['FRAME_ID'] + msg2['FRAME_ID'], 'full1': msg1['FULL'], 'full2': msg2['FULL']})
+        self.assertEqual(lane_camera.frame(lane), expected['frame'])
+        if lane in ['camLeft', 'camRight']:
+          expected.update({'dashed': msg2['DASHED_LINE'], 'solid': msg2['SOLID_LINE']})
+        else:
+          self.assertFalse(hasattr(getattr(ret, lane), 'dashed'))
+        for field, value in expected.items():
+          self.assertEqual(getattr(getattr(ret, lane), field), value)
+          if field.startswith('parm') or field in ['dashed', 'solid']:
+            self.assertEqual(row[column(lane, field)], value)
+      self.assertEqual(ret.modelData, row.tolist())
+
+
+if __name__ == "__main__":
+  unittest.main()
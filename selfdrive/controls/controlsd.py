@@ -6,11 +6,13 @@ import os
 from cereal import car, log
 from common.numpy_fast import clip
 from common.params import Params
-from common.profiler import Profiler
+from common.profiler import Profiler, install_toggle
+from common.realtime import DeadlineScheduler, CATCH_UP_SKIP, CATCH_UP_REPLAY
 import selfdrive.messaging as messaging
 from selfdrive.services import service_list
 from selfdrive.boardd.boardd import can_list_to_can_capnp
-from selfdrive.car.car_helpers import get_car, get_startup_alert
+from selfdrive.car.car_helpers import get_car, get_car_fast, get_startup_alert
+from selfdrive.kegman_conf import kegman_conf
 from selfdrive.controls.lib.drive_helpers import get_events, \
                                                  create_event, \
                                                  EventTypes as ET, \
@@ -18,6 +20,7 @@ from selfdrive.controls.lib.drive_helpers import get_events, \
                                                  initialize_v_cruise
 from selfdrive.controls.lib.latcontrol_pid import LatControlPID
 from selfdrive.controls.lib.laterald import Lateral
+from selfdrive.controls.lib.latency_trace import stats_message
 from selfdrive.controls.lib.alertmanager import AlertManager
 from setproctitle import setproctitle
 
@@ -50,26 +53,38 @@ def wait_for_can(logcan):
   while len(messaging.recv_sock(logcan, wait=True).can) == 0:
     pass
 
-def data_sample(CI, CC, can_sock, carstate, lac_log, lateral, sm, profiler):
+# can packets taken from a backlog in one frame
+MAX_CATCH_UP = 40
+
+def data_sample(CI, CC, can_sock, carstate, lac_log, lateral, sm, profiler, scheduler):
   """Receive data from sockets and create events for battery, temperature and disk space"""
  
   can_strs = [can_sock.recv()]
+  scheduler.start_frame()
   profiler.checkpoint('can_recv', True)
   CS = CI.update(CC, can_strs, lac_log, profiler)
   profiler.checkpoint('carstate')
   lateral.update(CS, sm, 0, 1)
   profiler.checkpoint('lateral')
-  if CS.canTime + 20 < CS.sysTime: 
-    can_strs = messaging.drain_sock_raw(can_sock, wait_for_one=False, limit=1)
+  # a missed deadline alone does not drain, the backlog it left is caught up once can lags
+  if CS.canTime + 20 < CS.sysTime:
+    can_strs = messaging.drain_sock_raw(can_sock, wait_for_one=False, limit=MAX_CATCH_UP)
     profiler.checkpoint('drain_can')
     if len(can_strs) > 0: 
       print("  Controls lagged by %d CAN packets at %d at %0.2f m/s!" % (len(can_strs), int(time.time()*1000), CS.vEgo), [len(x) for x in can_strs])
-      for i in range(len(can_strs[-40:])):
-        #time.sleep(0.00001)
-        CS = CI.update(CC, [can_strs[i]], lac_log, profiler)
-        profiler.checkpoint('drain_carstate')
-        lateral.update(CS, sm, i, len(can_strs[-40:]))
-        profiler.checkpoint('drain_lateral')
+      if scheduler.policy == CATCH_UP_REPLAY:
+        for can_str in can_strs:
+          CS = CI.update(CC, [can_str], lac_log, profiler)
+          lateral.update(CS, sm, 0, 1)
+      else:
+        if scheduler.policy == CATCH_UP_SKIP:
+          # the signals of the dropped packets are lost, canTime still counts them
+          CI.canTime += 10 * (len(can_strs) - 1)
+          can_strs = can_strs[-1:]
+        # the whole backlog is parsed in one update, lateral emits a row per packet from it
+        CS = CI.update(CC, can_strs, lac_log, profiler)
+        lateral.update(CS, sm, 0, len(can_strs))
+      profiler.checkpoint('drain_carstate')
     else:
       #print("  CAN lagged!")
       CI.canTime += 20
@@ -180,6 +195,12 @@ def state_control(frame, lkasMode, path_plan, CS, CP, state, events, AM, LaC, la
   profiler.checkpoint('lac_update')
   CS.laneChanging = False  #bool(LaC.lane_change_adjustment < 1 and LaC.lane_changing > 0)
 
+  return actuators, lac_log
+
+def update_alerts(frame, state, events, AM):
+  """Housekeeping after the actuators were sent, the hud shows the alerts a frame later"""
+  enabled = isEnabled(state)
+
     # parse warnings from car specific interface
   for e in get_events(events, [ET.WARNING]):
     extra_text = ""
@@ -192,7 +213,18 @@ def state_control(frame, lkasMode, path_plan, CS, CP, state, events, AM, LaC, la
 
   AM.process_alerts(frame)
 
-  return actuators, lac_log
+def publish_stats(latencystats, LaC, profilers, scheduler):
+  latencystats.send(LaC.latency.message().to_bytes())
+  latencystats.send(stats_message('controls deadlines', [(name, hist.snapshot().stats(1e6)) for name, hist in scheduler.histograms()]).to_bytes())
+  for p in profilers:
+    if p.enabled:
+      latencystats.send(stats_message('%s profiler' % p.source, sorted(p.stats().items())).to_bytes())
+
+def display_profilers(profilers):
+  for p in profilers:
+    if p.enabled:
+      p.display()
+      p.reset(True)
 
 def data_send(sm, CS, CI, CP, state, events, actuators, carstate, carcontrol, carevents, carparams, controlsstate, sendcan, AM, LaC, start_time, lac_log, events_prev, profiler):
   """Send actuators and hud commands to the car, send controlsstate and MPC logging"""
@@ -231,6 +263,7 @@ def controlsd_thread(gctx=None):
   print(params)
   # Pub Sockets
   profiler = Profiler(False, 'controls')
+  install_toggle()
 
   sendcan = messaging.pub_sock(service_list['sendcan'].port)
   controlsstate = messaging.pub_sock(service_list['controlsState'].port)
@@ -238,6 +271,7 @@ def controlsd_thread(gctx=None):
   carcontrol = messaging.pub_sock(service_list['carControl'].port)
   carevents = messaging.pub_sock(service_list['carEvents'].port)
   carparams = messaging.pub_sock(service_list['carParams'].port)
+  latencystats = messaging.pub_sock(service_list['latencyStats'].port)
 
   sm = messaging.SubMaster(['pathPlan','health','gpsLocationExternal'])
   can_sock = messaging.sub_sock(service_list['can'].port)
@@ -253,16 +287,23 @@ def controlsd_thread(gctx=None):
   messaging.drain_sock(can_sock)
   wait_for_can(can_sock)
   
-  CI, CP = get_car(can_sock, sendcan, is_panda_black)
+  if kegman_conf().conf['fastBoot'] == "1":
+    # starts with the cached car, confirmer checks it with the full fingerprint meanwhile
+    CI, CP, confirmer = get_car_fast(can_sock, sendcan, is_panda_black)
+  else:
+    CI, CP = get_car(can_sock, sendcan, is_panda_black)
+    confirmer = None
   #logcan.close()
 
   # TODO: Use the logcan socket from above, but that will currenly break the tests
   #can_timeout = None #if os.environ.get('NO_CAN_TIMEOUT', False) else 100
   #can_sock = messaging.sub_sock(service_list['can'].port, timeout=can_timeout)
 
-  # Write CarParams for radard and boardd safety mode
-  params.put("CarParams", CP.to_bytes())
-  params.put("LongitudinalControl", "1" if CP.openpilotLongitudinalControl else "0")
+  # Write CarParams for radard and boardd safety mode. After a fast boot only once the confirmer
+  # is done, boardd forwards every message until then so the full fingerprint can run
+  if confirmer is None:
+    params.put("CarParams", CP.to_bytes())
+    params.put("LongitudinalControl", "1" if CP.openpilotLongitudinalControl else "0")
 
   CC = car.CarControl.new_message()
   AM = AlertManager()
@@ -275,6 +316,7 @@ def controlsd_thread(gctx=None):
   lkasMode = int(float(LaC.kegman.conf['lkasMode']))
   #CI.CS.lkasMode = (lkasMode == 0)
   lac_log = None #car.CarState.lateralControlState.pidState.new_message()
+  scheduler = DeadlineScheduler(100, kegman_conf().conf['catchUpPolicy'])
 
   state = State.disabled
   soft_disable_timer = 0
@@ -289,8 +331,23 @@ def controlsd_thread(gctx=None):
 
     start_time = 0 # time.time()  #sec_since_boot()
 
+    if confirmer is not None and confirmer.result is not None:
+      if not confirmer.result:
+        # the cached car was wrong, continue disabled with the one fingerprinted. Lateral keeps
+        # its sockets, it does not depend on the car
+        CI, CP = confirmer.CI, confirmer.CP
+        LaC = LatControlPID(CP)
+        state = State.disabled
+        AM.add(sm.frame, get_startup_alert(CP.carFingerprint != "mock", True), False)
+      params.put("CarParams", CP.to_bytes())
+      params.put("LongitudinalControl", "1" if CP.openpilotLongitudinalControl else "0")
+      confirmer = None
+
     # Sample data and compute car events
-    CS, events = data_sample(CI, CC, can_sock, carstate, lac_log, lateral, sm, profiler)
+    CS, events = data_sample(CI, CC, can_sock, carstate, lac_log, lateral, sm, profiler, scheduler)
+    if confirmer is not None:
+      # no CarParams and safety model for boardd yet
+      events.append(create_event('carUnconfirmed', [ET.NO_ENTRY]))
     profiler.checkpoint('data_sample')
 
     state, soft_disable_timer, v_cruise_kph, v_cruise_kph_last = \
@@ -307,10 +364,16 @@ def controlsd_thread(gctx=None):
     CC, events_prev = data_send(sm, CS, CI, CP, state, events, actuators, carstate, carcontrol, carevents, carparams,
                     controlsstate, sendcan, AM, LaC, start_time, lac_log, events_prev, profiler)
     profiler.checkpoint('data_send')
+    scheduler.output_sent()
+
+    # housekeeping in the slack left until the next can packet
+    scheduler.run('alerts', update_alerts, sm.frame, state, events, AM)
+    scheduler.run('live_tune', LaC.live_tune, CP, every=10, max_defer=100)
+    scheduler.run('stats', publish_stats, latencystats, LaC, [profiler, LaC.profiler], scheduler, every=100, max_defer=100)
+    scheduler.run('profiler', display_profilers, [profiler], every=10000, max_defer=1000)
+    profiler.checkpoint('housekeeping')
+    scheduler.end_frame()
     frame += 1
-    if frame % 10000 == 0 and profiler.enabled:
-      profiler.display()
-      profiler.reset(True)
 
     
 def main(gctx=None):
@@ -568,6 +568,13 @@ ALERTS = [
       AlertStatus.normal, AlertSize.mid,
       Priority.LOW, VisualAlert.none, AudibleAlert.chimeError, .4, 2., 3.),
 
+  Alert(
+      "carUnconfirmedNoEntry",
+      "openpilot Unavailable",
+      "Confirming Car Fingerprint",
+      AlertStatus.normal, AlertSize.mid,
+      Priority.LOW, VisualAlert.none, AudibleAlert.chimeError, .4, 2., 3.),
+
   Alert(
       "canErrorNoEntry",
       "openpilot Unavailable",
@@ -0,0 +1,78 @@
+import numpy as np
+
+
+class InputHistory(object):
+  """Fixed-shape float32 history window backed by a mirrored ring buffer.
+
+  Every row is written twice, at index and index + rows, so the newest rows are always
+  available as one contiguous slice of the buffer without shifting or copying.
+
+  Columns listed in delay_cols are written with the values seen delay appends earlier,
+  which replaces shifting those columns down the window after it has been assembled.
+  """
+  def __init__(self, rows, cols, delay=0, delay_cols=None):
+    self.rows = rows
+    self.cols = cols
+    self.buffer = np.zeros((1, 2 * rows, cols), dtype=np.float32)
+    self.index = 0
+    self.count = 0
+    self.delay = delay
+    self.delay_cols = delay_cols
+    if delay > 0:
+      self.raw = np.zeros((delay + 1, cols), dtype=np.float32)
+
+  @property
+  def full(self):
+    return self.count >= self.rows
+
+  @property
+  def latest(self):
+    return self.buffer[0, self.index + self.rows - 1]
+
+  def append(self, row):
+    row_view = self.buffer[0, self.index]
+    row_view[:] = row
+    if self.delay > 0:
+      self.raw[self.count % (self.delay + 1)] = row_view
+      if self.count >= self.delay:
+        row_view[self.delay_cols] = self.raw[(self.count - self.delay) % (self.delay + 1), self.delay_cols]
+    self.buffer[0, self.index + self.rows] = row_view
+    self.index = (self.index + 1) % self.rows
+    self.count += 1
+
+  def extend(self, rows):
+    """Appends the rows of a (n, cols) array at once, the same as n calls of append."""
+    rows = np.asarray(rows, dtype=np.float32)
+    n = len(rows)
+    if n == 0:
+      return
+    out = rows
+    if self.delay > 0:
+      # rows seen delay appends earlier come from the raw ring, then from the batch itself
+      raw_prev = self.raw[(self.count + np.arange(-self.delay, 0)) % (self.delay + 1)]
+      delayed = np.concatenate((raw_prev, rows))[:n]
+      lagged = (self.count + np.arange(n) >= self.delay)[:, None]
+      out = rows.copy()
+      out[:, self.delay_cols] = np.where(lagged, delayed[:, self.delay_cols], rows[:, self.delay_cols])
+      kept = min(n, self.delay + 1)
+      self.raw[(self.count + np.arange(n - kept, n)) % (self.delay + 1)] = rows[n - kept:]
+    # only the newest rows of a batch longer than the window remain
+    kept = min(n, self.rows)
+    index = (self.index + np.arange(n - kept, n)) % self.rows
+    self.buffer[0, index] = out[n - kept:]
+    self.buffer[0, index + self.rows] = out[n - kept:]
+    self.index = (self.index + n) % self.rows
+    self.count += n
+
+  def window(self, rows=None):
+    """Returns a (1, rows, cols) view of the newest rows, oldest first. The view is only valid
+    until the next append."""
+    end = self.index + self.rows
+    if rows is None:
+      rows = self.rows
+    return self.buffer[:, end - rows:end]
+
+  def reset(self):
+    self.buffer[:] = 0.
+    self.index = 0
+    self.count = 0
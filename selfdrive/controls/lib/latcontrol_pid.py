@@ -1,4 +1,6 @@
 from selfdrive.controls.lib.pid import PIController
+from selfdrive.controls.lib.live_tune import LiveTune
+from selfdrive.controls.lib.latency_trace import LatencyTrace
 from selfdrive.kegman_conf import kegman_conf
 from common.numpy_fast import gernterp, interp, clip
 from common.profiler import Profiler
@@ -15,8 +17,9 @@ import json
 class LatControlPID(object):
   def __init__(self, CP):
     self.kegman = kegman_conf(CP)
-    self.kegtime_prev = 0
+    self.tune = LiveTune()
     self.profiler = Profiler(False, 'LaC')
+    self.latency = LatencyTrace('controls')
     self.frame = 0
     self.pid = PIController((CP.lateralTuning.pid.kpBP, CP.lateralTuning.pid.kpV),
                             (CP.lateralTuning.pid.kiBP, CP.lateralTuning.pid.kiV),
@@ -65,7 +68,7 @@ class LatControlPID(object):
     self.fast_angles = [[]]
     self.center_angles = []
     self.last_model_index = 0
-    self.live_tune(CP)
+    self.apply_tune()
     self.react_index = 0.0
     self.next_params_put = 36000
     self.zero_poly_crossed = 0
@@ -89,32 +92,29 @@ class LatControlPID(object):
       self.angle_ff_offset = 0.
 
   def live_tune(self, CP):
-    if self.frame % 300 == 0:
-      (mode, ino, dev, nlink, uid, gid, size, atime, mtime, self.kegtime) = os.stat(os.path.expanduser('~/kegman.json'))
-      if self.kegtime != self.kegtime_prev:
-        try:
-          time.sleep(0.0001)
-          self.kegman = kegman_conf() 
-        except:
-          print("   Kegman error")
-        self.pid._k_i = ([0.], [float(self.kegman.conf['Ki'])])
-        self.pid._k_p = ([0.], [float(self.kegman.conf['Kp'])])
-        self.pid.k_f = (float(self.kegman.conf['Kf']))
-        self.damp_steer = (float(self.kegman.conf['dampSteer']))
-        self.react_steer = (float(self.kegman.conf['reactSteer']))
-        self.react_mpc = (float(self.kegman.conf['reactMPC']))
-        self.damp_mpc = (float(self.kegman.conf['dampMPC']))
-        self.deadzone = float(self.kegman.conf['deadzone'])
-        self.rate_ff_gain = float(self.kegman.conf['rateFFGain'])
-        self.wiggle_angle = float(self.kegman.conf['wiggleAngle'])
-        self.accel_limit = (float(self.kegman.conf['accelLimit']))
-        self.polyReact = min(11, max(0, int(10 * float(self.kegman.conf['polyReact']))))
-        self.poly_damp = min(1, max(0, float(self.kegman.conf['polyDamp'])))
-        self.poly_factor = max(0.0, float(self.kegman.conf['polyFactor']) * 0.001)
-        self.require_blinker = bool(int(self.kegman.conf['requireBlinker']))
-        self.require_nudge = bool(int(self.kegman.conf['requireNudge']))
-        self.react_center = [max(0, float(self.kegman.conf['reactCenter0'])),max(0, float(self.kegman.conf['reactCenter1'])),max(0, float(self.kegman.conf['reactCenter2'])), 0]
-        self.kegtime_prev = self.kegtime
+    tune = self.tune.update()
+    if tune is not None:
+      self.kegman.conf.update(tune)
+      self.apply_tune()
+
+  def apply_tune(self):
+    self.pid._k_i = ([0.], [float(self.kegman.conf['Ki'])])
+    self.pid._k_p = ([0.], [float(self.kegman.conf['Kp'])])
+    self.pid.k_f = (float(self.kegman.conf['Kf']))
+    self.damp_steer = (float(self.kegman.conf['dampSteer']))
+    self.react_steer = (float(self.kegman.conf['reactSteer']))
+    self.react_mpc = (float(self.kegman.conf['reactMPC']))
+    self.damp_mpc = (float(self.kegman.conf['dampMPC']))
+    self.deadzone = float(self.kegman.conf['deadzone'])
+    self.rate_ff_gain = float(self.kegman.conf['rateFFGain'])
+    self.wiggle_angle = float(self.kegman.conf['wiggleAngle'])
+    self.accel_limit = (float(self.kegman.conf['accelLimit']))
+    self.polyReact = min(11, max(0, int(10 * float(self.kegman.conf['polyReact']))))
+    self.poly_damp = min(1, max(0, float(self.kegman.conf['polyDamp'])))
+    self.poly_factor = max(0.0, float(self.kegman.conf['polyFactor']) * 0.001)
+    self.require_blinker = bool(int(self.kegman.conf['requireBlinker']))
+    self.require_nudge = bool(int(self.kegman.conf['requireNudge']))
+    self.react_center = [max(0, float(self.kegman.conf['reactCenter0'])),max(0, float(self.kegman.conf['reactCenter1'])),max(0, float(self.kegman.conf['reactCenter2'])), 0]
 
   def update_lane_state(self, angle_steers, driver_opposing_lane, blinker_on, path_plan):
     if self.require_nudge:
@@ -182,6 +182,7 @@ class LatControlPID(object):
     self.prev_angle_steers = angle_steers
 
     if (path_plan.canTime != self.last_plan_time or path_plan.modelIndex != self.last_model_index) and len(path_plan.fastAngles) > 1:
+      self.latency.record(path_plan.traceMonoTimes)
       if path_age > 0.23: self.old_plan_count += 1
       if self.path_index is None:
         self.avg_plan_age = path_age
@@ -233,8 +234,6 @@ class LatControlPID(object):
 
     self.profiler.checkpoint('update')
     self.frame += 1
-    self.live_tune(CP)
-    self.profiler.checkpoint('live_tune')
 
     if v_ego < 0.3 or not path_plan.paramsValid or not active:
       if self.frame > self.next_params_put and v_ego == 0 and not cruise_enabled:
@@ -0,0 +1,59 @@
+import selfdrive.messaging as messaging
+from common.histogram import Histogram
+from common.realtime import sec_since_boot
+
+# Stamps of one camera frame on its way through the lateral pipeline, ns since boot like the
+# logMonoTime boardd gives the can packet. Lateral puts the first three in CarState.traceMonoTimes,
+# transcoderd adds its four in PathPlan.traceMonoTimes and LatControlPID takes the last one when
+# it first uses the plan.
+TRACE_POINTS = ['canRecv', 'carStateBuilt', 'carStateSend', 'transcoderRecv', 'inferenceStart', 'inferenceEnd', 'pathPlanSend', 'pidConsume']
+CARSTATE_POINTS = 3
+PATHPLAN_POINTS = 7
+
+# name, first and last stamp
+SPANS = [
+  ('carState', 0, 1),
+  ('lateral', 1, 2),
+  ('carStateTransport', 2, 3),
+  ('inputWait', 3, 4),
+  ('inference', 4, 5),
+  ('planBuild', 5, 6),
+  ('planTransport', 6, 7),
+  ('total', 0, 7),
+]
+
+def mono_time():
+  return int(sec_since_boot() * 1e9)
+
+def stats_message(source, spans):
+  """latencyStats of (name, Histogram.stats in ms) pairs."""
+  dat = messaging.new_message()
+  dat.init('latencyStats')
+  dat.latencyStats.source = source
+  for span, (name, stats) in zip(dat.latencyStats.init('spans', len(spans)), spans):
+    span.name = name
+    span.count = stats['count']
+    span.meanMs = stats['mean']
+    span.p50Ms = stats['p50']
+    span.p90Ms = stats['p90']
+    span.p99Ms = stats['p99']
+    span.maxMs = stats['max']
+  return dat
+
+
+class LatencyTrace(object):
+  def __init__(self, source):
+    self.source = source
+    self.histograms = [Histogram() for _ in SPANS]
+
+  def record(self, plan_times, consume_time=None):
+    """Adds the spans of a traced pathPlan, plans of an untraced carState are skipped."""
+    if len(plan_times) != PATHPLAN_POINTS or plan_times[0] == 0:
+      return False
+    times = list(plan_times) + [mono_time() if consume_time is None else consume_time]
+    for hist, (_, first, last) in zip(self.histograms, SPANS):
+      hist.record(max(0, times[last] - times[first]))
+    return True
+
+  def message(self):
+    return stats_message(self.source, [(name, hist.snapshot().stats(1e6)) for hist, (name, _, _) in zip(self.histograms, SPANS)])
@@ -0,0 +1,105 @@
+import numpy as np
+from operator import attrgetter
+
+from selfdrive.car.honda.lanecam import LANES, ROW_SIZE, column
+
+# Fixed schema float32 snapshot of the CarState fields transcoderd uses, published by laterald
+# next to carState. A message is a header followed by one row per CarState since the last
+# camera frame, both decode with np.frombuffer. Bump SCHEMA_ID whenever SCALARS or the lane row
+# layout change, decode() rejects messages of any other schema. decode_rows() gives the rows as is,
+# their 'values' are a (rows, VALUES) float32 matrix with the columns named in COLUMNS.
+
+MAGIC = 0x464c  # LF
+SCHEMA_ID = 2
+
+SCALARS = ['vEgo', 'steeringAngle', 'steeringRate', 'steeringTorque', 'steeringTorqueEps', 'lateralAccel',
+           'longAccel', 'yawRateCAN', 'torqueRequest', 'cruiseState.enabled', 'camLeft.frame', 'camFarRight.frame']
+VALUES = len(SCALARS) + ROW_SIZE
+MODEL_DATA = slice(len(SCALARS), VALUES)
+
+HEADER = np.dtype([('magic', '<u2'), ('schema', '<u2'), ('count', '<u4')])
+# times are kept in float64, canTime and sysTime are ms since epoch, the trace is zero when not traced
+ROW = np.dtype([('canTime', '<f8'), ('sysTime', '<f8'), ('trace', '<u8', (3,)), ('values', '<f4', (VALUES,))])
+
+_getters = [attrgetter(name) for name in SCALARS]
+
+
+def encode_row(cs):
+  row = np.zeros(1, dtype=ROW)
+  row['canTime'] = cs.canTime
+  row['sysTime'] = cs.sysTime
+  trace = cs.traceMonoTimes
+  if len(trace) == len(row['trace'][0]):
+    row['trace'][0] = trace
+  values = row['values'][0]
+  values[:len(SCALARS)] = [getter(cs) for getter in _getters]
+  model_data = cs.modelData
+  if len(model_data) == ROW_SIZE:
+    values[MODEL_DATA] = model_data
+  return row.tobytes()
+
+def encode(rows):
+  header = np.array([(MAGIC, SCHEMA_ID, len(rows))], dtype=HEADER)
+  return header.tobytes() + b''.join(rows)
+
+def decode_rows(dat):
+  header = np.frombuffer(dat, dtype=HEADER, count=1)[0]
+  if header['magic'] != MAGIC or header['schema'] != SCHEMA_ID:
+    raise ValueError("lateralFeatures schema %d, expected %d" % (header['schema'], SCHEMA_ID))
+  return np.frombuffer(dat, dtype=ROW, count=header['count'], offset=HEADER.itemsize)
+
+def decode(dat):
+  return [LateralFeatures(row) for row in decode_rows(dat)]
+
+
+class _Group(object):
+  __slots__ = ('values', 'indices')
+
+  def __init__(self, values, indices):
+    self.values = values
+    self.indices = indices
+
+  def __getattr__(self, name):
+    try:
+      return self.values[self.indices[name]].item()
+    except KeyError:
+      raise AttributeError(name)
+
+
+class LateralFeatures(object):
+  """Read only CarState look-alike over one decoded row, so code written against carState keeps
+  working with cs.vEgo or cs.camLeft.parm4."""
+  def __init__(self, row):
+    self.values = row['values']
+    self.canTime = int(row['canTime'])
+    self.sysTime = int(row['sysTime'])
+    self.traceMonoTimes = [int(t) for t in row['trace']] if row['trace'][0] != 0 else []
+
+  @property
+  def modelData(self):
+    return self.values[MODEL_DATA]
+
+  def __getattr__(self, name):
+    # only reached for nested structs like camLeft or cruiseState
+    if name in _groups:
+      return _Group(self.values, _groups[name])
+    raise AttributeError(name)
+
+
+def _scalar(index):
+  return property(lambda self: self.values[index].item())
+
+# column of each field in the values of a row, like 'vEgo' or 'camLeft.parm4'
+COLUMNS = {}
+_groups = {}
+for _index, _name in enumerate(SCALARS):
+  COLUMNS[_name] = _index
+  if '.' in _name:
+    _group, _field = _name.split('.')
+    _groups.setdefault(_group, {})[_field] = _index
+  else:
+    setattr(LateralFeatures, _name, _scalar(_index))
+for _lane, _ in LANES:
+  for _field in ['parm%d' % i for i in range(1, 11)] + ['dashed', 'solid']:
+    COLUMNS['%s.%s' % (_lane, _field)] = len(SCALARS) + column(_lane, _field)
+    _groups.setdefault(_lane, {})[_field] = COLUMNS['%s.%s' % (_lane, _field)]
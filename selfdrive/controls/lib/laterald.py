@@ -10,6 +10,8 @@ from selfdrive.kegman_conf import kegman_conf
 from selfdrive.services import service_list
 from cereal import log, car
 from common.params import Params
+from selfdrive.controls.lib import lateral_features
+from selfdrive.controls.lib.latency_trace import mono_time
 
 INPUTS = 77
 HISTORY_ROWS = 5
@@ -20,7 +22,17 @@ class Lateral(object):
     self.use_bias = 1
     self.use_lateral_offset = 1
     self.use_angle_offset = 1
-    self.carstate = messaging.pub_sock(service_list['carState'].port)
+    kegman = kegman_conf()
+    self.use_shm = kegman.conf['carStateShm'] == '1'
+    if self.use_shm:
+      self.carstate = messaging.ShmPubSock('carState', packed=kegman.conf['carStatePacked'] == '1')
+    else:
+      self.carstate = messaging.pub_sock(service_list['carState'].port)
+    self.use_features = kegman.conf['lateralFeatures'] == '1'
+    self.use_trace = kegman.conf['latencyTrace'] == '1'
+    if self.use_features:
+      self.features = messaging.pub_sock(service_list['lateralFeatures'].port)
+    self.features_prev = []
     self.cs_prev = []
     self.camera_array = []
     self.vehicle_array = []
@@ -30,12 +42,33 @@ class Lateral(object):
     self.centerOffset = 0
     self.lastGPS = 0
 
+  def hold_rows(self, cs, count):
+    """Rows for the other packets of a coalesced backlog, so the 100 Hz vehicle history of
+    transcoderd keeps its time base. They hold the state of the batch, serialized once."""
+    cs_send = messaging.new_message()
+    cs_send.init('carState')
+    cs_send.valid = cs.canValid
+    cs_send.carState = cs
+    if self.use_shm:
+      dat = cs_send.to_bytes_packed() if self.carstate.packed else cs_send.to_bytes()
+      for _ in range(count):
+        self.carstate.write(dat)
+    else:
+      self.cs_prev.extend([cs_send.to_bytes()] * count)
+    if self.use_features:
+      self.features_prev.extend([lateral_features.encode_row(cs)] * count)
+
   def update(self, cs, sm, can_index, can_count):
     self.frame_count += 1
+    built_time = mono_time() if self.use_trace else 0
+    if can_count > 1:
+      self.hold_rows(cs, can_count - 1)
 
     cs_send = messaging.new_message()
     cs_send.init('carState')
     cs_send.valid = cs.canValid
+    if self.use_features:
+      self.features_prev.append(lateral_features.encode_row(cs))
 
     if cs.camLeft.frame != self.stock_cam_frame_prev and cs.camLeft.frame == cs.camFarRight.frame:
       self.stock_cam_frame_prev = cs.camLeft.frame
@@ -56,12 +89,26 @@ class Lateral(object):
       cs.gpsLocation.bearingAccuracy = gps.bearingAccuracy
       cs.gpsLocation.speedAccuracy = gps.speedAccuracy
       cs.gpsLocation.timestamp = gps.timestamp
+      if self.use_trace and len(cs.canMonoTimes) > 0:
+        cs.traceMonoTimes = [cs.canMonoTimes[-1], built_time, mono_time()]
 
       cs_send.carState = cs
-      self.cs_prev.append(cs_send.to_bytes())
-      self.carstate.send_multipart(self.cs_prev)
-      self.cs_prev.clear()
+      if self.use_shm:
+        self.carstate.send(cs_send)
+      else:
+        self.cs_prev.append(cs_send.to_bytes())
+        self.carstate.send_multipart(self.cs_prev)
+        self.cs_prev.clear()
+      if self.use_features:
+        if self.use_trace:
+          self.features_prev[-1] = lateral_features.encode_row(cs)
+        self.features.send(lateral_features.encode(self.features_prev))
+        self.features_prev.clear()
               
     else:
       cs_send.carState = cs
-      self.cs_prev.append(cs_send.to_bytes())
+      # the ring keeps every event, subscribers are only woken once per camera frame
+      if self.use_shm:
+        self.carstate.write(cs_send)
+      else:
+        self.cs_prev.append(cs_send.to_bytes())
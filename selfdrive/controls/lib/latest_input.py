@@ -0,0 +1,37 @@
+import threading
+import numpy as np
+
+
+class LatestInput(object):
+  """Single producer, single consumer triple buffer that only hands out the newest input.
+
+  put() copies into the back buffer and swaps it with the pending one, so the producer never
+  waits on the consumer. A pending input that was never read is overwritten and counted in
+  dropped. Arrays returned by get() belong to the consumer until its next get().
+  """
+  def __init__(self, shapes):
+    self.buffers = [[np.zeros(shape, dtype=np.float32) for shape in shapes] for _ in range(3)]
+    self.meta = [None, None, None]
+    self.back, self.pending, self.front = 0, 1, 2
+    self.fresh = False
+    self.dropped = 0
+    self.condition = threading.Condition()
+
+  def put(self, arrays, meta=None):
+    for dst, src in zip(self.buffers[self.back], arrays):
+      dst[:] = src
+    self.meta[self.back] = meta
+    with self.condition:
+      self.back, self.pending = self.pending, self.back
+      if self.fresh:
+        self.dropped += 1
+      self.fresh = True
+      self.condition.notify()
+
+  def get(self, timeout=None):
+    with self.condition:
+      if not self.condition.wait_for(lambda: self.fresh, timeout):
+        return None, None
+      self.front, self.pending = self.pending, self.front
+      self.fresh = False
+    return self.buffers[self.front], self.meta[self.front]
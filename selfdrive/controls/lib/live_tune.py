@@ -0,0 +1,119 @@
+import os
+import json
+import mmap
+import time
+import struct
+
+import selfdrive.messaging as messaging
+from selfdrive.kegman_conf import kegman_conf
+
+# Snapshot of kegman.json published in shared memory by tuned. Readers check the sequence number
+# of the header every frame, which is a memory read rather than a stat of kegman.json, and only
+# parse the snapshot when it changed. The sequence is odd while tuned writes, version = seq // 2.
+# tuned also beats a heartbeat after the header, readers go back to kegman.json when it stops.
+
+TUNE_PATH = messaging.shm_path('liveTune')
+TUNE_SIZE = 64 * 1024
+TUNE_HEADER = struct.Struct('<QI')  # seq, payload size
+TUNE_HEARTBEAT = struct.Struct('<d')  # time.monotonic() of the last beat
+TUNE_PAYLOAD = TUNE_HEADER.size + TUNE_HEARTBEAT.size
+TUNE_BEAT_INTERVAL = 1.
+TUNE_TIMEOUT = 5.
+KEGMAN_PATH = os.path.expanduser('~/kegman.json')
+
+
+class TunePublisher(object):
+  def __init__(self, path=TUNE_PATH):
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+      os.ftruncate(fd, TUNE_SIZE)
+      self.buf = mmap.mmap(fd, TUNE_SIZE)
+    finally:
+      os.close(fd)
+    # continue after the last published version, readers may still hold it
+    self.seq, _ = TUNE_HEADER.unpack_from(self.buf, 0)
+    self.seq += self.seq % 2
+
+  def beat(self):
+    TUNE_HEARTBEAT.pack_into(self.buf, TUNE_HEADER.size, time.monotonic())
+
+  def publish(self, conf):
+    payload = json.dumps(conf).encode()
+    if len(payload) > TUNE_SIZE - TUNE_PAYLOAD:
+      raise ValueError("tune snapshot of %d bytes does not fit" % len(payload))
+    TUNE_HEADER.pack_into(self.buf, 0, self.seq + 1, len(payload))
+    self.buf[TUNE_PAYLOAD:TUNE_PAYLOAD + len(payload)] = payload
+    self.seq += 2
+    TUNE_HEADER.pack_into(self.buf, 0, self.seq, len(payload))
+    self.beat()
+    return self.seq // 2
+
+
+class LiveTune(object):
+  """update() returns the kegman config once for every new version and None otherwise. Without
+  tuned, or once its heartbeat is older than TUNE_TIMEOUT, it falls back to reloading kegman.json
+  when its mtime changes. Both are checked every poll_interval."""
+  def __init__(self, path=TUNE_PATH, poll_interval=1.):
+    self.path = path
+    self.poll_interval = poll_interval
+    self.buf = None
+    self.seq = 0
+    self.conf = None
+    self.kegtime = None
+    self.next_poll = 0.
+
+  @property
+  def version(self):
+    return self.seq // 2
+
+  def _map(self):
+    try:
+      fd = os.open(self.path, os.O_RDONLY)
+    except OSError:
+      return False
+    try:
+      self.buf = mmap.mmap(fd, TUNE_SIZE, access=mmap.ACCESS_READ)
+    except ValueError:
+      # tuned is still creating the file
+      return False
+    finally:
+      os.close(fd)
+    return True
+
+  def _read(self):
+    seq, size = TUNE_HEADER.unpack_from(self.buf, 0)
+    if seq == self.seq or seq % 2 == 1:
+      return None
+    payload = bytes(self.buf[TUNE_PAYLOAD:TUNE_PAYLOAD + size])
+    if TUNE_HEADER.unpack_from(self.buf, 0)[0] != seq:
+      return None
+    self.seq = seq
+    self.conf = json.loads(payload.decode())
+    return self.conf
+
+  def _poll_file(self):
+    try:
+      kegtime = os.stat(KEGMAN_PATH).st_mtime
+      if kegtime == self.kegtime:
+        return None
+      conf = kegman_conf().conf
+    except (OSError, ValueError):
+      # missing or half written, the previous conf is kept and the file read again next poll
+      print("   Kegman error")
+      return None
+    self.kegtime = kegtime
+    self.conf = conf
+    return self.conf
+
+  def alive(self):
+    return time.monotonic() - TUNE_HEARTBEAT.unpack_from(self.buf, TUNE_HEADER.size)[0] < TUNE_TIMEOUT
+
+  def update(self):
+    now = time.monotonic()
+    if now < self.next_poll:
+      return self._read() if self.buf is not None else None
+    self.next_poll = now + self.poll_interval
+    if (self.buf is not None or self._map()) and self.alive():
+      return self._read()
+    # the file of a stopped tuned stays mapped, its versions are read again once it beats
+    return self._poll_file()
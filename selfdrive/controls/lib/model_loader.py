@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import hashlib
+import platform
+import numpy as np
+
+MODEL_DIR = 'models'
+MODEL_LIST = os.path.join(MODEL_DIR, 'models.json')
+BENCHMARK_CACHE = os.path.join(MODEL_DIR, 'benchmark.json')
+SESSION_CACHE = os.path.join(MODEL_DIR, 'cache')
+
+# fp32 is the shipped model, opt is its offline optimized graph and int8 has dynamically quantized weights
+VARIANTS = ['fp32', 'opt', 'int8']
+# camera frames of history each model in models.json was trained on
+HISTORY_ROWS = [2, 5]
+
+
+def model_names(model_list=MODEL_LIST):
+  with open(model_list, 'r') as f:
+    return json.load(f)['models']
+
+def variant_path(name, variant, model_dir=MODEL_DIR):
+  if variant == 'fp32':
+    return os.path.join(model_dir, name)
+  return os.path.join(model_dir, '%s.%s.onnx' % (os.path.splitext(name)[0], variant))
+
+def device_id():
+  cpu = ''
+  try:
+    with open('/proc/cpuinfo', 'r') as f:
+      for line in f:
+        key, _, value = line.partition(':')
+        # the Pi reports its board under Model, x86 reports the cpu under model name
+        if key.strip() in ['Model', 'model name']:
+          cpu = value.strip()
+          if key.strip() == 'Model':
+            break
+  except IOError:
+    pass
+  return ('%s %s' % (platform.machine(), cpu)).strip()
+
+def read_benchmarks(path=BENCHMARK_CACHE):
+  try:
+    with open(path, 'r') as f:
+      return json.load(f)
+  except (IOError, ValueError):
+    return {}
+
+def write_benchmark(name, variant, latency_ms, path=BENCHMARK_CACHE, device=None):
+  benchmarks = read_benchmarks(path)
+  benchmarks.setdefault(device or device_id(), {}).setdefault(name, {})[variant] = round(latency_ms, 4)
+  with open(path + '.tmp', 'w') as f:
+    json.dump(benchmarks, f, indent=2, sort_keys=True)
+  os.rename(path + '.tmp', path)
+
+def select_variant(name, benchmarks=None, model_dir=MODEL_DIR, device=None):
+  """Returns the fastest benchmarked variant of a model on this device. Only variants that passed
+  verification are ever written to the cache, anything unknown falls back to fp32."""
+  if benchmarks is None:
+    benchmarks = read_benchmarks()
+  timings = benchmarks.get(device or device_id(), {}).get(name, {})
+  timings = {v: t for v, t in timings.items() if v in VARIANTS and os.path.exists(variant_path(name, v, model_dir))}
+  if len(timings) == 0:
+    return 'fp32'
+  return min(timings, key=timings.get)
+
+def model_inputs(rows, vehicle1, vehicle2, camera1, camera2, fingerprint):
+  """Feed for one model from full (1, rows, cols) input windows, the vehicle1 window runs at
+  ~6.7 samples per camera frame and is capped at 26 rows."""
+  return {'prod_vehicle1_0:0': vehicle1[:, -round(min(26, rows*6.6666667)):],
+          'prod_vehicle2_0:0': vehicle2[:, -rows:],
+          'prod_camera1_0:0': camera1[:, -rows:],
+          'prod_camera2_0:0': camera2[:, -rows:],
+          'fingerprints0:0': fingerprint,
+         }
+
+def load_session(path, threads=1, parallel=False, optimization=None, optimized_path=None):
+  import onnxruntime as ort
+  options = ort.SessionOptions()
+  options.intra_op_num_threads = threads
+  options.inter_op_num_threads = 1
+  options.execution_mode = ort.ExecutionMode.ORT_PARALLEL if parallel else ort.ExecutionMode.ORT_SEQUENTIAL
+  options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL if optimization is None else optimization
+  if optimized_path is not None:
+    options.optimized_model_filepath = optimized_path
+  session = ort.InferenceSession(path, options)
+  session.set_providers(['CPUExecutionProvider'], None)
+  return session
+
+def cached_session(path, threads=1, cache_dir=SESSION_CACHE):
+  """Loads a model from its optimized graph in cache_dir, optimizing and saving it first when the
+  model file, onnxruntime version or machine changed since the graph was written."""
+  import onnxruntime as ort
+  with open(path, 'rb') as f:
+    digest = hashlib.sha1(f.read()).hexdigest()[:16]
+  prefix = os.path.splitext(os.path.basename(path))[0]
+  cached = os.path.join(cache_dir, '%s@%s-%s-%s.onnx' % (prefix, digest, ort.__version__, platform.machine()))
+
+  if os.path.exists(cached):
+    try:
+      return load_session(cached, threads, optimization=ort.GraphOptimizationLevel.ORT_DISABLE_ALL)
+    except Exception as e:
+      print("discarding cached graph %s: %s" % (cached, e))
+      os.remove(cached)
+
+  if not os.path.exists(cache_dir):
+    os.makedirs(cache_dir)
+  session = load_session(path, threads, optimized_path=cached + '.tmp')
+  os.rename(cached + '.tmp', cached)
+  # graphs of older model files or onnxruntime versions are never loaded again
+  for f in os.listdir(cache_dir):
+    if f.startswith(prefix + '@') and os.path.join(cache_dir, f) != cached:
+      os.remove(os.path.join(cache_dir, f))
+  return session
+
+def output_width(session):
+  shape = session.get_outputs()[0].shape
+  return shape[-1] if isinstance(shape[-1], int) else None
+
+def run_windows(session, rows, windows):
+  """Runs a session over windows recorded by transcoderd, returns the outputs and the latency
+  of every run in ms."""
+  outputs = []
+  latencies = []
+  for i in range(len(windows['vehicle1'])):
+    feed = model_inputs(rows, windows['vehicle1'][i:i+1], windows['vehicle2'][i:i+1], windows['camera1'][i:i+1], windows['camera2'][i:i+1], windows['fingerprint'])
+    start = time.perf_counter()
+    outputs.append(session.run(None, feed)[0][0])
+    latencies.append(1000. * (time.perf_counter() - start))
+  return np.array(outputs), np.array(latencies)
+
+def output_error(reference, output):
+  # same slices transcoderd turns into fastAngles and cPoly
+  angle_speed_count = reference.shape[2] - 7
+  angle_error = np.max(np.abs(reference[:,:,:angle_speed_count] - output[:,:,:angle_speed_count]))
+  poly_error = np.max(np.abs(reference[:,:,angle_speed_count::3] - output[:,:,angle_speed_count::3]))
+  return angle_error, poly_error
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+import unittest
+import numpy as np
+
+from selfdrive.controls.lib.input_history import InputHistory
+
+
+def shifted_window(rows, history, delay, delay_cols):
+  # what transcoderd used to build every frame from python lists
+  window = np.array([[history[-rows:]]], dtype='float32')
+  if delay > 0:
+    window[:, :, delay:, delay_cols] = window[:, :, :-delay, delay_cols]
+  return window[0]
+
+
+class TestInputHistory(unittest.TestCase):
+  def test_window_order(self):
+    history = InputHistory(4, 2)
+    for i in range(10):
+      history.append((i, -i))
+      expected = [[j, -j] for j in range(max(0, i - 3), i + 1)]
+      np.testing.assert_equal(history.window(min(i + 1, 4))[0], expected)
+    self.assertTrue(history.full)
+    np.testing.assert_equal(history.latest, [9, -9])
+    np.testing.assert_equal(history.window(2)[0], [[8, -8], [9, -9]])
+
+  def test_delayed_columns_match_shift(self):
+    rows, delay, delay_cols = 40, 6, slice(2, 7)
+    history = InputHistory(rows, 7, delay=delay, delay_cols=delay_cols)
+    rows_seen = []
+    np.random.seed(0)
+    for _ in range(200):
+      row = np.random.uniform(-50, 50, 7).astype('float32').tolist()
+      rows_seen.append(row)
+      history.append(row)
+      if history.full:
+        # only the rows ahead of the delay are used by the models
+        np.testing.assert_equal(history.window()[0, delay:], shifted_window(rows, rows_seen, delay, delay_cols)[0, delay:])
+
+  def test_extend_matches_append(self):
+    np.random.seed(1)
+    for delay, delay_cols in [(0, None), (1, slice(4, 6)), (6, slice(2, 7))]:
+      appended = InputHistory(10, 7, delay=delay, delay_cols=delay_cols)
+      extended = InputHistory(10, 7, delay=delay, delay_cols=delay_cols)
+      for size in [0, 1, 3, 7, 2, 15, 1, 4, 30, 5]:
+        batch = np.random.uniform(-50, 50, (size, 7)).astype('float32')
+        for row in batch:
+          appended.append(row)
+        extended.extend(batch)
+        self.assertEqual(extended.count, appended.count)
+        np.testing.assert_equal(extended.buffer, appended.buffer)
+
+  def test_reset(self):
+    history = InputHistory(3, 1)
+    for i in range(5):
+      history.append((i,))
+    history.reset()
+    self.assertFalse(history.full)
+    np.testing.assert_equal(history.window(), np.zeros((1, 3, 1)))
+
+
+if __name__ == "__main__":
+  unittest.main()
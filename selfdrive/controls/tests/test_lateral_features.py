@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import unittest
+import numpy as np
+from types import SimpleNamespace
+
+from selfdrive.car.honda.lanecam import ROW_SIZE, column
+from selfdrive.controls.lib import lateral_features
+
+
+def car_state(frame, v_ego, model_data=[], trace=[]):
+  cam = SimpleNamespace(frame=frame)
+  return SimpleNamespace(vEgo=v_ego, steeringAngle=-12.5, steeringRate=3., steeringTorque=40., steeringTorqueEps=-8.,
+                         lateralAccel=0.2, longAccel=-0.1, yawRateCAN=0.05, torqueRequest=0.3,
+                         cruiseState=SimpleNamespace(enabled=True), camLeft=cam, camFarRight=cam,
+                         canTime=1560000000123, sysTime=1560000000125, modelData=model_data, traceMonoTimes=trace)
+
+
+class TestLateralFeatures(unittest.TestCase):
+  def test_round_trip(self):
+    lane_row = np.arange(ROW_SIZE, dtype=np.float32)
+    dat = lateral_features.encode([lateral_features.encode_row(car_state(7, 20.)),
+                                   lateral_features.encode_row(car_state(8, 21., lane_row.tolist(), [5000000000, 5000400000, 5000500000]))])
+    rows = lateral_features.decode(dat)
+
+    self.assertEqual(len(rows), 2)
+    self.assertAlmostEqual(rows[0].vEgo, 20.)
+    self.assertEqual(rows[1].canTime, 1560000000123)
+    self.assertEqual(rows[1].camLeft.frame, 8)
+    self.assertTrue(rows[1].cruiseState.enabled)
+    self.assertFalse(np.any(rows[0].modelData))
+    np.testing.assert_array_equal(rows[1].modelData, lane_row)
+    self.assertEqual(rows[1].camRight.parm4, column('camRight', 'parm4'))
+    self.assertEqual(rows[0].traceMonoTimes, [])
+    self.assertEqual(rows[1].traceMonoTimes, [5000000000, 5000400000, 5000500000])
+
+  def test_decode_rows(self):
+    lane_row = np.arange(ROW_SIZE, dtype=np.float32)
+    dat = lateral_features.encode([lateral_features.encode_row(car_state(7, 20.)),
+                                   lateral_features.encode_row(car_state(8, 21., lane_row.tolist()))])
+    rows = lateral_features.decode_rows(dat)
+    values = rows['values']
+    columns = lateral_features.COLUMNS
+
+    self.assertEqual(values.shape, (2, lateral_features.VALUES))
+    self.assertEqual(values.dtype, np.float32)
+    np.testing.assert_array_equal(values[:, columns['vEgo']], [20., 21.])
+    np.testing.assert_array_equal(values[:, columns['camLeft.frame']], [7, 8])
+    self.assertEqual(values[1, columns['camRight.parm4']], lateral_features.decode(dat)[1].camRight.parm4)
+    np.testing.assert_array_equal(values[1, lateral_features.MODEL_DATA], lane_row)
+
+  def test_schema_mismatch(self):
+    dat = bytearray(lateral_features.encode([]))
+    dat[2] = lateral_features.SCHEMA_ID + 1
+    with self.assertRaises(ValueError):
+      lateral_features.decode(bytes(dat))
+
+
+if __name__ == "__main__":
+  unittest.main()
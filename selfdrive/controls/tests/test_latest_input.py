@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+import threading
+import unittest
+import numpy as np
+
+from selfdrive.controls.lib.latest_input import LatestInput
+
+
+class TestLatestInput(unittest.TestCase):
+  def test_newest_wins(self):
+    slot = LatestInput([(1, 2)])
+    for i in range(5):
+      slot.put([np.full((1, 2), i)], i)
+    arrays, meta = slot.get(0.)
+    self.assertEqual(meta, 4)
+    np.testing.assert_equal(arrays[0], [[4, 4]])
+    self.assertEqual(slot.dropped, 4)
+    self.assertEqual(slot.get(0.), (None, None))
+
+  def test_consumer_buffer_not_overwritten(self):
+    slot = LatestInput([(3,)])
+    slot.put([np.ones(3)], 1)
+    arrays, _ = slot.get(0.)
+    slot.put([np.full(3, 2)], 2)
+    slot.put([np.full(3, 3)], 3)
+    np.testing.assert_equal(arrays[0], [1, 1, 1])
+    self.assertEqual(slot.get(0.)[1], 3)
+
+  def test_blocking_get(self):
+    slot = LatestInput([(1,)])
+    threading.Timer(0.05, slot.put, ([np.ones(1)], 'late')).start()
+    self.assertEqual(slot.get(1.)[1], 'late')
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import selfdrive.controls.lib.live_tune as live_tune
+from selfdrive.controls.lib.live_tune import TunePublisher, LiveTune, TUNE_HEADER
+
+
+class TestLiveTune(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.path = os.path.join(self.dir, 'liveTune')
+    self.publisher = TunePublisher(self.path)
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+
+  def test_new_versions_only(self):
+    tune = LiveTune(self.path)
+    self.assertEqual(self.publisher.publish({'Kp': '0.5'}), 1)
+    self.assertEqual(tune.update(), {'Kp': '0.5'})
+    self.assertIsNone(tune.update())
+    self.publisher.publish({'Kp': '0.6'})
+    self.publisher.publish({'Kp': '0.7'})
+    self.assertEqual(tune.update(), {'Kp': '0.7'})
+    self.assertEqual(tune.version, 3)
+
+  def test_write_in_progress(self):
+    tune = LiveTune(self.path)
+    self.publisher.publish({'Kp': '0.5'})
+    TUNE_HEADER.pack_into(self.publisher.buf, 0, self.publisher.seq + 1, 0)
+    self.assertIsNone(tune.update())
+
+  def test_publisher_restart(self):
+    self.publisher.publish({'Kp': '0.5'})
+    self.assertEqual(TunePublisher(self.path).publish({'Kp': '0.6'}), 2)
+
+  def test_stopped_publisher_falls_back(self):
+    kegman_path = os.path.join(self.dir, 'kegman.json')
+    with open(kegman_path, 'w') as f:
+      f.write('{"Kp": "0.4"}')
+    conf = mock.Mock()
+    conf.conf = {'Kp': '0.4'}
+    tune = LiveTune(self.path, poll_interval=0.)
+    self.publisher.publish({'Kp': '0.5'})
+    with mock.patch.object(live_tune, 'KEGMAN_PATH', kegman_path), \
+         mock.patch.object(live_tune, 'kegman_conf', return_value=conf):
+      self.assertEqual(tune.update(), {'Kp': '0.5'})
+      with mock.patch.object(live_tune.time, 'monotonic', return_value=time.monotonic() + live_tune.TUNE_TIMEOUT):
+        self.assertEqual(tune.update(), {'Kp': '0.4'})
+        self.assertIsNone(tune.update())
+      # a restarted publisher beats again and takes over
+      self.publisher.publish({'Kp': '0.6'})
+      self.assertEqual(tune.update(), {'Kp': '0.6'})
+
+  def test_kegman_fallback_error(self):
+    kegman_path = os.path.join(self.dir, 'kegman.json')
+    with open(kegman_path, 'w') as f:
+      f.write('{"Kp": ')
+    conf = mock.Mock()
+    conf.conf = {'Kp': '0.5'}
+    tune = LiveTune(os.path.join(self.dir, 'missing'), poll_interval=0.)
+    with mock.patch.object(live_tune, 'KEGMAN_PATH', kegman_path), \
+         mock.patch.object(live_tune, 'kegman_conf', side_effect=[ValueError, conf]):
+      self.assertIsNone(tune.update())
+      self.assertIsNone(tune.conf)
+      # the same mtime is read again after a failure
+      self.assertEqual(tune.update(), {'Kp': '0.5'})
+      self.assertIsNone(tune.update())
+      os.remove(kegman_path)
+      self.assertIsNone(tune.update())
+      self.assertEqual(tune.conf, {'Kp': '0.5'})
+
+
+if __name__ == "__main__":
+  unittest.main()
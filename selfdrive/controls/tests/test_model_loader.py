@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import tempfile
+import unittest
+
+from selfdrive.controls.lib.model_loader import variant_path, select_variant, write_benchmark, read_benchmarks
+
+
+class TestModelLoader(unittest.TestCase):
+  def setUp(self):
+    self.model_dir = tempfile.mkdtemp()
+    self.cache = os.path.join(self.model_dir, 'benchmark.json')
+    for variant in ['fp32', 'int8']:
+      open(variant_path('model.onnx', variant, self.model_dir), 'w').close()
+
+  def tearDown(self):
+    shutil.rmtree(self.model_dir)
+
+  def test_variant_path(self):
+    self.assertEqual(variant_path('model.onnx', 'fp32', 'models'), 'models/model.onnx')
+    self.assertEqual(variant_path('model.onnx', 'int8', 'models'), 'models/model.int8.onnx')
+
+  def test_fastest_existing_variant(self):
+    write_benchmark('model.onnx', 'fp32', 20., self.cache, device='pi')
+    write_benchmark('model.onnx', 'int8', 8., self.cache, device='pi')
+    # opt is fastest but was never exported into this directory
+    write_benchmark('model.onnx', 'opt', 5., self.cache, device='pi')
+    benchmarks = read_benchmarks(self.cache)
+    self.assertEqual(select_variant('model.onnx', benchmarks, self.model_dir, device='pi'), 'int8')
+
+  def test_unknown_device_uses_fp32(self):
+    write_benchmark('model.onnx', 'int8', 8., self.cache, device='pi')
+    benchmarks = read_benchmarks(self.cache)
+    self.assertEqual(select_variant('model.onnx', benchmarks, self.model_dir, device='x86'), 'fp32')
+    self.assertEqual(select_variant('model.onnx', {}, self.model_dir), 'fp32')
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -4,7 +4,9 @@ import zmq
 import time
 import json
 import gc
+import threading
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 INPUTS = 79
 OUTPUTS = 9
@@ -13,26 +15,26 @@ MODEL_NAME = ''
 
 from selfdrive.kegman_conf import kegman_conf
 from selfdrive.services import service_list
+import selfdrive.messaging as messaging
 from selfdrive.car.honda.values import CAR
+from selfdrive.car.honda.lanecam import column as lane_column
 from enum import Enum
 from cereal import log, car
 from setproctitle import setproctitle
 from common.params import Params, put_nonblocking
-from common.profiler import Profiler
-import onnxruntime as ort
+from common.profiler import Profiler, install_toggle
+from selfdrive.controls.lib.input_history import InputHistory
+from selfdrive.controls.lib.latest_input import LatestInput
+from selfdrive.controls.lib import lateral_features
+from selfdrive.controls.lib.live_tune import LiveTune
+from selfdrive.controls.lib.latency_trace import mono_time, CARSTATE_POINTS
+from selfdrive.controls.lib.model_loader import MODEL_LIST, HISTORY_ROWS, model_names, model_inputs, variant_path, select_variant, read_benchmarks, cached_session, output_width
 
 setproctitle('transcoderd')
 
-options = ort.SessionOptions()
-options.intra_op_num_threads = 1
-options.inter_op_num_threads = 1
-#options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
-options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
-options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
-provider = 'CPUExecutionProvider'
-
 params = Params()
 profiler = Profiler(False, 'transcoder')
+install_toggle()
 
 BIT_MASK = [0, 0, 
             1, 128, 64, 32, 8, 4, 2, 8, 
@@ -40,29 +42,41 @@ BIT_MASK = [0, 0,
             1, 128, 64, 32, 8, 4, 2, 8, 
             1, 128, 64, 32, 8, 4, 2, 8] 
 
-history_rows = [2,5]
+# columns of CarState.modelData feeding each camera input, the camera1 slots of missing lanes
+# read parm4 and leading slots are masked out by BIT_MASK anyway
+CAMERA1_COLUMNS = np.array([lane_column('camLeft', 'parm4')] * 2 + [lane_column(lane, field) for lane in ['camLeft', 'camFarLeft', 'camRight', 'camFarRight']
+                                                                  for field in ['parm4'] + ['parm6'] * 6 + ['parm8']])
+CAMERA1_MISSING = np.array([2, 10, 18, 26])
+CAMERA2_COLUMNS = np.array([lane_column(lane, field) for lane in ['camFarLeft', 'camFarRight', 'camLeft', 'camRight']
+                            for field in ['parm10', 'parm2', 'parm1', 'parm3', 'parm4', 'parm5', 'parm7', 'parm9']])
+
+history_rows = HISTORY_ROWS
 OUTPUT_ROWS = 15
+VEHICLE_ROWS = round(history_rows[-1]*6.6666667+7)
+CAMERA_ROWS = 6
 
 lo_res_data = np.zeros((2,1, 5, INPUTS-7), dtype='float32')
 hi_res_data = np.zeros((2,1, 50, 13), dtype='float32')
 fingerprint = np.zeros((1, 4), dtype='float32')
-
-if os.path.exists('models/models.json'):
-  with open('models/models.json', 'r') as f:
-    models = []
-    for md in json.load(f)['models']:
-      models.append(ort.InferenceSession(os.path.expanduser('models/%s' % md), options))
-      models[-1].set_providers([provider], None)
-      start_time = time.time()
-      for i in range(20):
-        model_output = models[-1].run(None, {'prod_vehicle1_0:0': hi_res_data[0,:,-round(min(26, history_rows[len(models)-1]*6.6666667)):,:7], 
-                                            'prod_vehicle2_0:0': lo_res_data[0,:,-history_rows[len(models)-1]:,:6],
-                                            'prod_camera1_0:0': lo_res_data[0,:,-history_rows[len(models)-1]:,6:-32],
-                                            'prod_camera2_0:0': lo_res_data[0,:,-history_rows[len(models)-1]:,-32:],
-                                            'fingerprints0:0': [[1,0,0,0]]
-                                          })
-      print(model_output)
-      print(time.time()-start_time, md)
+fingerprint_warmup = np.array([[1,0,0,0]], dtype='float32')
+
+def warmup_models(runs=20):
+  start_time = time.time()
+  for i in range(len(models)):
+    for _ in range(runs):
+      model_output = models[i].run(None, model_inputs(history_rows[i], hi_res_data[0,:,:,:7], lo_res_data[0,:,:,:6], lo_res_data[0,:,:,6:-32], lo_res_data[0,:,:,-32:], fingerprint_warmup))
+  print("model warmup: %0.2fs" % (time.time() - start_time))
+  return model_output
+
+if os.path.exists(MODEL_LIST):
+  benchmarks = read_benchmarks()
+  models = []
+  # single intra-op thread sessions, the optimized graphs are cached per model hash and onnxruntime version
+  for md in model_names():
+    start_time = time.time()
+    variant = select_variant(md, benchmarks)
+    models.append(cached_session(variant_path(md, variant)))
+    print(time.time()-start_time, md, variant)
 
 def dump_sock(sock, wait_for_one=False):
   if wait_for_one:
@@ -110,6 +124,18 @@ def tri_blend(l_prob, r_prob, tri_value, minimize=False, minimize2=False):
     centers = [0.5 * left + 0.5 * right, tri_value[:,1:2], tri_value[:,2:3]]
   return centers
 
+def model_feed(index):
+  return model_inputs(history_rows[index], vehicle_input[0], vehicle_input[1], camera_input[0], camera_input[1], fingerprint)
+
+def predict(index):
+  return np.array(models[index].run(None, model_feed(index))[0])
+
+def send_plan(path_send, cs, trace_times):
+  # only the plans of traced carStates carry the transcoderd stamps
+  if len(cs.traceMonoTimes) == CARSTATE_POINTS:
+    path_send.pathPlan.traceMonoTimes = list(cs.traceMonoTimes) + trace_times + [mono_time()]
+  gernPath.send(path_send.to_bytes())
+
 def update_calibration(calibration, inputs, cal_col, cs):
   cal_speed = cs.vEgo * 0.00001
   far_left_factor = min(cal_speed, cs.camFarLeft.parm4)
@@ -120,13 +146,22 @@ def update_calibration(calibration, inputs, cal_col, cs):
   cal_factor[1][(cal_col[1] == 1)] = [cal_speed,cal_speed,cal_speed]
   cal_factor[3][(cal_col[3] == 1)] = [far_left_factor,far_left_factor,far_left_factor,far_right_factor,far_right_factor,far_right_factor,left_factor,left_factor,left_factor,right_factor,right_factor,right_factor]
   for i in [0,1]:
-    calibration[i] += (cal_factor[i][(cal_col[i] == 1)] * (inputs[0][i][-1][-1][-1][(cal_col[i] == 1)] - calibration[i]))
+    calibration[i] += (cal_factor[i][(cal_col[i] == 1)] * (inputs[0][i][-1][-1][(cal_col[i] == 1)] - calibration[i]))
   for i in [3]:
-    calibration[i] += (cal_factor[i][(cal_col[i] == 1)] * (inputs[1][i-2][-1][-1][-1][(cal_col[i] == 1)] - calibration[i]))
+    calibration[i] += (cal_factor[i][(cal_col[i] == 1)] * (inputs[1][i-2][-1][-1][(cal_col[i] == 1)] - calibration[i]))
   return cal_factor
 
 gernPath = pub_sock(service_list['pathPlan'].port)
-carState = sub_sock(service_list['carState'].port, conflate=False)
+kegman = kegman_conf()
+use_features = kegman.conf['lateralFeatures'] == '1'
+use_shm = not use_features and kegman.conf['carStateShm'] == '1'
+if use_features:
+  carState = sub_sock(service_list['lateralFeatures'].port, conflate=False)
+elif use_shm:
+  # carStates are read in place from the ring, each batch is consumed before the next recv
+  carState = messaging.ShmSubSock('carState', copy=False)
+else:
+  carState = sub_sock(service_list['carState'].port, conflate=False)
 
 frame_count = 1
 dashboard_count = 0
@@ -164,6 +199,15 @@ angle_limit = 0.0
 next_params_distance = 133000.0
 distance_driven = 0.0
 steer_override_timer = 0
+batch_models = True
+# calibrated model windows are saved here for verifying exported model variants offline
+record_path = os.environ.get('RECORD_MODEL_INPUTS')
+# lockstep_replay.py sends the next camera frame once the plan of the last one arrived, in lockstep
+# the plan is sent after the whole iteration so the next frame never sees half updated state
+lockstep = os.environ.get('LOCKSTEP_REPLAY') is not None
+recorded_inputs = [[], [], [], []]
+# runs the second model beside the first, each session keeps its single intra-op thread
+model_pool = ThreadPoolExecutor(max_workers=1)
 
 #model_output = None
 start_time = 0
@@ -198,7 +242,8 @@ l_prob = 0.0
 r_prob = 0.0
 lateral_adjust = 0
 frame = 0
-dump_sock(carState, True)
+if not lockstep:
+  dump_sock(carState, True)
 
 calibration_items = [['angle_steers','lateral_accelleration','yaw_rate_can'],['angle_steers2','lateral_accelleration2','yaw_rate_can2'],[],['far_left_1','far_left_7','far_left_9','far_right_1','far_right_7','far_right_9','left_1','left_7','left_9','right_1','right_7','right_9']]
 all_items = [['v_ego','angle_steers','lateral_accelleration','angle_rate', 'angle_rate_eps', 'yaw_rate_can','steering_torque'],['v_ego','long_accel', 'lane_width','angle_steers2','lateral_accelleration2','yaw_rate_can2'],
@@ -224,8 +269,16 @@ adj_col = np.zeros((len(adj_items)),dtype=np.int)
 for col in range(len(adj_items)):
   adj_col[col] = all_items[3].index(adj_items[col])
 
-kegtime_prev = 0
-angle_speed_count = model_output[0].shape[2] - 7
+live_tune = LiveTune()
+model_width = output_width(models[-1])
+if model_width is None:
+  model_width = warmup_models(1)[0].shape[2]
+angle_speed_count = model_width - 7
+if kegman.conf['modelWarmup'] == '1':
+  # warm the sessions up while waiting for controlsd instead of delaying the first subscription
+  warmup_thread = threading.Thread(target=warmup_models, name='transcoder_warmup')
+  warmup_thread.daemon = True
+  warmup_thread.start()
 model_bias = [np.zeros((OUTPUT_ROWS), 'float32'), np.zeros((OUTPUT_ROWS), 'float32')]
 center_bias = [np.zeros((OUTPUT_ROWS), 'float32'), np.zeros((OUTPUT_ROWS), 'float32')]
   
@@ -255,8 +308,14 @@ print(calibration)
 
 stock_cam_frame_prev = -1
 combine_flags = 0
-vehicle_array = [[],[]]
-camera_array = [[],[]]
+
+# vehicle columns 2:7 and 4:6 lag the rest of the row by 6 and 1 samples respectively
+vehicle_history = [InputHistory(VEHICLE_ROWS, len(all_items[0]), delay=6, delay_cols=slice(2,7)), InputHistory(CAMERA_ROWS, len(all_items[1]), delay=1, delay_cols=slice(4,6))]
+camera_history = [InputHistory(CAMERA_ROWS, len(all_items[2])), InputHistory(CAMERA_ROWS, len(all_items[3]))]
+vehicle_input = [np.zeros((1, VEHICLE_ROWS, len(all_items[0])), dtype='float32'), np.zeros((1, CAMERA_ROWS, len(all_items[1])), dtype='float32')]
+camera_input = [camera_history[0].window(), np.zeros((1, CAMERA_ROWS, len(all_items[3])), dtype='float32')]
+cal_mask = [cal_col[0] == 1, cal_col[1] == 1, [], cal_col[3] == 1]
+cal_offset = [np.zeros((len(all_items[0])), dtype='float32'), np.zeros((len(all_items[1])), dtype='float32'), [], np.zeros((len(all_items[3])), dtype='float32')]
 first_model = 0
 last_model = len(models)-1
 model_factor = 0.5
@@ -273,231 +332,282 @@ fast_angles = [np.array([[0],[0]], dtype='float32'),np.array([[0],[0]], dtype='f
 rate_matrix = np.ones((12,1), dtype='float32')
 rate_adjustment = 1.0
 
-while 1:
-  for _cs in carState.recv_multipart():
-    start_time = time.time() * 1000
-    profiler.checkpoint('inputs_recv', False)
-
-    cs = log.Event.from_bytes(_cs).carState
-    vehicle_array[0].append([max(10, cs.vEgo), max(-30, min(30, steer_factor * cs.steeringAngle / angle_factor)), lateral_factor * cs.lateralAccel, 
-                            max(-40, min(40, steer_factor * cs.steeringRate / angle_factor)), max(-40, min(40, cs.steeringTorqueEps)), 
-                            yaw_factor * cs.yawRateCAN, cs.steeringTorque])
-
-    profiler.checkpoint('process_inputs1')
+def recv_states():
+  packed = getattr(carState, 'packed', False)
+  return [messaging.event_from_bytes(dat, packed).carState for dat in carState.recv_multipart()]
+
+def recv_feature_rows():
+  return np.concatenate([lateral_features.decode_rows(dat) for dat in carState.recv_multipart()])
+
+def append_feature_rows(rows):
+  # the same history rows as append_states, built from whole columns of the batch
+  global stock_cam_frame_prev
+  values = rows['values']
+  def col(name):
+    return values[:, lateral_features.COLUMNS[name]]
+  v_ego = np.maximum(10, col('vEgo'))
+  steer_angle = np.clip(steer_factor * col('steeringAngle') / angle_factor, -30, 30)
+  lateral_accel = lateral_factor * col('lateralAccel')
+  yaw_rate = yaw_factor * col('yawRateCAN')
+  vehicle_history[0].extend(np.column_stack((v_ego, steer_angle, lateral_accel, np.clip(steer_factor * col('steeringRate') / angle_factor, -40, 40),
+                                             np.clip(col('steeringTorqueEps'), -40, 40), yaw_rate, col('steeringTorque'))))
+
+  # the frame held since the last match is the one compared with, so a row starts a camera frame
+  # when it matches and its frame differs from the previous matching row
+  cam_left = col('camLeft.frame')
+  matching = np.nonzero(cam_left == col('camFarRight.frame'))[0]
+  if len(matching) == 0:
+    return
+  frames = cam_left[matching]
+  cam_rows = matching[frames != np.concatenate(([stock_cam_frame_prev], frames[:-1]))]
+  stock_cam_frame_prev = frames[-1]
+  if len(cam_rows) == 0:
+    return
+
+  vehicle_history[1].extend(np.column_stack((v_ego[cam_rows], col('longAccel')[cam_rows], np.full(len(cam_rows), width_factor * max(570, lane_width + width_trim)),
+                                             steer_angle[cam_rows], lateral_accel[cam_rows], yaw_rate[cam_rows])))
+  lane_rows = values[cam_rows, lateral_features.MODEL_DATA]
+  lane_bits = lane_rows[:, CAMERA1_COLUMNS].astype(np.int32)
+  lane_bits[:, CAMERA1_MISSING] = lane_bits[:, CAMERA1_MISSING] == 0
+  camera_history[0].extend(np.clip(np.bitwise_and(lane_bits, BIT_MASK), -1, 1))
+  camera_history[1].extend(lane_rows[:, CAMERA2_COLUMNS])
+
+def append_states(states):
+  global stock_cam_frame_prev
+  for cs in states:
+    vehicle_history[0].append((max(10, cs.vEgo), max(-30, min(30, steer_factor * cs.steeringAngle / angle_factor)), lateral_factor * cs.lateralAccel, 
+                               max(-40, min(40, steer_factor * cs.steeringRate / angle_factor)), max(-40, min(40, cs.steeringTorqueEps)), 
+                               yaw_factor * cs.yawRateCAN, cs.steeringTorque))
 
     if cs.camLeft.frame != stock_cam_frame_prev and cs.camLeft.frame == cs.camFarRight.frame:
       stock_cam_frame_prev = cs.camLeft.frame
 
-      left_missing = 1 if cs.camLeft.parm4 == 0 else 0
-      far_left_missing = 1 if cs.camFarLeft.parm4 == 0 else 0
-      right_missing = 1 if cs.camRight.parm4 == 0 else 0
-      far_right_missing = 1 if cs.camFarRight.parm4 == 0 else 0
-      
-      vehicle_array[1].append([max(10, cs.vEgo), cs.longAccel,  width_factor * max(570, lane_width + width_trim), max(-30, min(30, steer_factor * cs.steeringAngle / angle_factor)), lateral_factor * cs.lateralAccel, yaw_factor * cs.yawRateCAN])
+      lane_row = np.array(cs.modelData, dtype=np.float32)
+      vehicle_history[1].append((max(10, cs.vEgo), cs.longAccel,  width_factor * max(570, lane_width + width_trim), max(-30, min(30, steer_factor * cs.steeringAngle / angle_factor)), lateral_factor * cs.lateralAccel, yaw_factor * cs.yawRateCAN))
+
+      lane_bits = lane_row[CAMERA1_COLUMNS].astype(np.int32)
+      lane_bits[CAMERA1_MISSING] = lane_bits[CAMERA1_MISSING] == 0
+      camera_history[0].append(np.clip(np.bitwise_and(lane_bits, BIT_MASK), -1, 1))
+      camera_history[1].append(lane_row[CAMERA2_COLUMNS])
 
-      camera_array[0].append(np.clip(np.bitwise_and([0, 0, left_missing,          cs.camLeft.parm6,     cs.camLeft.parm6,     cs.camLeft.parm6,     cs.camLeft.parm6,     cs.camLeft.parm6,     cs.camLeft.parm6,     cs.camLeft.parm8, 
-                                                           far_left_missing,      cs.camFarLeft.parm6,  cs.camFarLeft.parm6,  cs.camFarLeft.parm6,  cs.camFarLeft.parm6,  cs.camFarLeft.parm6,  cs.camFarLeft.parm6,  cs.camFarLeft.parm8, 
-                                                           right_missing,         cs.camRight.parm6,    cs.camRight.parm6,    cs.camRight.parm6,    cs.camRight.parm6,    cs.camRight.parm6,    cs.camRight.parm6,    cs.camRight.parm8, 
-                                                           far_right_missing,     cs.camFarRight.parm6, cs.camFarRight.parm6, cs.camFarRight.parm6, cs.camFarRight.parm6, cs.camFarRight.parm6, cs.camFarRight.parm6, cs.camFarRight.parm8], BIT_MASK), -1, 1))
+def assemble_inputs():
+  # feature assembly keeps up with every carState while the main thread is inside the models,
+  # only the newest complete window of each received batch is handed over for inference
+  while 1:
+    if use_features:
+      rows = recv_feature_rows()
+      recv_mono = mono_time()
+      append_feature_rows(rows)
+      count = len(rows)
+    else:
+      states = recv_states()
+      recv_mono = mono_time()
+      append_states(states)
+      count = len(states)
+
+    # a batch without rows would hand over the previous window again
+    if count > 0 and vehicle_history[0].full:
+      if use_features:
+        latest_cs = lateral_features.LateralFeatures(rows[-1])
+      elif use_shm:
+        # the main thread may use its carState after the ring wrapped, it gets a copy
+        latest_cs = states[-1].as_builder()
+      else:
+        latest_cs = states[-1]
+      latest_input.put([vehicle_history[0].window(), vehicle_history[1].window(), camera_history[0].window(), camera_history[1].window()], (latest_cs, time.time() * 1000, recv_mono))
 
-      camera_array[1].append([cs.camFarLeft.parm10,  cs.camFarLeft.parm2,  cs.camFarLeft.parm1,  cs.camFarLeft.parm3,  cs.camFarLeft.parm4,  cs.camFarLeft.parm5,  cs.camFarLeft.parm7,  cs.camFarLeft.parm9, 
-                              cs.camFarRight.parm10, cs.camFarRight.parm2, cs.camFarRight.parm1, cs.camFarRight.parm3, cs.camFarRight.parm4, cs.camFarRight.parm5, cs.camFarRight.parm7, cs.camFarRight.parm9,
-                              cs.camLeft.parm10,     cs.camLeft.parm2,     cs.camLeft.parm1,     cs.camLeft.parm3,     cs.camLeft.parm4,     cs.camLeft.parm5,     cs.camLeft.parm7,     cs.camLeft.parm9,    
-                              cs.camRight.parm10,    cs.camRight.parm2,    cs.camRight.parm1,    cs.camRight.parm3,    cs.camRight.parm4,    cs.camRight.parm5,    cs.camRight.parm7,    cs.camRight.parm9])
+latest_input = LatestInput([vehicle_input[0].shape, vehicle_input[1].shape, camera_input[0].shape, camera_input[1].shape])
+input_thread = threading.Thread(target=assemble_inputs, name='transcoder_inputs')
+input_thread.daemon = True
+input_thread.start()
 
-      profiler.checkpoint('process_inputs2')
+while 1:
+  inputs, (cs, recv_time, recv_mono) = latest_input.get()
+  start_time = time.time() * 1000
+  profiler.checkpoint('inputs_recv', False)
 
   l_prob =     min(1, max(0, cs.camLeft.parm4 / 127))
   r_prob =     min(1, max(0, cs.camRight.parm4 / 127))
   lr_prob =    (l_prob + r_prob) - l_prob * r_prob
 
-  if len(vehicle_array[0]) >= round(history_rows[-1]*6.6666667+7): # and start_time - cs.sysTime < 30:
-
-    vehicle_array[0] = vehicle_array[0][-round(history_rows[-1]*6.66666667+7):]
-    vehicle_array[1] = vehicle_array[1][-6:]
-    vehicle_input = [np.array([[vehicle_array[0]]], dtype='float32'), np.array([[vehicle_array[1]]], dtype='float32')]
-    vehicle_input[0][:,:,6:,2:7] = vehicle_input[0][:,:,:-6,2:7]
-    vehicle_input[1][:,:,1:,4:6] = vehicle_input[1][:,:,:-1,4:6]
-
-    camera_array[0] = camera_array[0][-6:]
-    camera_array[1] = camera_array[1][-6:]
-    camera_input = [np.array([[camera_array[0]]], dtype='float32'), np.array([[camera_array[1]]], dtype='float32')]
-
-    profiler.checkpoint('process_inputs1')
-
-    vehicle_input[0][:,:,:,(cal_col[0] == 1)] -= calibration[0]
-    vehicle_input[1][:,:,:,(cal_col[1] == 1)] -= calibration[1]
-    camera_input[1][:,:,:,(cal_col[3] == 1)] -= calibration[3]
-
-    profiler.checkpoint('calibrate')
-    
-    model_output = np.array(models[model_index].run(None, dict({'prod_vehicle1_0:0': vehicle_input[0][0,:, -round(min(26,history_rows[model_index]*6.6666667)):], 
-                                                       'prod_vehicle2_0:0': vehicle_input[1][0,:, -history_rows[model_index]:],
-                                                       'prod_camera1_0:0': camera_input[0][0,:, -history_rows[model_index]:],
-                                                       'prod_camera2_0:0': camera_input[1][0,:, -history_rows[model_index]:],
-                                                       'fingerprints0:0': fingerprint, 
-                                                      }))[0])
-    profiler.checkpoint('predict')
-
-    if use_discrete_angle:
-      fast_angles[model_index] = angle_factor * model_output[0,:,:angle_speed_count] + calibration[0][0]
-      '''if angle_limit < 1: 
-        relative_angles = angle_factor * advanceSteer * (model_output[:,-1,:,:angle_speed_count] - model_output[:,-1,0,:angle_speed_count]) + cs.steeringAngle
-        fast_angles[model_index] = np.clip(fast_angles[model_index], relative_angles - angle_limit, relative_angles + angle_limit)'''
-    else:
-      fast_angles[model_index] = angle_factor * advanceSteer * (model_output[0,:,:angle_speed_count] - model_output[0,0,:angle_speed_count]) + cs.steeringAngle
-      '''if angle_limit < 1 or abs(cs.steeringAngle) > 30: 
-        discrete_angles = angle_factor * model_output[:,-1,:,:angle_speed_count] + calibration[0][0]
-        fast_angles = np.clip(fast_angles[model_index], discrete_angles - angle_limit, discrete_angles + angle_limit)'''
-
-    fast_angles[model_index] = np.transpose(fast_angles[model_index]) - model_bias[model_index]
-    calc_center[model_index] = np.array(tri_blend(l_prob, r_prob, model_output[0,:,angle_speed_count::3], minimize=use_minimize)) - center_bias[model_index]
-    angle_plan = np.clip(fast_angles[model_index], angle_plan - accel_limit, angle_plan + accel_limit)
-    use_center = calc_center[model_index][0,:,0]
-    
-    future_steering = cs.steeringAngle + cs.steeringRate * projected_rate
-    angle_plan = np.clip(angle_plan, future_steering - accel_limit, future_steering + accel_limit)
-
-    profiler.checkpoint('process')
-
-    path_send.pathPlan.centerCompensation = 0
-    path_send.pathPlan.angleSteers = float(angle_plan[0][5])
-    path_send.pathPlan.fastAngles = [[float(x) + angle_bias for x in y] for y in angle_plan]
-    path_send.pathPlan.laneWidth = float(lane_width + width_trim)
-    path_send.pathPlan.angleOffset = float(calibration[0][0])
-    path_send.pathPlan.angleBias = angle_bias
-    path_send.pathPlan.modelIndex = model_index
-    path_send.pathPlan.paramsValid = calibrated
-    path_send.pathPlan.cPoly = [float(x) for x in use_center]
-    path_send.pathPlan.lPoly = [float(x) for x in (calc_center[model_index][1,:,0] + 0.5 * lane_width)]
-    path_send.pathPlan.rPoly = [float(x) for x in (calc_center[model_index][2,:,0] - 0.5 * lane_width)]
-    path_send.pathPlan.lProb = float(l_prob)
-    path_send.pathPlan.rProb = float(r_prob)
-    path_send.pathPlan.cProb = float(lr_prob)
-    path_send.pathPlan.canTime = cs.canTime
-    path_send.pathPlan.sysTime = cs.sysTime
-    gernPath.send(path_send.to_bytes())
-
-    profiler.checkpoint('send')
-    other_model_index = min(len(models), abs(model_index - 1))
-
-    if len(models) > 1 or True:
-      time.sleep(0.03)
-      if (other_model_index == 1 and lr_prob > 0):
-
-        model_output = np.array(models[other_model_index].run(None, dict({'prod_vehicle1_0:0': vehicle_input[0][0,:, -round(min(26,history_rows[other_model_index]*6.6666667)):], 
-                                                                    'prod_vehicle2_0:0': vehicle_input[1][0,:, -history_rows[other_model_index]:],
-                                                                    'prod_camera1_0:0': camera_input[0][0,:, -history_rows[other_model_index]:],
-                                                                    'prod_camera2_0:0': camera_input[1][0,:, -history_rows[other_model_index]:],
-                                                                    'fingerprints0:0': fingerprint, 
-                                                                  }))[0])
-        profiler.checkpoint('predict')
-
-        calc_center[other_model_index] = np.array(tri_blend(l_prob, r_prob, model_output[0,:,angle_speed_count::3], minimize=use_minimize))
-
-        if use_discrete_angle:
-          fast_angles[other_model_index] = angle_factor * model_output[0,:,:angle_speed_count] + calibration[0][0]
-          '''if angle_limit < 1: 
-            relative_angles = angle_factor * advanceSteer * (model_output[:,-1,:,:angle_speed_count] - model_output[:,-1,0,:angle_speed_count]) + cs.steeringAngle
-            fast_angles = np.clip(fast_angles[other_model_index], relative_angles - angle_limit, relative_angles + angle_limit)'''
-        else:
-          fast_angles[other_model_index] = angle_factor * advanceSteer * (model_output[0,:,:angle_speed_count] - model_output[0,0,:angle_speed_count]) + cs.steeringAngle
-          '''if angle_limit < 1 or abs(cs.steeringAngle) > 30: 
-            discrete_angles = angle_factor * model_output[:,-1,:,:angle_speed_count] + calibration[0][0]
-            fast_angles = np.clip(fast_angles[other_model_index], discrete_angles - angle_limit, discrete_angles + angle_limit)'''
-        fast_angles[other_model_index] = np.transpose(fast_angles[other_model_index])
-
-      if (lr_prob > 0 or model_index == 1) and fast_angles[0].shape == fast_angles[1].shape:
-        if (abs(fast_angles[0][10,6]) < abs(fast_angles[1][10,6]) or model_index == 1) and int(abs(fast_angles[1][10,8]) * model_factor) > 0 and calibrated:
-          model_index = 1
-        else:
-          model_index = 0
-      elif fast_angles[0].shape != fast_angles[1].shape:
-        fast_angles[1] = fast_angles[0]
-
-    max_width_step = 0.05 * cs.vEgo * l_prob * r_prob
-    lane_width = max(570, lane_width - max_width_step * 2, min(1700, lane_width + max_width_step, cs.camLeft.parm2 - cs.camRight.parm2))
-
-    steer_override_timer -= 1
-    if model_index == 0 and other_model_index == 1 and steer_override_timer < 0 and abs(cs.steeringRate) < 3 and abs(cs.steeringAngle - calibration[0][0]) < 3 and cs.torqueRequest != 0 and l_prob > 0 and r_prob > 0 and cs.vEgo > 10 and (abs(cs.steeringTorque) < 300 or ((cs.steeringTorque < 0) == (calc_center[0][0][3,0] < 0))):
-      if use_center[0] > 0:
-        angle_bias += (0.00001 * cs.vEgo)
-      elif use_center[0] < 0:
-        angle_bias -= (0.00001 * cs.vEgo)
-
-      if len(models) > 1:
-        model_bias[0] += (0.000001 * cs.vEgo * lr_prob * fast_angles[0][10,:])
-        model_bias[1] += (0.000001 * cs.vEgo * lr_prob * fast_angles[1][10,:])
-        center_bias[0] += (0.000001 * cs.vEgo * lr_prob * (calc_center[0][0,:,0] - use_center[0]))
-        center_bias[1] += (0.000001 * cs.vEgo * lr_prob * (calc_center[1][0,:,0] - use_center[0]))
-
-      if calc_center[0][1,0,0] > calc_center[0][2,0,0]:	
-        width_trim += 0.5	
-      else:	
-        width_trim -= 1	
-      width_trim = min(100, max(-200, min(width_trim, 0)))
-
-      profiler.checkpoint('bias')
-      
-    elif model_index == 0 and abs(cs.steeringTorque) > 300 and (cs.steeringTorque < 0) != calc_center[0][0,3,0] < 0:
-      # Prevent angle_bias adjustment for 3 seconds after driver opposes the model
-      steer_override_timer = 45
-
-    frame += 1
-    distance_driven += cs.vEgo 
-
-    if cs.vEgo > 10 and abs(cs.steeringAngle - calibration[0][0]) <= 3 and abs(cs.steeringRate) < 3 and l_prob > 0 and r_prob > 0:
-      cal_factor = update_calibration(calibration, [vehicle_input, camera_input], cal_col, cs)
-      profiler.checkpoint('calibrate')
-
-    if frame % 60 == 0:
-      print('lane_width: %0.1f angle bias: %0.2f  distance_driven:  %0.2f   center: %0.1f  l_prob:  %0.2f  r_prob:  %0.2f  l_offset:  %0.2f  r_offset:  %0.2f  model time:  %0.4fs  adj_speed:  %0.1f' % (lane_width, angle_bias, distance_driven, calc_center[0][0,0,-1], l_prob, r_prob, cs.camLeft.parm2, cs.camRight.parm2, 0.001 * execution_time_avg, max(10, rate_adjustment * cs.vEgo)))
-
-    if ((cs.vEgo < 10 and not cs.cruiseState.enabled) or not calibrated) and distance_driven > next_params_distance:
-      next_params_distance = distance_driven + 133000
-      if calibrated:
-        print(np.round(calibration[0],2))
-        put_nonblocking("CalibrationParams", json.dumps({'calibration': list(np.concatenate(([float(x) for x in calibration[0]],[float(x) for x in calibration[1]],[float(x) for x in calibration[2]],[float(x) for x in calibration[3]]), axis=0)),'lane_width': float(lane_width),'angle_bias': float(angle_bias), 'center_bias': list([float(x) for x in np.concatenate((center_bias))]), 'model_bias': list([float(x) for x in np.concatenate((model_bias))])}))
+  # calibrate into preallocated inputs, the uncalibrated camera window is passed as is
+  for i in [0,1,3]:
+    cal_offset[i][cal_mask[i]] = calibration[i]
+  np.subtract(inputs[0], cal_offset[0], out=vehicle_input[0])
+  np.subtract(inputs[1], cal_offset[1], out=vehicle_input[1])
+  np.subtract(inputs[3], cal_offset[3], out=camera_input[1])
+  camera_input[0] = inputs[2]
+
+  if record_path is not None and frame % 15 == 0 and len(recorded_inputs[0]) < 2000:
+    for recorded, model_input in zip(recorded_inputs, [vehicle_input[0], vehicle_input[1], camera_input[0], camera_input[1]]):
+      recorded.append(model_input[0].copy())
+    if len(recorded_inputs[0]) % 100 == 0:
+      np.savez_compressed(record_path, vehicle1=recorded_inputs[0], vehicle2=recorded_inputs[1], camera1=recorded_inputs[2], camera2=recorded_inputs[3], fingerprint=fingerprint)
+
+  profiler.checkpoint('calibrate')
+
+  other_model_index = min(len(models), abs(model_index - 1))
+  run_other_model = other_model_index == 1 and lr_prob > 0
+  if run_other_model and batch_models:
+    other_output = model_pool.submit(predict, other_model_index)
+
+  inference_start = mono_time()
+  model_output = predict(model_index)
+  trace_times = [recv_mono, inference_start, mono_time()]
+  profiler.checkpoint('predict')
+
+  if use_discrete_angle:
+    fast_angles[model_index] = angle_factor * model_output[0,:,:angle_speed_count] + calibration[0][0]
+    '''if angle_limit < 1: 
+      relative_angles = angle_factor * advanceSteer * (model_output[:,-1,:,:angle_speed_count] - model_output[:,-1,0,:angle_speed_count]) + cs.steeringAngle
+      fast_angles[model_index] = np.clip(fast_angles[model_index], relative_angles - angle_limit, relative_angles + angle_limit)'''
+  else:
+    fast_angles[model_index] = angle_factor * advanceSteer * (model_output[0,:,:angle_speed_count] - model_output[0,0,:angle_speed_count]) + cs.steeringAngle
+    '''if angle_limit < 1 or abs(cs.steeringAngle) > 30: 
+      discrete_angles = angle_factor * model_output[:,-1,:,:angle_speed_count] + calibration[0][0]
+      fast_angles = np.clip(fast_angles[model_index], discrete_angles - angle_limit, discrete_angles + angle_limit)'''
+
+  fast_angles[model_index] = np.transpose(fast_angles[model_index]) - model_bias[model_index]
+  calc_center[model_index] = np.array(tri_blend(l_prob, r_prob, model_output[0,:,angle_speed_count::3], minimize=use_minimize)) - center_bias[model_index]
+  angle_plan = np.clip(fast_angles[model_index], angle_plan - accel_limit, angle_plan + accel_limit)
+  use_center = calc_center[model_index][0,:,0]
+  
+  future_steering = cs.steeringAngle + cs.steeringRate * projected_rate
+  angle_plan = np.clip(angle_plan, future_steering - accel_limit, future_steering + accel_limit)
+
+  profiler.checkpoint('process')
+
+  path_send.pathPlan.centerCompensation = 0
+  path_send.pathPlan.angleSteers = float(angle_plan[0][5])
+  path_send.pathPlan.fastAngles = [[float(x) + angle_bias for x in y] for y in angle_plan]
+  path_send.pathPlan.laneWidth = float(lane_width + width_trim)
+  path_send.pathPlan.angleOffset = float(calibration[0][0])
+  path_send.pathPlan.angleBias = angle_bias
+  path_send.pathPlan.modelIndex = model_index
+  path_send.pathPlan.paramsValid = calibrated
+  path_send.pathPlan.cPoly = [float(x) for x in use_center]
+  path_send.pathPlan.lPoly = [float(x) for x in (calc_center[model_index][1,:,0] + 0.5 * lane_width)]
+  path_send.pathPlan.rPoly = [float(x) for x in (calc_center[model_index][2,:,0] - 0.5 * lane_width)]
+  path_send.pathPlan.lProb = float(l_prob)
+  path_send.pathPlan.rProb = float(r_prob)
+  path_send.pathPlan.cProb = float(lr_prob)
+  path_send.pathPlan.canTime = cs.canTime
+  path_send.pathPlan.sysTime = cs.sysTime
+  if not lockstep:
+    send_plan(path_send, cs, trace_times)
+
+  profiler.checkpoint('send')
+
+  if len(models) > 1 or True:
+    if run_other_model:
+      # both predictions come from the same inputs, so the model switch below never compares stale outputs
+      model_output = other_output.result() if batch_models else predict(other_model_index)
+      profiler.checkpoint('predict_other')
+
+      calc_center[other_model_index] = np.array(tri_blend(l_prob, r_prob, model_output[0,:,angle_speed_count::3], minimize=use_minimize))
+
+      if use_discrete_angle:
+        fast_angles[other_model_index] = angle_factor * model_output[0,:,:angle_speed_count] + calibration[0][0]
+        '''if angle_limit < 1: 
+          relative_angles = angle_factor * advanceSteer * (model_output[:,-1,:,:angle_speed_count] - model_output[:,-1,0,:angle_speed_count]) + cs.steeringAngle
+          fast_angles = np.clip(fast_angles[other_model_index], relative_angles - angle_limit, relative_angles + angle_limit)'''
+      else:
+        fast_angles[other_model_index] = angle_factor * advanceSteer * (model_output[0,:,:angle_speed_count] - model_output[0,0,:angle_speed_count]) + cs.steeringAngle
+        '''if angle_limit < 1 or abs(cs.steeringAngle) > 30: 
+          discrete_angles = angle_factor * model_output[:,-1,:,:angle_speed_count] + calibration[0][0]
+          fast_angles = np.clip(fast_angles[other_model_index], discrete_angles - angle_limit, discrete_angles + angle_limit)'''
+      fast_angles[other_model_index] = np.transpose(fast_angles[other_model_index])
+
+    if (lr_prob > 0 or model_index == 1) and fast_angles[0].shape == fast_angles[1].shape:
+      if (abs(fast_angles[0][10,6]) < abs(fast_angles[1][10,6]) or model_index == 1) and int(abs(fast_angles[1][10,8]) * model_factor) > 0 and calibrated:
+        model_index = 1
       else:
-        print(list(np.concatenate(([float(x) for x in calibration[0]],[float(x) for x in calibration[1]]), axis=0)))
-        params.put("CalibrationParams", json.dumps({'calibration': list(np.concatenate(([float(x) for x in calibration[0]],[float(x) for x in calibration[1]],[float(x) for x in calibration[2]],[float(x) for x in calibration[3]]), axis=0)),'lane_width': float(lane_width),'angle_bias': float(angle_bias), 'center_bias': list([float(x) for x in np.concatenate((center_bias))]), 'model_bias': list([float(x) for x in np.concatenate((model_bias))])}))
-      #params = None
-      calibrated = True
-      profiler.checkpoint('save_cal')
-
-    # TODO: replace kegman_conf with params!
-    if frame % 100 == 0:
-      (mode, ino, dev, nlink, uid, gid, size, atime, mtime, kegtime) = os.stat(os.path.expanduser('~/kegman.json'))
-      if kegtime != kegtime_prev:
-        kegtime_prev = kegtime
-        kegman = kegman_conf()  
-        advanceSteer = 1.0 + max(0, float(kegman.conf['advanceSteer']))
-        angle_factor = float(kegman.conf['angleFactor'])
-        steer_factor = float(kegman.conf['steerFactor'])
-        angle_speed = min(5, max(0, int(10 * float(kegman.conf['polyReact']))))
-        use_discrete_angle = True if float(kegman.conf['discreteAngle']) > 0 else False
-        angle_limit = abs(float(kegman.conf['discreteAngle']))
-        use_minimize = True if kegman.conf['useMinimize'] == '1' else False
-        first_model = max(0, min(len(models)-1, int(float(kegman.conf['firstModel']))))
-        last_model = max(first_model, min(len(models)-1, int(float(kegman.conf['lastModel']))))
-        model_factor = abs(float(kegman.conf['modelFactor']))
-        speed_factor = abs(float(kegman.conf['speedFactor']))
-        width_factor = abs(float(kegman.conf['widthFactor']))
-        wiggle_angle = abs(float(kegman.conf['wiggleAngle']))
-        combine_flags = abs(int(kegman.conf['useCombineFlags']))
-        accel_limit = max(0, abs(float(kegman.conf['accelLimit'])) * 6.7) * np.arange(15, dtype='float32')
-        lateral_factor = abs(float(kegman.conf['lateralFactor']))
-        yaw_factor = abs(float(kegman.conf['yawFactor']))
+        model_index = 0
+    elif fast_angles[0].shape != fast_angles[1].shape:
+      fast_angles[1] = fast_angles[0]
+
+  max_width_step = 0.05 * cs.vEgo * l_prob * r_prob
+  lane_width = max(570, lane_width - max_width_step * 2, min(1700, lane_width + max_width_step, cs.camLeft.parm2 - cs.camRight.parm2))
+
+  steer_override_timer -= 1
+  if model_index == 0 and other_model_index == 1 and steer_override_timer < 0 and abs(cs.steeringRate) < 3 and abs(cs.steeringAngle - calibration[0][0]) < 3 and cs.torqueRequest != 0 and l_prob > 0 and r_prob > 0 and cs.vEgo > 10 and (abs(cs.steeringTorque) < 300 or ((cs.steeringTorque < 0) == (calc_center[0][0][3,0] < 0))):
+    if use_center[0] > 0:
+      angle_bias += (0.00001 * cs.vEgo)
+    elif use_center[0] < 0:
+      angle_bias -= (0.00001 * cs.vEgo)
+
+    if len(models) > 1:
+      model_bias[0] += (0.000001 * cs.vEgo * lr_prob * fast_angles[0][10,:])
+      model_bias[1] += (0.000001 * cs.vEgo * lr_prob * fast_angles[1][10,:])
+      center_bias[0] += (0.000001 * cs.vEgo * lr_prob * (calc_center[0][0,:,0] - use_center[0]))
+      center_bias[1] += (0.000001 * cs.vEgo * lr_prob * (calc_center[1][0,:,0] - use_center[0]))
+
+    if calc_center[0][1,0,0] > calc_center[0][2,0,0]:	
+      width_trim += 0.5	
+    else:	
+      width_trim -= 1	
+    width_trim = min(100, max(-200, min(width_trim, 0)))
+
+    profiler.checkpoint('bias')
     
-      profiler.checkpoint('kegman')
+  elif model_index == 0 and abs(cs.steeringTorque) > 300 and (cs.steeringTorque < 0) != calc_center[0][0,3,0] < 0:
+    # Prevent angle_bias adjustment for 3 seconds after driver opposes the model
+    steer_override_timer = 45
 
-    execution_time_avg += (max(0.0001, time_factor) * ((time.time()*1000 - start_time) - execution_time_avg))
-    time_factor *= 0.96
+  frame += 1
+  distance_driven += cs.vEgo 
 
-    path_send = log.Event.new_message()
-    path_send.init('pathPlan')
+  if cs.vEgo > 10 and abs(cs.steeringAngle - calibration[0][0]) <= 3 and abs(cs.steeringRate) < 3 and l_prob > 0 and r_prob > 0:
+    cal_factor = update_calibration(calibration, [vehicle_input, camera_input], cal_col, cs)
+    profiler.checkpoint('calibrate')
+
+  if frame % 60 == 0:
+    print('lane_width: %0.1f angle bias: %0.2f  distance_driven:  %0.2f   center: %0.1f  l_prob:  %0.2f  r_prob:  %0.2f  l_offset:  %0.2f  r_offset:  %0.2f  model time:  %0.4fs  input wait:  %0.4fs  dropped:  %d  adj_speed:  %0.1f' % (lane_width, angle_bias, distance_driven, calc_center[0][0,0,-1], l_prob, r_prob, cs.camLeft.parm2, cs.camRight.parm2, 0.001 * execution_time_avg, 0.001 * (start_time - recv_time), latest_input.dropped, max(10, rate_adjustment * cs.vEgo)))
 
-    if frame % 100 == 0 and profiler.enabled:
-      profiler.display()
-      profiler.reset(True)
-    profiler.checkpoint('profiling')
+  if ((cs.vEgo < 10 and not cs.cruiseState.enabled) or not calibrated) and distance_driven > next_params_distance:
+    next_params_distance = distance_driven + 133000
+    if calibrated:
+      print(np.round(calibration[0],2))
+      put_nonblocking("CalibrationParams", json.dumps({'calibration': list(np.concatenate(([float(x) for x in calibration[0]],[float(x) for x in calibration[1]],[float(x) for x in calibration[2]],[float(x) for x in calibration[3]]), axis=0)),'lane_width': float(lane_width),'angle_bias': float(angle_bias), 'center_bias': list([float(x) for x in np.concatenate((center_bias))]), 'model_bias': list([float(x) for x in np.concatenate((model_bias))])}))
+    else:
+      print(list(np.concatenate(([float(x) for x in calibration[0]],[float(x) for x in calibration[1]]), axis=0)))
+      params.put("CalibrationParams", json.dumps({'calibration': list(np.concatenate(([float(x) for x in calibration[0]],[float(x) for x in calibration[1]],[float(x) for x in calibration[2]],[float(x) for x in calibration[3]]), axis=0)),'lane_width': float(lane_width),'angle_bias': float(angle_bias), 'center_bias': list([float(x) for x in np.concatenate((center_bias))]), 'model_bias': list([float(x) for x in np.concatenate((model_bias))])}))
+    #params = None
+    calibrated = True
+    profiler.checkpoint('save_cal')
+
+  tune = live_tune.update()
+  if tune is not None:
+    kegman.conf.update(tune)
+    advanceSteer = 1.0 + max(0, float(kegman.conf['advanceSteer']))
+    angle_factor = float(kegman.conf['angleFactor'])
+    steer_factor = float(kegman.conf['steerFactor'])
+    angle_speed = min(5, max(0, int(10 * float(kegman.conf['polyReact']))))
+    use_discrete_angle = True if float(kegman.conf['discreteAngle']) > 0 else False
+    angle_limit = abs(float(kegman.conf['discreteAngle']))
+    use_minimize = True if kegman.conf['useMinimize'] == '1' else False
+    first_model = max(0, min(len(models)-1, int(float(kegman.conf['firstModel']))))
+    last_model = max(first_model, min(len(models)-1, int(float(kegman.conf['lastModel']))))
+    model_factor = abs(float(kegman.conf['modelFactor']))
+    speed_factor = abs(float(kegman.conf['speedFactor']))
+    width_factor = abs(float(kegman.conf['widthFactor']))
+    wiggle_angle = abs(float(kegman.conf['wiggleAngle']))
+    combine_flags = abs(int(kegman.conf['useCombineFlags']))
+    accel_limit = max(0, abs(float(kegman.conf['accelLimit'])) * 6.7) * np.arange(15, dtype='float32')
+    lateral_factor = abs(float(kegman.conf['lateralFactor']))
+    yaw_factor = abs(float(kegman.conf['yawFactor']))
+    batch_models = kegman.conf['batchModels'] == '1'
+    profiler.checkpoint('kegman')
+
+  execution_time_avg += (max(0.0001, time_factor) * ((time.time()*1000 - start_time) - execution_time_avg))
+  time_factor *= 0.96
+
+  if lockstep:
+    send_plan(path_send, cs, trace_times)
+  path_send = log.Event.new_message()
+  path_send.init('pathPlan')
+
+  if frame % 100 == 0 and profiler.enabled:
+    profiler.display()
+    profiler.reset(True)
+  profiler.checkpoint('profiling')
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+from selfdrive.controls.lib.model_loader import MODEL_DIR, HISTORY_ROWS, VARIANTS, model_names, variant_path, device_id, load_session, run_windows, output_error
+
+# Replays input windows recorded by transcoderd (RECORD_MODEL_INPUTS) through every model in
+# models.json for each combination of variant, intra-op threads, execution mode and cpu set.
+# Drift is the largest fastAngles / cPoly difference from fp32 on one sequential thread.
+
+def parse_cpus(spec):
+  # taskset style lists, "2,3" or "0-3"
+  cpus = set()
+  for part in spec.split(','):
+    if '-' in part:
+      first, last = part.split('-')
+      cpus.update(range(int(first), int(last) + 1))
+    else:
+      cpus.add(int(part))
+  return cpus
+
+def benchmark(path, rows, windows, threads, parallel, passes, warmup):
+  session = load_session(path, threads=threads, parallel=parallel)
+  run_windows(session, rows, {k: windows[k][:warmup] if k != 'fingerprint' else windows[k] for k in windows})
+  latencies = []
+  for _ in range(passes):
+    output, pass_latencies = run_windows(session, rows, windows)
+    latencies.append(pass_latencies)
+  return output, np.concatenate(latencies)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Benchmark model latency across onnxruntime session settings')
+  parser.add_argument('--inputs', default=os.path.join(MODEL_DIR, 'model_inputs.npz'), help='windows recorded with RECORD_MODEL_INPUTS')
+  parser.add_argument('--model-dir', default=MODEL_DIR)
+  parser.add_argument('--variants', default=','.join(VARIANTS))
+  parser.add_argument('--threads', default='1,2,4', help='intra_op_num_threads values')
+  parser.add_argument('--modes', default='sequential,parallel')
+  parser.add_argument('--cpus', default='2,3;0-3;3', help='semicolon separated cpu sets, transcoderd runs on 2,3')
+  parser.add_argument('--passes', type=int, default=3, help='times to replay the recorded windows')
+  parser.add_argument('--warmup', type=int, default=20)
+  parser.add_argument('--json', help='also write results to this file')
+  args = parser.parse_args()
+
+  if not os.path.exists(args.inputs):
+    print("no recorded inputs at %s, record some with RECORD_MODEL_INPUTS=%s" % (args.inputs, args.inputs))
+    sys.exit(1)
+  windows = dict(np.load(args.inputs))
+  print("%d windows x %d passes on %s" % (len(windows['vehicle1']), args.passes, device_id()))
+
+  available_cpus = os.sched_getaffinity(0)
+  results = []
+  for index, name in enumerate(model_names(os.path.join(args.model_dir, 'models.json'))):
+    rows = HISTORY_ROWS[index]
+    reference, _ = benchmark(variant_path(name, 'fp32', args.model_dir), rows, windows, 1, False, 1, 0)
+
+    for cpu_spec in args.cpus.split(';'):
+      cpus = parse_cpus(cpu_spec) & available_cpus
+      if len(cpus) == 0:
+        continue
+      # onnxruntime threads inherit the affinity of the thread creating the session
+      os.sched_setaffinity(0, cpus)
+
+      for variant in args.variants.split(','):
+        path = variant_path(name, variant, args.model_dir)
+        if not os.path.exists(path):
+          continue
+        for threads in [int(t) for t in args.threads.split(',')]:
+          for mode in args.modes.split(','):
+            output, latencies = benchmark(path, rows, windows, threads, mode == 'parallel', args.passes, args.warmup)
+            angle_drift, poly_drift = output_error(reference, output)
+            results.append({'model': name, 'variant': variant, 'cpus': cpu_spec, 'threads': threads, 'mode': mode,
+                            'p50': float(np.percentile(latencies, 50)), 'p99': float(np.percentile(latencies, 99)), 'max': float(np.max(latencies)),
+                            'angle_drift': float(angle_drift), 'poly_drift': float(poly_drift)})
+            print("%s  %-4s  cpus %-5s  threads %d  %-10s  p50: %7.3fms  p99: %7.3fms  max: %7.3fms  angle drift: %0.4f  poly drift: %0.4f" %
+                  (name, variant, cpu_spec, threads, mode, results[-1]['p50'], results[-1]['p99'], results[-1]['max'], angle_drift, poly_drift))
+
+    os.sched_setaffinity(0, available_cpus)
+
+  print("\nlowest p99 per model:")
+  for name in set(r['model'] for r in results):
+    best = min([r for r in results if r['model'] == name], key=lambda r: r['p99'])
+    print("%s  %s  cpus %s  threads %d  %s  p99: %0.3fms" % (name, best['variant'], best['cpus'], best['threads'], best['mode'], best['p99']))
+
+  if args.json:
+    with open(args.json, 'w') as f:
+      json.dump({'device': device_id(), 'results': results}, f, indent=2)
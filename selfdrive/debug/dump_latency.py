@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import zmq
+
+import selfdrive.messaging as messaging
+from selfdrive.services import service_list
+
+def print_stats(stats):
+  print("%s latency, ms" % stats.source)
+  print("%20s %8s %8s %8s %8s %8s %8s" % ("span", "count", "mean", "p50", "p90", "p99", "max"))
+  for span in stats.spans:
+    print("%20s %8d %8.2f %8.2f %8.2f %8.2f %8.2f" % (span.name, span.count, span.meanMs, span.p50Ms, span.p90Ms, span.p99Ms, span.maxMs))
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Print the latency histograms published on latencyStats')
+  parser.add_argument('--follow', action='store_true', help='keep printing every update')
+  parser.add_argument('--addr', default='127.0.0.1')
+  args = parser.parse_args()
+
+  sock = messaging.sub_sock(service_list['latencyStats'].port, addr=args.addr, timeout=3000)
+  # controlsd sends the pipeline trace and the enabled profilers every second, one of each is printed
+  printed = set()
+  while True:
+    try:
+      dat = messaging.recv_one(sock)
+    except zmq.error.Again:
+      if len(printed) > 0:
+        break
+      print("no latencyStats, is controlsd running?")
+      sys.exit(1)
+    source = dat.latencyStats.source
+    if source in printed and not args.follow:
+      break
+    printed.add(source)
+    print_stats(dat.latencyStats)
+    print()
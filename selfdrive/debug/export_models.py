@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+import numpy as np
+import onnxruntime as ort
+from onnxruntime.quantization import quantize_dynamic, QuantType
+
+from selfdrive.controls.lib.model_loader import MODEL_DIR, HISTORY_ROWS, model_names, variant_path, write_benchmark, device_id, load_session, run_windows, output_error
+
+# Builds the optimized graph and int8 variants of every model in models.json, checks them against
+# the fp32 model on input windows recorded by transcoderd and stores the latency of every variant
+# that passed in the benchmark cache transcoderd selects its models from.
+#
+# record windows while driving with: RECORD_MODEL_INPUTS=models/model_inputs.npz python3 selfdrive/controls/transcoderd.py
+
+def export(name, model_dir):
+  fp32_path = variant_path(name, 'fp32', model_dir)
+  # extended rather than all, layout optimizations are specific to the machine the graph was saved on
+  load_session(fp32_path, optimization=ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED, optimized_path=variant_path(name, 'opt', model_dir))
+  quantize_dynamic(fp32_path, variant_path(name, 'int8', model_dir), weight_type=QuantType.QInt8)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Export, verify and benchmark quantized and optimized model variants')
+  parser.add_argument('--inputs', default=os.path.join(MODEL_DIR, 'model_inputs.npz'), help='windows recorded with RECORD_MODEL_INPUTS')
+  parser.add_argument('--model-dir', default=MODEL_DIR)
+  parser.add_argument('--angle-tol', type=float, default=0.1, help='max fastAngles error before scaling')
+  parser.add_argument('--poly-tol', type=float, default=1.0, help='max cPoly error')
+  parser.add_argument('--skip-export', action='store_true', help='only verify and benchmark existing variants')
+  args = parser.parse_args()
+
+  if not os.path.exists(args.inputs):
+    print("no recorded inputs at %s, record some with RECORD_MODEL_INPUTS=%s" % (args.inputs, args.inputs))
+    sys.exit(1)
+  windows = np.load(args.inputs)
+  print("%d windows on %s" % (len(windows['vehicle1']), device_id()))
+
+  benchmark_path = os.path.join(args.model_dir, 'benchmark.json')
+  failed = False
+  for index, name in enumerate(model_names(os.path.join(args.model_dir, 'models.json'))):
+    if not args.skip_export:
+      export(name, args.model_dir)
+
+    reference, latencies = run_windows(load_session(variant_path(name, 'fp32', args.model_dir)), HISTORY_ROWS[index], windows)
+    latency = np.median(latencies)
+    write_benchmark(name, 'fp32', latency, benchmark_path)
+    print("%s  fp32  %0.3fms" % (name, latency))
+
+    for variant in ['opt', 'int8']:
+      path = variant_path(name, variant, args.model_dir)
+      if not os.path.exists(path):
+        continue
+      # opt graphs are already optimized, running the optimizer again only costs load time
+      optimization = ort.GraphOptimizationLevel.ORT_DISABLE_ALL if variant == 'opt' else ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+      output, latencies = run_windows(load_session(path, optimization=optimization), HISTORY_ROWS[index], windows)
+      latency = np.median(latencies)
+      angle_error, poly_error = output_error(reference, output)
+      passed = angle_error <= args.angle_tol and poly_error <= args.poly_tol
+      print("%s  %s  %0.3fms  angle error: %0.4f  poly error: %0.4f  %s" % (name, variant, latency, angle_error, poly_error, 'ok' if passed else 'FAILED'))
+      if passed:
+        write_benchmark(name, variant, latency, benchmark_path)
+      else:
+        failed = True
+        # keep a failed variant from being selected by an older benchmark entry
+        os.remove(path)
+
+  sys.exit(1 if failed else 0)
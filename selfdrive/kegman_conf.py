@@ -160,6 +160,35 @@ class kegman_conf():
       self.config.update({"lastModel": "6"})
       self.config.update({"modelFactor": "0.5"})
       self.element_updated = True
+
+    if "batchModels" not in self.config:
+      self.config.update({"batchModels": "1"})
+      self.element_updated = True
+
+    if "modelWarmup" not in self.config:
+      self.config.update({"modelWarmup": "1"})
+      self.element_updated = True
+
+    if "carStateShm" not in self.config:
+      self.config.update({"carStateShm": "0"})
+      self.config.update({"carStatePacked": "0"})
+      self.element_updated = True
+
+    if "lateralFeatures" not in self.config:
+      self.config.update({"lateralFeatures": "0"})
+      self.element_updated = True
+
+    if "fastBoot" not in self.config:
+      self.config.update({"fastBoot": "0"})
+      self.element_updated = True
+
+    if "latencyTrace" not in self.config:
+      self.config.update({"latencyTrace": "0"})
+      self.element_updated = True
+
+    if "catchUpPolicy" not in self.config:
+      self.config.update({"catchUpPolicy": "coalesce"})
+      self.element_updated = True
     
     if "BP1" not in self.config:
       self.config.update({"BP1":"0"})
@@ -1,3 +1,6 @@
+import os
+import mmap
+import struct
 import zmq
 
 from cereal import log
@@ -102,6 +105,162 @@ def recv_one_or_none(sock):
     return None
 
 
+def event_from_bytes(dat, packed=False):
+  return log.Event.from_bytes_packed(dat) if packed else log.Event.from_bytes(dat)
+
+
+# Shared memory ring transport. The publisher serializes every event once into a slot of a file
+# in /dev/shm and rings a zmq ipc doorbell after a batch, subscribers map the file and read the
+# new slots without another kernel copy. A doorbell socket can be registered with a poller like
+# any zmq socket, the sockets below also answer recv(), recv(zmq.NOBLOCK) and recv_multipart().
+
+SHM_DIR = '/dev/shm'
+SHM_MAGIC = 0x474e4952  # RING
+SHM_HEADER = struct.Struct('<IIIIQ')  # magic, slots, slot size, packed, write seq
+SHM_SLOT = struct.Struct('<QQ')  # seq, length
+
+def shm_path(service):
+  return os.path.join(SHM_DIR, 'raspilot_%s' % service)
+
+def shm_doorbell(service):
+  return 'ipc:///tmp/raspilot_%s_doorbell' % service
+
+
+class ShmPubSock():
+  def __init__(self, service, packed=False, slots=64, slot_size=8192):
+    self.slots = slots
+    self.slot_size = slot_size
+    self.packed = packed
+    self.seq = 0
+    self.dropped = 0
+
+    # replaced with a rename so subscribers never map a half initialized ring
+    path = shm_path(service)
+    fd = os.open(path + '.tmp', os.O_CREAT | os.O_TRUNC | os.O_RDWR, 0o666)
+    try:
+      os.ftruncate(fd, SHM_HEADER.size + slots * slot_size)
+      self.buf = mmap.mmap(fd, SHM_HEADER.size + slots * slot_size)
+    finally:
+      os.close(fd)
+    SHM_HEADER.pack_into(self.buf, 0, SHM_MAGIC, slots, slot_size, int(packed), 0)
+    os.rename(path + '.tmp', path)
+
+    self.doorbell = zmq.Context.instance().socket(zmq.PUB)
+    self.doorbell.bind(shm_doorbell(service))
+
+  def write(self, dat):
+    """Stores one event without waking subscribers, accepts bytes or a capnp builder. An event
+    larger than a slot is dropped and counted, the publishing loop goes on."""
+    if not isinstance(dat, (bytes, bytearray)):
+      dat = dat.to_bytes_packed() if self.packed else dat.to_bytes()
+    if len(dat) > self.slot_size - SHM_SLOT.size:
+      if self.dropped == 0:
+        print("  %d byte event does not fit a %d byte slot, dropped" % (len(dat), self.slot_size))
+      self.dropped += 1
+      return False
+
+    self.seq += 1
+    offset = SHM_HEADER.size + (self.seq % self.slots) * self.slot_size
+    # invalidate the slot while it is rewritten, readers compare the seq before and after copying
+    SHM_SLOT.pack_into(self.buf, offset, 0, 0)
+    self.buf[offset + SHM_SLOT.size:offset + SHM_SLOT.size + len(dat)] = dat
+    SHM_SLOT.pack_into(self.buf, offset, self.seq, len(dat))
+    struct.pack_into('<Q', self.buf, SHM_HEADER.size - 8, self.seq)
+    return True
+
+  def notify(self):
+    self.doorbell.send(b'', zmq.NOBLOCK)
+
+  def send(self, dat):
+    self.write(dat)
+    self.notify()
+
+  def send_multipart(self, parts):
+    for dat in parts:
+      self.write(dat)
+    self.notify()
+
+
+class ShmSubSock():
+  def __init__(self, service, poller=None, timeout=None, copy=True):
+    self.path = shm_path(service)
+    self.copy = copy
+    self.buf = None
+    self.inode = None
+    self.read_seq = 0
+    self.packed = False
+    self.dropped = 0
+    self.pending = []
+
+    self.doorbell = zmq.Context.instance().socket(zmq.SUB)
+    self.doorbell.connect(shm_doorbell(service))
+    self.doorbell.setsockopt(zmq.SUBSCRIBE, b"")
+    if timeout is not None:
+      self.doorbell.RCVTIMEO = timeout
+    if poller is not None:
+      poller.register(self.doorbell, zmq.POLLIN)
+
+    # like a zmq subscriber, events published before subscribing are skipped
+    if os.path.exists(self.path):
+      self._map(skip_history=True)
+
+  def _map(self, skip_history=False):
+    # a restarted publisher creates a new ring file, all of its events are new to this subscriber
+    inode = os.stat(self.path).st_ino
+    if inode != self.inode:
+      with open(self.path, 'rb') as f:
+        self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+      self.view = memoryview(self.buf)
+      self.inode = inode
+      magic, self.slots, self.slot_size, packed, write_seq = SHM_HEADER.unpack_from(self.buf, 0)
+      assert magic == SHM_MAGIC
+      self.packed = packed == 1
+      self.read_seq = write_seq if skip_history else 0
+
+  def _read(self):
+    write_seq = struct.unpack_from('<Q', self.buf, SHM_HEADER.size - 8)[0]
+    if write_seq < self.read_seq:
+      self.read_seq = 0
+    if write_seq - self.read_seq > self.slots:
+      self.dropped += write_seq - self.read_seq - self.slots
+      self.read_seq = write_seq - self.slots
+
+    for seq in range(self.read_seq + 1, write_seq + 1):
+      offset = SHM_HEADER.size + (seq % self.slots) * self.slot_size
+      slot_seq, length = SHM_SLOT.unpack_from(self.buf, offset)
+      start = offset + SHM_SLOT.size
+      # without copy the view is only valid until the publisher wraps around the ring
+      dat = self.buf[start:start + length] if self.copy else self.view[start:start + length]
+      if slot_seq != seq or SHM_SLOT.unpack_from(self.buf, offset)[0] != seq:
+        self.dropped += 1
+        continue
+      self.pending.append(dat)
+    self.read_seq = write_seq
+
+  def _wait(self, flags=0):
+    self.doorbell.recv(flags)
+    while True:
+      try:
+        self.doorbell.recv(zmq.NOBLOCK)
+      except zmq.error.Again:
+        break
+    self._map()
+    self._read()
+
+  def recv(self, flags=0):
+    while len(self.pending) == 0:
+      self._wait(flags)
+    return self.pending.pop(0)
+
+  def recv_multipart(self, flags=0):
+    # a doorbell can ring for slots an earlier read already took, or that were all dropped,
+    # like zmq a batch always holds at least one event
+    while len(self.pending) == 0:
+      self._wait(flags)
+    parts, self.pending = self.pending, []
+    return parts
+
+
 class SubMaster():
   def __init__(self, services, ignore_alive=None, addr="127.0.0.1"):
     self.poller = zmq.Poller()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import subprocess
+from contextlib import ExitStack
+from unittest import mock
+
+import numpy as np
+import zmq
+from zmq.utils.monitor import recv_monitor_message
+
+if "CI" in os.environ:
+  tqdm = lambda x: x
+else:
+  from tqdm import tqdm
+
+from cereal import car, log
+import selfdrive.messaging as messaging
+from common.basedir import BASEDIR
+from common.params import Params
+from common.profiler import Profiler
+from selfdrive.services import service_list
+from selfdrive.car.car_helpers import get_car
+from selfdrive.controls.lib.laterald import Lateral
+from selfdrive.controls.lib.latcontrol_pid import LatControlPID
+from selfdrive.controls.lib.model_loader import HISTORY_ROWS
+
+# Replays the can events of a log through the lateral pipeline as fast as it runs: CarInterface and
+# Lateral as in controlsd, the real transcoderd in LOCKSTEP_REPLAY mode, and its pathPlan back into
+# LatControlPID. Every camera frame waits for its plan, time is taken from the log, so two replays
+# of a log with the same code, models and kegman.json give the same output.
+
+STAGES = ['carstate', 'lateral', 'transcoder', 'latcontrol']
+# transcoderd plans once its vehicle history is full
+VEHICLE_ROWS = round(HISTORY_ROWS[-1]*6.6666667+7)
+# kept from the device, everything else is cleared like in process_replay
+KEEP_PARAMS = ["CalibrationParams", "LateralGain"]
+# transcoderd still sets up and warms up its models after subscribing
+STARTUP_TIMEOUT = 60.
+
+
+class ListSocket:
+  def __init__(self, data):
+    self.data = list(data)
+
+  def recv(self, block=None):
+    if len(self.data) == 0:
+      raise ValueError("log ended before the car was fingerprinted")
+    return self.data.pop(0)
+
+
+class ReplayClock:
+  """Stands in for the time module of the stages, time() is the logMonoTime of the current event."""
+  def __init__(self):
+    self.t = 0.
+
+  def time(self):
+    return self.t
+
+
+def reset_params(keep_calibration):
+  kept = {}
+  if keep_calibration:
+    params = Params()
+    kept = {k: params.get(k) for k in KEEP_PARAMS}
+  shutil.rmtree('/data/params', ignore_errors=True)
+  params = Params()
+  params.manager_start()
+  params.put("OpenpilotEnabledToggle", "1")
+  params.put("Passive", "0")
+  for k, v in kept.items():
+    if v is not None:
+      params.put(k, v)
+  return params
+
+def start_transcoderd(lateral, timeout=300.):
+  # the first camera frame is only sent once transcoderd subscribed, zmq drops it otherwise
+  if lateral.use_features:
+    sock = lateral.features
+  elif lateral.use_shm:
+    sock = lateral.carstate.doorbell
+  else:
+    sock = lateral.carstate
+  monitor = sock.get_monitor_socket(zmq.EVENT_ACCEPTED)
+  monitor.RCVTIMEO = int(timeout * 1000)
+
+  env = dict(os.environ, LOCKSTEP_REPLAY="1", PYTHONPATH=BASEDIR)
+  proc = subprocess.Popen([sys.executable, os.path.join(BASEDIR, "selfdrive/controls/transcoderd.py")], env=env)
+  try:
+    recv_monitor_message(monitor)
+  except zmq.error.Again:
+    proc.kill()
+    raise RuntimeError("transcoderd did not subscribe within %ds" % timeout)
+  finally:
+    sock.disable_monitor()
+    monitor.close()
+  time.sleep(0.5)
+  return proc
+
+def recv_plan(sock, proc):
+  while True:
+    try:
+      plan = messaging.recv_one(sock).pathPlan
+    except zmq.error.Again:
+      raise RuntimeError("transcoderd did not answer, exit code %s" % proc.poll())
+    # the empty plan sent on startup
+    if plan.canTime != 0:
+      return plan
+
+def stage_stats(times):
+  times = np.array(times) * 1000.
+  if len(times) == 0:
+    return {'count': 0}
+  return {'count': len(times), 'mean': np.mean(times), 'p50': np.percentile(times, 50),
+          'p99': np.percentile(times, 99), 'max': np.max(times)}
+
+def replay(lr, plan_delay=3, keep_calibration=False, timeout=10.):
+  """Returns the outputs of every can event and pathPlan, and the time taken by each stage.
+  A plan is used by LatControlPID plan_delay can events after its camera frame, about the model time."""
+  all_msgs = sorted(lr, key=lambda msg: msg.logMonoTime)
+  can_msgs = [msg for msg in all_msgs if msg.which() == 'can']
+  health = [msg.health for msg in all_msgs if msg.which() == 'health']
+  is_panda_black = len(health) > 0 and health[0].hwType == log.HealthData.HwType.blackPanda
+
+  params = reset_params(keep_calibration)
+  can_strs = [msg.as_builder().to_bytes() for msg in can_msgs]
+  CI, CP = get_car(ListSocket(can_strs), None, is_panda_black)
+  params.put("CarParams", CP.to_bytes())
+  print("replaying %d can events as %s" % (len(can_strs), CP.carFingerprint))
+
+  clock = ReplayClock()
+  CC = car.CarControl.new_message()
+  profiler = Profiler(False, 'replay')
+  LaC = LatControlPID(CP)
+  lateral = Lateral(CP)
+  plan_sock = messaging.sub_sock(service_list['pathPlan'].port, timeout=int(STARTUP_TIMEOUT * 1000))
+  proc = start_transcoderd(lateral)
+
+  gps = messaging.new_message().init('gpsLocationExternal')
+  sm = {'gpsLocationExternal': gps}
+  path_plan = messaging.new_message().init('pathPlan')
+  pending = []
+  states_sent = 0
+  times = {s: [] for s in STAGES}
+  out = {'can_time': [], 'steer': [], 'steer_angle': [], 'plan_frame': [], 'plan_angle': []}
+  digest = hashlib.sha1()
+  msg_index = 0
+
+  start_time = time.perf_counter()
+  try:
+    with ExitStack() as stack:
+      for module in [sys.modules[type(CI).__module__], sys.modules[LatControlPID.__module__]]:
+        stack.enter_context(mock.patch.object(module, 'time', clock))
+
+      for frame, (msg, can_str) in enumerate(zip(tqdm(can_msgs), can_strs)):
+        clock.t = msg.logMonoTime * 1e-9
+        while msg_index < len(all_msgs) and all_msgs[msg_index].logMonoTime <= msg.logMonoTime:
+          if all_msgs[msg_index].which() == 'gpsLocationExternal':
+            sm['gpsLocationExternal'] = all_msgs[msg_index].gpsLocationExternal
+          msg_index += 1
+
+        t = time.perf_counter()
+        CS = CI.update(CC, [can_str], None, profiler)
+        times['carstate'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        cam_frame_prev = lateral.stock_cam_frame_prev
+        lateral.update(CS, sm, 0, 1)
+        states_sent += 1
+        times['lateral'].append(time.perf_counter() - t)
+
+        if lateral.stock_cam_frame_prev != cam_frame_prev and states_sent >= VEHICLE_ROWS:
+          t = time.perf_counter()
+          plan = recv_plan(plan_sock, proc)
+          times['transcoder'].append(time.perf_counter() - t)
+          plan_sock.RCVTIMEO = int(timeout * 1000)
+          pending.append((frame + plan_delay, plan))
+          out['plan_frame'].append(frame)
+          out['plan_angle'].append(plan.angleSteers)
+          # the latency trace is wall clock, it differs from run to run
+          plan_copy = plan.as_builder()
+          plan_copy.traceMonoTimes = []
+          digest.update(plan_copy.to_bytes())
+
+        while len(pending) > 0 and pending[0][0] <= frame:
+          path_plan = pending.pop(0)[1]
+
+        t = time.perf_counter()
+        steer, steer_angle, _ = LaC.update(path_plan.paramsValid and CS.lkMode, CS.cruiseState.enabled, CS.vEgo, CS.steeringAngle, CS.steeringRate,
+                                           CS.steeringPressed, CP, path_plan, CS.canTime, CS.blinkers)
+        times['latcontrol'].append(time.perf_counter() - t)
+        # controlsd checks for new tunes every 10 frames when there is time
+        if frame % 10 == 0:
+          LaC.live_tune(CP)
+        out['can_time'].append(CS.canTime)
+        out['steer'].append(steer)
+        out['steer_angle'].append(steer_angle)
+  finally:
+    proc.terminate()
+    proc.wait()
+
+  wall_time = time.perf_counter() - start_time
+  out = {k: np.array(v) for k, v in out.items()}
+  for k in ['steer', 'steer_angle']:
+    digest.update(out[k].astype(np.float64).tobytes())
+  log_time = (can_msgs[-1].logMonoTime - can_msgs[0].logMonoTime) * 1e-9 if len(can_msgs) > 0 else 0.
+  stats = {s: stage_stats(times[s]) for s in STAGES}
+  return out, digest.hexdigest(), stats, log_time, wall_time
+
+def print_stats(stats, log_time, wall_time):
+  print("%12s %8s %9s %9s %9s %9s" % ("stage", "count", "mean ms", "p50 ms", "p99 ms", "max ms"))
+  for s in STAGES:
+    st = stats[s]
+    if st['count'] == 0:
+      print("%12s %8d" % (s, 0))
+    else:
+      print("%12s %8d %9.3f %9.3f %9.3f %9.3f" % (s, st['count'], st['mean'], st['p50'], st['p99'], st['max']))
+  print("replayed %0.1fs of log in %0.1fs, %0.1fx realtime" % (log_time, wall_time, log_time / max(wall_time, 1e-6)))
+
+def compare_outputs(out, ref):
+  """Names of the outputs that differ from ref, replays are deterministic so any difference counts."""
+  return [k for k in sorted(out) if k not in ref or ref[k].shape != out[k].shape or not np.array_equal(ref[k], out[k])]
+
+if __name__ == "__main__":
+  from tools.lib.logreader import LogReader
+
+  parser = argparse.ArgumentParser(description="Lockstep replay of controlsd, transcoderd and LatControlPID over a log")
+  parser.add_argument("log", help="rlog to replay")
+  parser.add_argument("--plan-delay", type=int, default=3, help="can events between a camera frame and the use of its plan")
+  parser.add_argument("--keep-calibration", action="store_true", help="keep %s from the current params" % " and ".join(KEEP_PARAMS))
+  parser.add_argument("--save", help="write the outputs to this npz file")
+  parser.add_argument("--ref", help="compare the outputs to a npz file written with --save")
+  args = parser.parse_args()
+
+  out, digest, stats, log_time, wall_time = replay(LogReader(args.log), args.plan_delay, args.keep_calibration)
+  print_stats(stats, log_time, wall_time)
+  print("%d plans, output digest %s" % (len(out['plan_frame']), digest))
+
+  if args.save is not None:
+    np.savez_compressed(args.save, **out)
+  if args.ref is not None:
+    ref = np.load(args.ref)
+    failed = compare_outputs(out, {k: ref[k] for k in ref.files})
+    if len(failed) > 0:
+      print("outputs differ from %s: %s" % (args.ref, ", ".join(failed)))
+      sys.exit(1)
+    print("outputs match %s" % args.ref)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import os
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+from setproctitle import setproctitle
+
+from selfdrive.kegman_conf import kegman_conf
+from selfdrive.controls.lib.live_tune import TunePublisher, KEGMAN_PATH, TUNE_BEAT_INTERVAL
+
+# Publishes kegman.json for the live tuning of transcoderd, controlsd and dashboard through
+# selfdrive/controls/lib/live_tune.py. Changes are picked up with inotify. Other processes still
+# call kegman_conf() at startup, which writes back missing defaults and the tuning of the car,
+# those writes are published like any other change.
+
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+EVENT = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+def inotify_watch(path):
+  # editors and kegman_conf replace or rewrite the file, so watch its directory
+  libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+  fd = libc.inotify_init()
+  if fd < 0:
+    return None
+  if libc.inotify_add_watch(fd, os.path.dirname(path).encode(), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+    os.close(fd)
+    return None
+  return fd
+
+def changed_names(fd):
+  data = os.read(fd, 4096)
+  names = []
+  offset = 0
+  while offset < len(data):
+    _, _, _, length = EVENT.unpack_from(data, offset)
+    offset += EVENT.size
+    names.append(data[offset:offset + length].rstrip(b'\0').decode())
+    offset += length
+  return names
+
+def wait_for_change(fd, kegtime, publisher):
+  # beats while waiting, so readers know the published version is current
+  if fd is None:
+    while os.stat(KEGMAN_PATH).st_mtime == kegtime:
+      publisher.beat()
+      time.sleep(TUNE_BEAT_INTERVAL)
+    return
+  while True:
+    publisher.beat()
+    readable, _, _ = select.select([fd], [], [], TUNE_BEAT_INTERVAL)
+    if len(readable) > 0 and os.path.basename(KEGMAN_PATH) in changed_names(fd):
+      return
+
+def valid(conf, prev_conf):
+  # consumers convert the values with float() and int(), a value that stopped being a number
+  # would take them down
+  for key, value in conf.items():
+    if prev_conf is not None and key in prev_conf and is_number(prev_conf[key]) and not is_number(value):
+      print("kegman %s=%s is not a number, keeping version" % (key, value))
+      return False
+  return True
+
+def is_number(value):
+  try:
+    float(value)
+    return True
+  except (TypeError, ValueError):
+    return False
+
+def main():
+  setproctitle('tuned')
+  publisher = TunePublisher()
+  fd = inotify_watch(KEGMAN_PATH)
+  conf = None
+  while True:
+    kegtime = os.stat(KEGMAN_PATH).st_mtime if os.path.exists(KEGMAN_PATH) else None
+    try:
+      new_conf = kegman_conf().conf
+    except ValueError as e:
+      # partially written file, the next write triggers another event
+      print("kegman error: %s" % e)
+      new_conf = conf
+    if new_conf != conf and valid(new_conf, conf):
+      conf = new_conf
+      print("liveTune version %d" % publisher.publish(conf))
+    wait_for_change(fd, kegtime, publisher)
+
+if __name__ == "__main__":
+  main()
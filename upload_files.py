@@ -1,102 +1,164 @@
 #!/usr/bin/env python
-from os import path
-from datetime import datetime
-import zmq
-import time
 import os
+import sys
 import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import zmq
 import numpy as np
 import requests
-import sys 
-import gc
-#import psutil
 from selfdrive.kegman_conf import kegman_conf
 from common.params import Params
-if len(sys.argv) < 2 or sys.argv[1] == 0:
-  destination = "gernstation.synology.me"
-  min_time = 0  #(time.time() - 72 * 60 * 60) * 1000
-elif sys.argv[1] == '1':
-  min_time = 0
+from common.upload import load_manifest, save_manifest, resume, finished, read_chunks, replace_chunks, gzip_chunks, json_message
+
+UPLOAD_DIR = '/data/upload/'
+# uploaded and locally imported state of every file, so an interrupted run can be resumed
+MANIFEST = os.path.join(UPLOAD_DIR, 'upload_manifest.json')
+LOCAL_URL = 'http://localhost:8086/write?db=carDB&precision=ms'
+LOCAL_CREATE_URL = 'http://localhost:8086/query?q=CREATE DATABASE carDB'
+
+parser = argparse.ArgumentParser(description='Upload drive logs in %s' % UPLOAD_DIR)
+parser.add_argument('server', nargs='?', default='0', help='0 for the default server, 1 for the local network one')
+parser.add_argument('--window', type=int, default=8, help='files sent before waiting for acks')
+parser.add_argument('--compress', action='store_true', help='send gzipped content, the server must support it')
+parser.add_argument('--min-age', type=float, default=30., help='skip files modified less than this many seconds ago')
+parser.add_argument('--ack-timeout', type=float, default=120.)
+args = parser.parse_args()
+
+if args.server == '1':
   destination = "192.168.1.2"
+else:
+  destination = "gernstation.synology.me"
 print("using %s" % destination)
 
-#print(psutil.cpu_percent(), psutil.sensors_temperatures(False)['cpu-thermal'][0].current)
 kegman = kegman_conf()
 do_import_local = True if kegman.conf['useLocalImport'] == "1" else False
 print("useLocalImport = ", do_import_local)
 params = Params()
-user_id =  str(params.get("PandaDongleId"))
+user_id = str(params.get("PandaDongleId"))
 user_id = user_id.replace("'","")
 identifier = np.random.randint(0, high=10000)
 context = zmq.Context()
 dataPush = context.socket(zmq.PUSH)
 dataPush.connect("tcp://" + destination + ":8593")
-start_time = time.time() * 1000 #- 24 * 60 * 60 * 1000
 dataSub = context.socket(zmq.SUB)
 dataSub.connect("tcp://" + destination + ":8602")
-dataSub.setsockopt_string(zmq.SUBSCRIBE, str(identifier))   #, user_id)
-
-next_time = time.time()
-limit = 7000000
-recordcount = 0
-max_limit = 5000
-
-directory = os.fsencode('/data/upload')
-file_data = {"user_id": str(params.get("PandaDongleId")), "file_name": "", "file_content": "", "identifier": identifier}
-file_list = []
-
-upload_list = os.listdir('/data/upload/')
-file_count = 0
-for file in upload_list:
-  filename = os.fsdecode(file) 
-  if filename.endswith(".dat"): file_count += 1
-print("Total files to upload: %d" % file_count)
-for file in upload_list: 
-  filename = os.fsdecode(file)
-  if filename.endswith(".dat"): 
-    #print(directory, filename)
-    with open(os.path.join('/data/upload/', filename)) as myfile:
-      inString = myfile.read()
-      if len(inString) > 0:
-        file_data.update({"file_name": filename, "file_content": inString.replace('carState', user_id)})
-        file_list.append(filename)
-        dataPush.send_string(json.dumps(file_data))
-        print("characters sent: %d" % len(inString))
-        if do_import_local:
-          try:
-            r = requests.post('http://localhost:8086/write?db=carDB&%sprecision=ms', data=inString)
-            print(r)
-          except:
-            r = requests.post('http://localhost:8086/query?q=CREATE DATABASE carDB')
-            #time.sleep(1)
-            r = requests.post('http://localhost:8086/write?db=carDB&%sprecision=ms', data=inString)
-            print(r)
-        #time.sleep(1)
-        if len(file_list) > 5:
-          #print(dataSub.recv_string())
-          reply = dataSub.recv_multipart()
-          time.sleep(1)
-          return_data = json.loads(reply[1])
-          file_to_delete = file_list.pop(file_list.index(return_data['filename']))
-          if return_data['statuscode'] == 204:
-            print("successfully processed: %s  files remaining: %d" % (file_to_delete, file_count))
-            #os.rename('/data/upload/%s' % file_to_delete, '/data/upload/%s' % file_to_delete.replace('.dat','.bak'))
-            os.remove('/data/upload/%s' % file_to_delete)
-          else:
-            print(" Oops!  status_code: %s    NOT successful with file: %s" % (str(return_data['statuscode']), file_to_delete))
+dataSub.setsockopt_string(zmq.SUBSCRIBE, str(identifier))
+
+def prepare(filename):
+  # runs on the reader threads, so the next files are ready as soon as the window opens
+  chunks = replace_chunks(read_chunks(os.path.join(UPLOAD_DIR, filename)), b'carState', user_id.encode())
+  header = {"user_id": str(params.get("PandaDongleId")), "file_name": filename, "identifier": identifier}
+  return filename, json_message(header, chunks, args.compress)
+
+local_session = requests.Session()
+def import_local(filename):
+  # streamed from the file, the body is sent chunked
+  path = os.path.join(UPLOAD_DIR, filename)
+  headers = {'Content-Encoding': 'gzip'}
+  r = local_session.post(LOCAL_URL, data=gzip_chunks(read_chunks(path)), headers=headers)
+  if r.status_code == 404:
+    local_session.post(LOCAL_CREATE_URL)
+    r = local_session.post(LOCAL_URL, data=gzip_chunks(read_chunks(path)), headers=headers)
+  return r.status_code
+
+now = time.time()
+files = sorted(os.fsdecode(f) for f in os.listdir(UPLOAD_DIR))
+files = [f for f in files if (f.endswith(".dat") or f.endswith(".col")) and now - os.path.getmtime(os.path.join(UPLOAD_DIR, f)) > args.min_age]
+
+manifest, done = resume(load_manifest(MANIFEST), UPLOAD_DIR, files, do_import_local)
+for filename in done:
+  # finished before the last run was interrupted
+  os.remove(os.path.join(UPLOAD_DIR, filename))
+for filename in [f for f in manifest if manifest[f]['stat']['size'] == 0]:
+  os.remove(os.path.join(UPLOAD_DIR, filename))
+  del manifest[filename]
+  print("empty file deleted:  %s" % filename)
+save_manifest(MANIFEST, manifest)
+files = [f for f in files if f in manifest and not manifest[f]['acked']]
+print("Total files to upload: %d" % len(files))
+
+readers = ThreadPoolExecutor(max_workers=2)
+importer = ThreadPoolExecutor(max_workers=1)
+prepared = deque()
+in_flight = {}
+imports = {}
+next_file = 0
+failed = 0
+last_ack = time.time()
+
+def start_import(filename):
+  if do_import_local and not manifest[filename]['imported'] and filename not in imports:
+    imports[filename] = importer.submit(import_local, filename)
+
+def finish(filename):
+  """Deletes a file once it was acked and imported, or acked with local import off."""
+  if not finished(manifest[filename], do_import_local):
+    return False
+  os.remove(os.path.join(UPLOAD_DIR, filename))
+  del manifest[filename]
+  return True
+
+def import_done(filename, future):
+  try:
+    status = future.result()
+    manifest[filename]['imported'] = status < 300
+    print("local import: %s  %d" % (filename, status))
+  except requests.exceptions.RequestException as e:
+    print("local import failed: %s  %s" % (filename, e))
+  finish(filename)
+  save_manifest(MANIFEST, manifest)
+
+# acked in an earlier run, only the local import is left
+for filename in list(manifest):
+  if manifest[filename]['acked']:
+    start_import(filename)
+
+while next_file < len(files) or len(prepared) > 0 or len(in_flight) > 0:
+  while next_file < len(files) and len(prepared) < args.window:
+    prepared.append(readers.submit(prepare, files[next_file]))
+    next_file += 1
+
+  # only block on a file being read when nothing is waiting for an ack
+  while len(prepared) > 0 and len(in_flight) < args.window and (len(in_flight) == 0 or prepared[0].done()):
+    filename, message = prepared.popleft().result()
+    dataPush.send(message)
+    print("characters sent: %d" % len(message))
+    if len(in_flight) == 0:
+      last_ack = time.time()
+    in_flight[filename] = time.time()
+    start_import(filename)
+
+  for filename in [f for f in imports if imports[f].done()]:
+    import_done(filename, imports.pop(filename))
+
+  if len(in_flight) > 0:
+    if dataSub.poll(100):
+      reply = dataSub.recv_multipart()
+      return_data = json.loads(reply[1])
+      filename = return_data['filename']
+      if filename not in in_flight:
+        continue
+      del in_flight[filename]
+      last_ack = time.time()
+      if return_data['statuscode'] == 204:
+        manifest[filename]['acked'] = True
+        if not finish(filename):
+          print("acked, waiting for the local import: %s" % filename)
+        print("successfully processed: %s  files remaining: %d" % (filename, len(files) - next_file + len(prepared) + len(in_flight)))
       else:
-        os.remove('/data/upload/%s' % filename)
-        print("empty file deleted:  %s" % filename)
-      file_count -= 1
-
-for i in range(len(file_list)):
-  reply = dataSub.recv_multipart()
-  return_data = json.loads(reply[1])
-  file_to_delete = file_list.pop(file_list.index(return_data['filename']))
-  if return_data['statuscode'] == 204:
-    print("successfully processed: %s" % (file_to_delete))
-    #os.rename('/data/upload/%s' % file_to_delete, '/data/upload/%s' % file_to_delete.replace('.dat','.bak'))
-    os.remove('/data/upload/%s' % file_to_delete)
-  else:
-    print(" Oops!  status_code: %s    NOT successful with file: %s" % (str(return_data['statuscode']), file_to_delete))
-        #time.sleep(10)
+        failed += 1
+        print(" Oops!  status_code: %s    NOT successful with file: %s" % (str(return_data['statuscode']), filename))
+      save_manifest(MANIFEST, manifest)
+    elif time.time() - last_ack > args.ack_timeout:
+      print("no ack for %0.0fs, %d files left for the next run" % (args.ack_timeout, len(in_flight) + len(prepared) + len(files) - next_file))
+      break
+
+readers.shutdown(wait=False)
+importer.shutdown(wait=True)
+for filename, future in imports.items():
+  import_done(filename, future)
+save_manifest(MANIFEST, manifest)
+sys.exit(1 if failed > 0 else 0)